@@ -7,13 +7,66 @@ import numpy as np
 import time
 import threading
 
+# Numba is optional: when present the mixing loops are JIT-compiled into a
+# single fused pass (min/max saturation lowers to vector min/max instructions),
+# otherwise the NumPy ufunc path below is used.
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+
+if NUMBA_AVAILABLE:
+    @njit(cache=True, fastmath=True, boundscheck=False)
+    def _n_minus_1_kernel(total, own, num_speakers, out):
+        """Write (total - own) // num_speakers into out, saturating to int16."""
+        for i in range(total.shape[0]):
+            s = (total[i] - own[i]) // num_speakers
+            out[i] = min(max(s, -32768), 32767)
+
+    @njit(parallel=True, cache=True, fastmath=True, boundscheck=False)
+    def _fanout_kernel(total, snapshot, own_rows, num_active, out):
+        """Write every listener's N-1 mix into the rows of out, one listener per core."""
+        for j in prange(own_rows.shape[0]):
+            idx = own_rows[j]
+            n = num_active - 1 if idx >= 0 else num_active
+            for i in range(total.shape[0]):
+                s = total[i]
+                if idx >= 0:
+                    s -= snapshot[idx, i]
+                s = s // n if n > 0 else 0
+                out[j, i] = min(max(s, -32768), 32767)
+
+
+def _aligned_zeros(shape, dtype, alignment=64):
+    """
+    Allocate a zeroed array whose data starts on an alignment-byte boundary,
+    so vectorized loads over slot rows never straddle cache lines.
+    
+    Args:
+        shape: Array shape
+        dtype: Array dtype
+        alignment: Required byte alignment of the first element
+        
+    Returns:
+        np.ndarray: Zeroed, aligned array
+    """
+    dtype = np.dtype(dtype)
+    nbytes = int(np.prod(shape)) * dtype.itemsize
+    raw = np.zeros(nbytes + alignment, dtype=np.uint8)
+    offset = -raw.ctypes.data % alignment
+    return raw[offset:offset + nbytes].view(dtype).reshape(shape)
+
+
 class AudioMixer:
     """
     Server-side audio mixer implementing N-1 mixing strategy.
     Each client receives audio from all participants except themselves to prevent echo.
     """
     
-    def __init__(self, channels=1, sample_rate=22050, chunk_size=2048):
+    def __init__(self, channels=1, sample_rate=22050, chunk_size=2048, max_speakers=16,
+                 stale_timeout=0.5):
         """
         Initialize audio mixer with specified parameters.
         
@@ -21,15 +74,28 @@ class AudioMixer:
             channels: Number of audio channels (1=mono, 2=stereo)
             sample_rate: Audio sample rate in Hz
             chunk_size: Number of samples per audio chunk
+            max_speakers: Initial number of speaker slots (grows on demand)
+            stale_timeout: Seconds without a frame before a speaker's slot is
+                dropped (clients stop sending while their mic is silent); keep
+                it at least as long as the clients' silence hangover
         """
         self.channels = channels
         self.sample_rate = sample_rate
         self.chunk_size = chunk_size
         self.frame_size = chunk_size * channels * 2  # 2 bytes per sample (16-bit)
         
-        # Store latest audio frame from each user {username: audio_bytes}
-        self.audio_buffers = {}
-        self.audio_buffer_lock = threading.Lock()
+        # Latest frame from each user, stored as rows of one int16 table.
+        # Each row has a sequence counter (odd while being written) so the
+        # producer never takes audio_buffer_lock on the per-frame path.
+        self._slots = _aligned_zeros((max_speakers, chunk_size), np.int16)
+        self._slot_seq = np.zeros(max_speakers, dtype=np.int64)
+        self._snapshot = _aligned_zeros((max_speakers, chunk_size), np.int16)
+        self._active_mask = np.zeros(max_speakers, dtype=bool)
+        self._username_to_slot = {}  # {username: row index in _slots}
+        self._free_slots = list(range(max_speakers - 1, -1, -1))
+        self._last_frame_time = {}  # {username: monotonic time of last frame}
+        self.stale_timeout = stale_timeout
+        self.audio_buffer_lock = threading.Lock()  # Slot allocation and mixing
         
         # Pre-generate silent audio chunk for efficiency
         AUDIO_DTYPE = np.int16
@@ -40,32 +106,227 @@ class AudioMixer:
         BYTES_PER_SAMPLE = 2  # 16-bit audio
         self.EXPECTED_PAYLOAD_SIZE = chunk_size * BYTES_PER_SAMPLE
         
+        # Running int32 sum over active slots (rebuilt by _tick) and reusable
+        # output buffers; only the final tobytes() allocates per mix
+        self._total = _aligned_zeros(chunk_size, np.int32)
+        self._scratch_i32 = _aligned_zeros(chunk_size, np.int32)
+        self._scratch_i16 = _aligned_zeros(chunk_size, np.int16)
+        self._dirty = False  # Set when a frame arrives, cleared by _tick
+        
+        # Ping-pong output buffers {username: mixed bytes}: the mixer fills the
+        # back buffer each tick and swaps it to the front for the senders
+        self._front_mixes = {}
+        self._back_mixes = {}
+        
+        # Batched fan-out buffers: one output row and own-slot index per listener
+        self._fanout_out = _aligned_zeros((max_speakers, chunk_size), np.int16)
+        self._fanout_rows = np.zeros(max_speakers, dtype=np.int64)
+        
+        # Pick the mixing backend once: _mix_fn(total, own, num_speakers, out)
+        # and _fanout_fn(total, snapshot, own_rows, num_active, out)
+        if NUMBA_AVAILABLE:
+            self._mix_fn = _n_minus_1_kernel
+            self._fanout_fn = _fanout_kernel
+            self.backend = 'numba'
+        else:
+            self._mix_fn = self._n_minus_1_numpy
+            self._fanout_fn = self._fanout_numpy
+            self.backend = 'numpy'
+        
+        # Run the kernels once now so the first real mix doesn't pay JIT cost
+        self._mix_fn(self._total, self.SILENT_CHUNK_NP, 1, self._scratch_i16)
+        self._fanout_fn(self._total, self._snapshot, self._fanout_rows[:1], 1, self._fanout_out[:1])
+        
         # Statistics tracking
         self.mix_count = 0
         self.last_mix_time = time.time()
     
+    def _allocate_slot(self, username):
+        """
+        Assign a free row of the slot table to a new speaker.
+        Doubles the table when every slot is taken. Caller must hold audio_buffer_lock.
+        
+        Args:
+            username: Speaker to assign a slot to
+            
+        Returns:
+            int: Row index in _slots
+        """
+        if not self._free_slots:
+            capacity = len(self._slots)
+            slots = _aligned_zeros((2 * capacity, self.chunk_size), np.int16)
+            slots[:capacity] = self._slots
+            self._slots = slots
+            slot_seq = np.concatenate([self._slot_seq, np.zeros(capacity, dtype=np.int64)])
+            slot_seq[:capacity] += slot_seq[:capacity] & 1  # In-flight writes go to the old table
+            self._slot_seq = slot_seq
+            self._snapshot = _aligned_zeros(slots.shape, np.int16)
+            self._active_mask = np.concatenate([self._active_mask, np.zeros(capacity, dtype=bool)])
+            self._free_slots = list(range(2 * capacity - 1, capacity - 1, -1))
+        
+        idx = self._free_slots.pop()
+        self._username_to_slot[username] = idx
+        self._last_frame_time[username] = time.monotonic()
+        self._active_mask[idx] = True
+        return idx
+    
     def add_frame(self, username, frame_data, audio_level=None):
         """
         Store new audio frame from a user.
+        Decodes the PCM bytes straight into the user's slot row, so the
+        mixer only ever reads pre-decoded int16 rows.
         
         Args:
             username: Identifier of the user sending audio
-            frame_data: Raw audio bytes (PCM 16-bit)
+            frame_data: Raw audio bytes or memoryview (PCM 16-bit)
             audio_level: Optional audio level (not currently used)
             
         Returns:
             bool: True if frame added successfully, False otherwise
         """
         # Validate input
-        if not frame_data or not isinstance(frame_data, bytes):
+        if not frame_data or not isinstance(frame_data, (bytes, memoryview)):
             return False
         
-        # Store frame in buffer (thread-safe)
-        with self.audio_buffer_lock:
-            self.audio_buffers[username] = frame_data
+        # Truncate long frames; short frames are zero-padded below
+        num_samples = min(len(frame_data), self.EXPECTED_PAYLOAD_SIZE) // 2
+        
+        while True:
+            # Only a new speaker needs the lock (to allocate a slot)
+            idx = self._username_to_slot.get(username)
+            if idx is None:
+                with self.audio_buffer_lock:
+                    idx = self._username_to_slot.get(username)
+                    if idx is None:
+                        idx = self._allocate_slot(username)
+            
+            # Seqlock write: odd sequence marks the row as being written, and
+            # _release_slot_locked leaves odd rows alone. Re-check the mapping
+            # once the row is marked, in case it was released (or the table
+            # grown) between the lookup and the mark.
+            slot_seq = self._slot_seq
+            slot_seq[idx] += 1
+            if self._slot_seq is slot_seq and self._username_to_slot.get(username) == idx:
+                break
+            slot_seq[idx] += 1  # Row no longer ours: unmark it and look again
+        
+        slot = self._slots[idx]
+        samples = np.frombuffer(frame_data, dtype=np.int16, count=num_samples)
+        if num_samples == self.chunk_size:
+            slot[:] = samples  # Common case: exact-size frame, no padding
+        else:
+            slot[:num_samples] = samples
+            slot[num_samples:] = 0
+        self._last_frame_time[username] = time.monotonic()  # Still marked, so the slot can't be released
+        slot_seq[idx] += 1
+        self._dirty = True
+        
+        return True
+    
+    def _release_slot_locked(self, username):
+        """
+        Free a speaker's slot unless a frame is being written into it; in
+        that case the writer still owns the row and the next stale sweep
+        releases it instead. Caller must hold audio_buffer_lock.
+        
+        Args:
+            username: Speaker whose slot should be freed
+            
+        Returns:
+            bool: True if the slot was freed (or the user had none)
+        """
+        idx = self._username_to_slot.pop(username, None)
+        if idx is None:
+            self._last_frame_time.pop(username, None)
+            return True
+        
+        # Checked after the pop: a writer that marks the row from here on
+        # sees the mapping gone and backs off
+        if self._slot_seq[idx] & 1:
+            self._username_to_slot[username] = idx
+            return False
         
+        self._last_frame_time.pop(username, None)
+        self._active_mask[idx] = False
+        self._free_slots.append(idx)
+        self._dirty = True
         return True
     
+    def _expire_stale_locked(self):
+        """
+        Release slots of speakers that stopped sending, so their last frame
+        isn't replayed into every mix. Caller must hold audio_buffer_lock.
+        """
+        cutoff = time.monotonic() - self.stale_timeout
+        last_frame_time = self._last_frame_time
+        for username in list(self._username_to_slot):
+            if last_frame_time.get(username, 0.0) < cutoff:
+                self._release_slot_locked(username)
+    
+    def _tick(self):
+        """
+        Snapshot the slot table and rebuild the running int32 sum over active slots.
+        Runs once per batch of new frames so each N-1 mix is a single subtract.
+        Caller must hold audio_buffer_lock.
+        """
+        # Clear first so a frame landing mid-snapshot triggers another tick
+        self._dirty = False
+        
+        # Seqlock read: retry if any row was being written during the copy
+        for _ in range(3):
+            seq_before = self._slot_seq.copy()
+            np.copyto(self._snapshot, self._slots)
+            if not (seq_before & 1).any() and np.array_equal(seq_before, self._slot_seq):
+                break
+        
+        np.sum(self._snapshot, axis=0, dtype=np.int32, out=self._total,
+               where=self._active_mask[:, None])
+        self.mix_count += 1
+    
+    def _n_minus_1_numpy(self, total, own, num_speakers, out):
+        """
+        NumPy fallback for _n_minus_1_kernel: write (total - own) // num_speakers
+        into out. An average of int16 samples always fits in int16, so the
+        divide narrows straight into out without a separate clip.
+        
+        Args:
+            total: int32 running sum over active slots
+            own: Listener's own int16 frame (SILENT_CHUNK_NP if not speaking)
+            num_speakers: Number of frames left in the sum
+            out: int16 output buffer
+        """
+        # Remove listener's own audio from the shared total
+        if own is not self.SILENT_CHUNK_NP:
+            np.subtract(total, own, out=self._scratch_i32)
+            total = self._scratch_i32
+        
+        if num_speakers > 1:
+            np.floor_divide(total, num_speakers, out=out, casting='unsafe')
+        else:
+            np.copyto(out, total, casting='unsafe')
+    
+    @staticmethod
+    def _fanout_numpy(total, snapshot, own_rows, num_active, out):
+        """
+        NumPy fallback for _fanout_kernel: compute every listener's N-1 mix
+        as one broadcast subtract and divide.
+        
+        Args:
+            total: int32 running sum over active slots
+            snapshot: int16 slot table the total was built from
+            own_rows: Each listener's slot index (-1 if not speaking)
+            num_active: Number of active slots in the total
+            out: int16 output buffer, one row per listener
+        """
+        speaking = own_rows >= 0
+        own = snapshot[own_rows]
+        own[~speaking] = 0
+        
+        # Listeners who speak hear everyone but themselves
+        divisors = num_active - speaking.astype(np.int64)
+        np.maximum(divisors, 1, out=divisors)
+        np.floor_divide(total - own, divisors[:, None], out=out, casting='unsafe')
+    
     def get_mixed_frame_n_minus_1(self, exclude_username):
         """
         Mix audio from all users except the specified one (N-1 mixing).
@@ -78,61 +339,115 @@ class AudioMixer:
             bytes: Mixed audio data as PCM 16-bit bytes, or silence if no audio available
         """
         with self.audio_buffer_lock:
-            # Get all speakers except the excluded user
-            speakers = [u for u in self.audio_buffers.keys() if u != exclude_username]
+            self._expire_stale_locked()
             
-            # Return silence if no other speakers
-            if not speakers:
-                return self.SILENT_CHUNK_BYTES
+            # Refresh total sum only when new audio arrived or a speaker left
+            if self._dirty:
+                self._tick()
             
-            # Collect audio from each speaker
-            audio_arrays = []
-            for speaker in speakers:
-                try:
-                    audio_data = self.audio_buffers[speaker]
-                    
-                    # Ensure audio data is correct size (pad or truncate)
-                    if len(audio_data) != self.EXPECTED_PAYLOAD_SIZE:
-                        if len(audio_data) < self.EXPECTED_PAYLOAD_SIZE:
-                            # Pad with zeros
-                            audio_data = audio_data + b'\x00' * (self.EXPECTED_PAYLOAD_SIZE - len(audio_data))
-                        else:
-                            # Truncate excess
-                            audio_data = audio_data[:self.EXPECTED_PAYLOAD_SIZE]
-                    
-                    # Convert bytes to numpy array for mixing
-                    audio_np = np.frombuffer(audio_data, dtype=np.int16)
-                    audio_arrays.append(audio_np)
-                    
-                except Exception:
-                    # Skip invalid audio data
-                    continue
+            return self._mix_n_minus_1_locked(exclude_username)
+    
+    def _mix_n_minus_1_locked(self, exclude_username):
+        """
+        N-1 mix for one listener from the current snapshot.
+        Caller must hold audio_buffer_lock and have run _tick if dirty.
+        
+        Args:
+            exclude_username: Username to exclude from the mix
             
-            # Return silence if no valid audio collected
-            if not audio_arrays:
-                return self.SILENT_CHUNK_BYTES
+        Returns:
+            bytes: Mixed audio data as PCM 16-bit bytes
+        """
+        # Number of speakers in this listener's mix (everyone but themselves)
+        slot_of = self._username_to_slot
+        own_idx = slot_of.get(exclude_username)
+        num_speakers = len(slot_of) - (1 if own_idx is not None else 0)
+        
+        # Return silence if no other speakers
+        if num_speakers <= 0:
+            return self.SILENT_CHUNK_BYTES
+        
+        # Exactly one other speaker (e.g. a two-person call): their frame is the mix
+        if num_speakers == 1:
+            for idx in slot_of.values():
+                if idx != own_idx:
+                    return self._snapshot[idx].tobytes()
+        
+        try:
+            own_audio = self._snapshot[own_idx] if own_idx is not None else self.SILENT_CHUNK_NP
+            self._mix_fn(self._total, own_audio, num_speakers, self._scratch_i16)
+            return self._scratch_i16.tobytes()
             
-            # Mix audio streams
-            try:
-                # Use int32 to prevent overflow during summing
-                mixed = np.zeros(self.chunk_size, dtype=np.int32)
-                for audio_array in audio_arrays:
-                    mixed += audio_array.astype(np.int32)
-                
-                # Average the audio to prevent clipping
-                num_speakers = len(audio_arrays)
-                if num_speakers > 1:
-                    mixed = (mixed / num_speakers).astype(np.int32)
+        except Exception:
+            # Return silence on mixing error
+            return self.SILENT_CHUNK_BYTES
+    
+    def publish_mixes(self, usernames):
+        """
+        Compute the N-1 mix for every listener into the back buffer in one
+        batched kernel call, then swap it to the front. Sender threads read the front buffer via
+        get_published_frame and never wait on the mixer.
+        
+        Args:
+            usernames: Listeners to mix for
+            
+        Returns:
+            dict: Newly published {username: mixed bytes}
+        """
+        back = self._back_mixes
+        back.clear()
+        num_listeners = len(usernames)
+        
+        with self.audio_buffer_lock:
+            self._expire_stale_locked()
+            
+            # Refresh total sum only when new audio arrived or a speaker left
+            if self._dirty:
+                self._tick()
+            
+            slot_of = self._username_to_slot
+            
+            # Calls with one or two speakers: each listener hears at most two
+            # speakers and usually just one, so per-listener fast paths win
+            if len(slot_of) <= 2:
+                for username in usernames:
+                    back[username] = self._mix_n_minus_1_locked(username)
+            else:
+                # Grow fan-out buffers to fit every listener
+                if num_listeners > len(self._fanout_rows):
+                    capacity = max(num_listeners, 2 * len(self._fanout_rows))
+                    self._fanout_out = _aligned_zeros((capacity, self.chunk_size), np.int16)
+                    self._fanout_rows = np.zeros(capacity, dtype=np.int64)
                 
-                # Clip to valid int16 range and convert
-                mixed = np.clip(mixed, -32768, 32767).astype(np.int16)
+                own_rows = self._fanout_rows[:num_listeners]
+                out = self._fanout_out[:num_listeners]
+                for j, username in enumerate(usernames):
+                    own_rows[j] = slot_of.get(username, -1)
                 
-                # Convert back to bytes
-                return mixed.tobytes()
+                # All N-1 mixes in one batched call
+                try:
+                    self._fanout_fn(self._total, self._snapshot, own_rows, len(slot_of), out)
+                except Exception:
+                    out.fill(0)
                 
-            except Exception:
-                # Return silence on mixing error
-                return self.SILENT_CHUNK_BYTES
+                for j, username in enumerate(usernames):
+                    back[username] = out[j].tobytes()
+        
+        # Single reference swap (atomic under the GIL)
+        self._front_mixes, self._back_mixes = back, self._front_mixes
+        return back
+    
+    def get_published_frame(self, username):
+        """
+        Get the latest published mix for a listener.
+        
+        Args:
+            username: Listener to fetch the mix for
+            
+        Returns:
+            bytes: Mixed PCM frame, or None if nothing was published for them
+        """
+        return self._front_mixes.get(username)
     
     def get_mixed_frame(self, exclude_username=None):
         """
@@ -151,46 +466,24 @@ class AudioMixer:
         
         # Mix all participants together
         with self.audio_buffer_lock:
-            speakers = list(self.audio_buffers.keys())
+            num_speakers = len(self._username_to_slot)
             
-            if not speakers:
+            if not num_speakers:
                 return self.SILENT_CHUNK_BYTES
             
-            # Collect audio data
-            audio_arrays = []
-            for speaker in speakers:
-                try:
-                    audio_data = self.audio_buffers[speaker]
-                    
-                    # Validate and normalize size
-                    if len(audio_data) != self.EXPECTED_PAYLOAD_SIZE:
-                        if len(audio_data) < self.EXPECTED_PAYLOAD_SIZE:
-                            audio_data = audio_data + b'\x00' * (self.EXPECTED_PAYLOAD_SIZE - len(audio_data))
-                        else:
-                            audio_data = audio_data[:self.EXPECTED_PAYLOAD_SIZE]
-                    
-                    audio_np = np.frombuffer(audio_data, dtype=np.int16)
-                    audio_arrays.append(audio_np)
-                    
-                except Exception:
-                    continue
+            # Refresh snapshot and total sum only when new audio arrived
+            if self._dirty:
+                self._tick()
             
-            if not audio_arrays:
-                return self.SILENT_CHUNK_BYTES
+            # Single speaker: their frame is the mix
+            if num_speakers == 1:
+                return self._snapshot[next(iter(self._username_to_slot.values()))].tobytes()
             
             # Mix audio
             try:
-                mixed = np.zeros(self.chunk_size, dtype=np.int32)
-                for audio_array in audio_arrays:
-                    mixed += audio_array.astype(np.int32)
-                
-                # Average to prevent clipping
-                if len(audio_arrays) > 1:
-                    mixed = (mixed / len(audio_arrays)).astype(np.int32)
-                
-                # Clip and convert
-                mixed = np.clip(mixed, -32768, 32767).astype(np.int16)
-                return mixed.tobytes()
+                # Running sum already covers every active slot
+                self._mix_fn(self._total, self.SILENT_CHUNK_NP, num_speakers, self._scratch_i16)
+                return self._scratch_i16.tobytes()
                 
             except Exception as e:
                 print(f"Error mixing audio: {e}")
@@ -205,8 +498,8 @@ class AudioMixer:
             username: User whose buffer should be removed
         """
         with self.audio_buffer_lock:
-            if username in self.audio_buffers:
-                del self.audio_buffers[username]
+            # If a frame is landing right now, the stale sweep frees the slot instead
+            self._release_slot_locked(username)
     
     def clear_all_buffers(self):
         """
@@ -214,7 +507,15 @@ class AudioMixer:
         Useful for session reset or cleanup.
         """
         with self.audio_buffer_lock:
-            self.audio_buffers.clear()
+            # Rows with a frame landing stay reserved; the stale sweep frees them
+            for username in list(self._username_to_slot):
+                self._release_slot_locked(username)
+            for username in list(self._last_frame_time):
+                if username not in self._username_to_slot:
+                    del self._last_frame_time[username]
+            self._total.fill(0)
+            self._front_mixes = {}
+            self._back_mixes = {}
     
     def get_active_speakers(self):
         """
@@ -224,7 +525,7 @@ class AudioMixer:
             list: Usernames of active speakers
         """
         with self.audio_buffer_lock:
-            return list(self.audio_buffers.keys())
+            return list(self._username_to_slot.keys())
     
     def get_stats(self):
         """
@@ -236,8 +537,9 @@ class AudioMixer:
         with self.audio_buffer_lock:
             return {
                 'total_frames_processed': self.mix_count,
-                'active_speakers': len(self.audio_buffers),
+                'active_speakers': len(self._username_to_slot),
                 'frame_size': self.frame_size,
                 'chunk_size': self.chunk_size,
-                'channels': self.channels
+                'channels': self.channels,
+                'backend': self.backend
             }
@@ -5,6 +5,7 @@ Handles microphone capture, audio transmission, and playback
 
 import pyaudio
 import pickle
+import queue
 import struct
 import threading
 import time
@@ -12,6 +13,152 @@ import numpy as np
 from PyQt5.QtCore import QObject, pyqtSignal, pyqtSlot, Qt
 
 from config import *
+from utils import AUDIO_TYPE_ID, pack_media_header, safe_loads
+
+
+def choose_audio_chunk(rate, target_latency_ms):
+    """
+    Device buffer size (frames) for a target latency.
+    Rounded up to a power of two, which most audio backends prefer.
+    
+    Args:
+        rate: Sample rate in Hz
+        target_latency_ms: Desired buffer latency in milliseconds
+        
+    Returns:
+        int: Frames per device buffer
+    """
+    frames = max(1, int(rate * target_latency_ms / 1000))
+    return 1 << (frames - 1).bit_length()
+
+
+def pcm_level(pcm):
+    """
+    RMS level of a 16-bit PCM buffer, in one vectorized pass.
+    
+    Args:
+        pcm: Raw int16 PCM (bytes or memoryview)
+        
+    Returns:
+        float: RMS level from 0.0 (silent) to 1.0 (full scale)
+    """
+    samples = np.frombuffer(pcm, dtype=np.int16).astype(np.float32)
+    if not samples.size:
+        return 0.0
+    return float(np.sqrt(np.dot(samples, samples) / samples.size)) / 32768.0
+
+
+def apply_gain(samples, current_gain):
+    """
+    Apply AUDIO_DYNAMIC_GAIN / AUDIO_NORMALIZE to an int16 buffer in place.
+    The gain tracks the frame's peak smoothly but never exceeds what would clip.
+    
+    Args:
+        samples: Writeable int16 numpy array, scaled in place
+        current_gain: Gain applied to the previous frame
+        
+    Returns:
+        float: Gain applied to this frame
+    """
+    peak = max(int(samples.max()), -int(samples.min()))
+    if peak == 0:
+        return current_gain
+    
+    limit = AUDIO_TARGET_PEAK * 32767 / peak
+    if AUDIO_DYNAMIC_GAIN:
+        gain = min(0.8 * current_gain + 0.2 * min(limit, AUDIO_MAX_GAIN), limit)
+    else:
+        gain = min(1.0, limit)  # Normalize only: attenuate, never boost
+    
+    if gain != 1.0:
+        np.multiply(samples, gain, out=samples, casting='unsafe')
+    return gain
+
+
+class _PcmRing:
+    """
+    Fixed-size single-producer/single-consumer byte ring for playback audio.
+    The network thread writes frames, the PortAudio callback reads them.
+    """
+    
+    def __init__(self, capacity):
+        """
+        Initialize an empty ring.
+        
+        Args:
+            capacity: Ring size in bytes
+        """
+        self._buf = bytearray(capacity)
+        self._capacity = capacity
+        self._read_pos = 0   # Total bytes consumed (advanced only by the reader)
+        self._write_pos = 0  # Total bytes produced (advanced only by the writer)
+        self._clear_to = 0   # Latest clear() mark; the reader skips up to it
+        self._silence = b''  # Cached all-zero block returned on a full underrun
+    
+    def write(self, data):
+        """
+        Append a frame to the ring.
+        
+        Args:
+            data: PCM bytes or memoryview
+            
+        Returns:
+            bool: True if written, False if the frame didn't fit (dropped)
+        """
+        size = len(data)
+        if size > self._capacity - (self._write_pos - self._read_pos):
+            return False
+        
+        start = self._write_pos % self._capacity
+        first = min(size, self._capacity - start)
+        self._buf[start:start + first] = data[:first]
+        if first < size:
+            self._buf[:size - first] = data[first:]
+        self._write_pos += size
+        return True
+    
+    def read(self, size):
+        """
+        Pop the next bytes from the ring, zero-padded when it runs dry.
+        
+        Args:
+            size: Number of bytes wanted
+            
+        Returns:
+            bytes: Exactly size bytes
+        """
+        # Apply a pending clear() here, so only the reader ever moves _read_pos
+        clear_to = self._clear_to
+        if clear_to > self._read_pos:
+            self._read_pos = clear_to
+        
+        available = min(size, self._write_pos - self._read_pos)
+        
+        # Nothing queued (idle or after clear): reuse one zero block
+        if not available:
+            if len(self._silence) != size:
+                self._silence = bytes(size)
+            return self._silence
+        
+        start = self._read_pos % self._capacity
+        first = min(available, self._capacity - start)
+        out = bytes(self._buf[start:start + first])
+        if first < available:
+            out += bytes(self._buf[:available - first])
+        self._read_pos += available
+        
+        if available < size:
+            out += bytes(size - available)  # Underrun: play silence
+        return out
+    
+    def clear(self):
+        """
+        Discard all buffered audio.
+        Safe from any thread: it only records how far the reader should skip,
+        and the next read() does the skipping.
+        """
+        self._clear_to = self._write_pos
+
 
 class AudioHandler(QObject):
     """
@@ -26,7 +173,8 @@ class AudioHandler(QObject):
     AUDIO_FORMAT = pyaudio.paInt16  # 16-bit PCM audio
     CHANNELS = 1                     # Mono audio
     RATE = 22050                     # Sample rate (Hz)
-    CHUNK = 2048                     # Samples per buffer
+    CHUNK = AUDIO_CHUNK              # Samples per network frame (fixed by the server mixer)
+    PLAYBACK_RING_CHUNKS = 4         # Playback buffering before frames are dropped
     
     def __init__(self, client):
         """
@@ -46,6 +194,10 @@ class AudioHandler(QObject):
         self.p = pyaudio.PyAudio()
         self.input_stream = None   # Microphone input
         self.output_stream = None  # Speaker output
+        self._stream_active = False  # Cached output_stream.is_active() (set on start/stop)
+        
+        # Device buffer size, negotiated per stream (grows if the device rejects it)
+        self.device_buffer_frames = choose_audio_chunk(self.RATE, AUDIO_TARGET_LATENCY_MS)
         
         # Audio level monitoring for UI
         self.audio_level = 0
@@ -55,13 +207,20 @@ class AudioHandler(QObject):
         self.last_send_time = 0
         self.min_send_interval = 0.02  # 20ms between packets
         
+        # Playback ring: filled by the network thread, drained by PortAudio's callback
+        self._ring = _PcmRing(self.CHUNK * self.CHANNELS * 2 * self.PLAYBACK_RING_CHUNKS)
+        
         # Statistics tracking
         self.audio_sent_count = 0
         self.audio_received_count = 0
         self.last_stats_time = time.time()
         
-        # Background thread for audio capture
+        # Background threads: capture (mic -> queue) and send (queue -> network)
         self.audio_send_thread = None
+        self._send_worker_thread = None
+        self._send_q = queue.Queue(maxsize=4)  # Captured PCM awaiting send
+        self._gain_scratch = np.empty(self.CHUNK * self.CHANNELS, dtype=np.int16)  # Writeable copy for gain
+        self._gain = 1.0
         
         # Initialize speaker output immediately (always ready to receive)
         self.start_receiving()
@@ -91,24 +250,24 @@ class AudioHandler(QObject):
                     pass
                 self.output_stream = None
             
-            # Create speaker output stream with minimal latency settings
-            self.output_stream = self.p.open(
-                format=self.AUDIO_FORMAT, 
-                channels=self.CHANNELS, 
-                rate=self.RATE,
+            # Create speaker output stream in callback mode: PortAudio pulls
+            # from the playback ring, so writers never block on the device
+            self._ring.clear()
+            self.output_stream = self._open_negotiated(
                 output=True, 
-                frames_per_buffer=self.CHUNK,
-                stream_callback=None,
+                stream_callback=self._pa_callback,
                 output_device_index=None,
                 start=False  # Start manually to avoid initial buffer buildup
             )
             
             # Start stream after creation to prevent latency
             self.output_stream.start_stream()
+            self._stream_active = True
             
             self.is_receiving = True
             print("✅ Audio output stream ready - you can now hear others!")
-            print(f"📊 Stream info: Rate={self.RATE}, Channels={self.CHANNELS}, Chunk={self.CHUNK}")
+            print(f"📊 Stream info: Rate={self.RATE}, Channels={self.CHANNELS}, "
+                  f"Chunk={self.CHUNK}, Device buffer={self.device_buffer_frames}")
             return True
             
         except Exception as e:
@@ -121,9 +280,75 @@ class AudioHandler(QObject):
                 except:
                     pass
                 self.output_stream = None
+            self._stream_active = False
             self.is_receiving = False
             return False
 
+    def _open_negotiated(self, **kwargs):
+        """
+        Open a PyAudio stream with the smallest device buffer the device accepts.
+        Starts at device_buffer_frames and doubles on failure, up to
+        AUDIO_MAX_RETRY times; the size that worked is kept for later streams.
+        
+        Args:
+            **kwargs: Extra pyaudio.PyAudio.open arguments (input/output, callback...)
+            
+        Returns:
+            pyaudio.Stream: Opened stream
+        """
+        frames = self.device_buffer_frames
+        for attempt in range(AUDIO_MAX_RETRY + 1):
+            try:
+                stream = self.p.open(
+                    format=self.AUDIO_FORMAT,
+                    channels=self.CHANNELS,
+                    rate=self.RATE,
+                    frames_per_buffer=frames,
+                    **kwargs
+                )
+            except (IOError, OSError) as e:
+                if attempt == AUDIO_MAX_RETRY:
+                    raise
+                print(f"⚠️ Device rejected {frames}-frame buffer ({e}), trying {frames * 2}")
+                frames *= 2
+                continue
+            self.device_buffer_frames = frames
+            return stream
+    
+    def set_audio_buffer(self, frames):
+        """
+        Change the device buffer size at runtime.
+        PortAudio fixes the buffer when a stream opens, so open streams are
+        reopened; the playback ring and send queue are kept.
+        
+        Args:
+            frames: Frames per device buffer, or a key of AUDIO_BUFFER_PRESETS
+                    ('low_latency', 'stable')
+        """
+        if isinstance(frames, str):
+            frames = AUDIO_BUFFER_PRESETS[frames]
+        if frames == self.device_buffer_frames:
+            return
+        self.device_buffer_frames = frames
+        print(f"🎚️ Audio device buffer set to {frames} frames")
+        
+        # Reopen the speaker stream (start_receiving skips a running one)
+        if self.output_stream:
+            self.stop_receiving()
+            self.start_receiving()
+        
+        # Reopen the microphone; capture threads are restarted with it
+        if self.is_streaming:
+            self.stop_stream()
+            self.start_stream()
+    
+    def _pa_callback(self, in_data, frame_count, time_info, status):
+        """
+        PortAudio output callback: supply the next frames from the playback ring.
+        Runs on PortAudio's thread; returns silence when no audio is queued.
+        """
+        return (self._ring.read(frame_count * self.CHANNELS * 2), pyaudio.paContinue)
+    
     def stop_receiving(self):
         """
         Stop audio receiving (speaker output).
@@ -136,6 +361,7 @@ class AudioHandler(QObject):
             
         print("🔊 Stopping audio output stream...")
         self.is_receiving = False
+        self._stream_active = False
         
         if self.output_stream:
             try:
@@ -172,19 +398,22 @@ class AudioHandler(QObject):
                 self.input_stream = None
             
             # Create microphone input stream
-            self.input_stream = self.p.open(
-                format=self.AUDIO_FORMAT,
-                channels=self.CHANNELS,
-                rate=self.RATE,
-                input=True,
-                frames_per_buffer=self.CHUNK
-            )
+            self.input_stream = self._open_negotiated(input=True)
             
             # Mark as streaming and notify UI
             self.is_streaming = True
             self.audio_status_changed.emit(True)
             
-            # Start background thread for audio capture and transmission
+            # Discard frames left over from a previous session
+            while not self._send_q.empty():
+                try:
+                    self._send_q.get_nowait()
+                except queue.Empty:
+                    break
+            
+            # Start background threads for audio capture and transmission
+            self._send_worker_thread = threading.Thread(target=self._send_worker, daemon=True)
+            self._send_worker_thread.start()
             self.audio_send_thread = threading.Thread(target=self._audio_send_loop, daemon=True)
             self.audio_send_thread.start()
             
@@ -221,9 +450,11 @@ class AudioHandler(QObject):
         print("🎤 Stopping microphone...")
         self.is_streaming = False
         
-        # Wait for send thread to finish
-        if self.audio_send_thread and self.audio_send_thread.is_alive():
-            self.audio_send_thread.join(timeout=1.0)
+        # Wait for capture and send threads to finish
+        current = threading.current_thread()
+        for thread in (self.audio_send_thread, self._send_worker_thread):
+            if thread and thread.is_alive() and thread is not current:
+                thread.join(timeout=1.0)
         
         # Close input stream
         if self.input_stream:
@@ -234,18 +465,11 @@ class AudioHandler(QObject):
                 print(f"Error closing input stream: {e}")
             self.input_stream = None
         
-        # Clear output buffer to prevent noise artifacts when microphone stops
+        # Clear queued playback to prevent noise artifacts when microphone stops
+        # (the callback plays silence once the ring is empty)
         if self.output_stream:
-            try:
-                silence = b'\x00' * (self.CHUNK * 2)
-                for _ in range(3):  # Write silence frames to flush buffer
-                    try:
-                        self.output_stream.write(silence, exception_on_underflow=False)
-                    except:
-                        break
-                print("🔇 Output buffer cleared to prevent noise")
-            except Exception as e:
-                print(f"Note: Could not clear buffer: {e}")
+            self._ring.clear()
+            print("🔇 Output buffer cleared to prevent noise")
         
         # Notify UI of status change
         self.audio_status_changed.emit(False)
@@ -255,37 +479,33 @@ class AudioHandler(QObject):
 
     def _audio_send_loop(self):
         """
-        Background thread: continuously captures and transmits microphone audio.
-        Reads audio from microphone and sends via UDP while streaming is active.
+        Background thread: continuously captures microphone audio.
+        Only reads from the microphone and queues the PCM, so network stalls
+        never delay the next read; _send_worker does the transmission.
         """
         print("🎤 Audio send loop started")
         
-        while self.is_streaming:
-            if not self.is_streaming or not self.input_stream:
-                time.sleep(0.01)
-                continue
-                continue
+        # Hoisted once: start_stream opens the input stream before starting this
+        # thread, and stop_stream joins it before closing the stream
+        send_q = self._send_q
+        stream = self.input_stream
+        chunk = self.CHUNK
+        
+        while self.is_streaming and stream is not None:
             try:
                 # Read audio data from microphone
-                data = self.input_stream.read(self.CHUNK, exception_on_overflow=False)
-                
-                # Prepend audio packet type header
-                payload = b'a|' + data
+                data = stream.read(chunk, exception_on_overflow=False)
                 
-                # Create and send audio packet to server
-                audio_packet = {
-                    'type': 'audio',
-                    'username': self.client.username,
-                    'raw_data': payload
-                }
-                pickled = pickle.dumps(audio_packet)
-                self.client.send_udp(pickled)
-                
-                self.audio_sent_count += 1
-                
-                # Debug logging every 50 packets
-                if self.audio_sent_count % 50 == 0:
-                    print(f"📤 Sent {self.audio_sent_count} audio packets to server")
+                # Queue for sending; if the sender has fallen behind, drop the
+                # oldest frame rather than block the microphone
+                try:
+                    send_q.put_nowait(data)
+                except queue.Full:
+                    try:
+                        send_q.get_nowait()
+                    except queue.Empty:
+                        pass
+                    send_q.put_nowait(data)
                 
             except IOError as e:
                 # Buffer overflow can happen, usually recoverable
@@ -299,10 +519,112 @@ class AudioHandler(QObject):
         
         print("🎤 Audio send loop ended")
     
+    def _send_worker(self):
+        """
+        Background thread: transmits queued microphone audio to the server.
+        """
+        # Fixed binary header, built once per stream (username doesn't change)
+        header = pack_media_header(AUDIO_TYPE_ID, self.client.username)
+        send_q = self._send_q
+        hangover = AUDIO_SILENCE_HANGOVER_MS / 1000.0
+        scratch = self._gain_scratch
+        last_voice_time = time.monotonic()
+        
+        while self.is_streaming:
+            try:
+                data = send_q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            
+            # Level doubles as the UI meter value; silent frames are not sent
+            # once the hangover after the last speech has passed
+            level = pcm_level(data)
+            self.audio_level = level
+            now = time.monotonic()
+            if level >= AUDIO_MIN_LEVEL:
+                last_voice_time = now
+            elif now - last_voice_time > hangover:
+                continue
+            
+            # Scale voiced frames in a reused scratch buffer (the captured
+            # bytes are read-only)
+            if AUDIO_DYNAMIC_GAIN or AUDIO_NORMALIZE:
+                samples = np.frombuffer(data, dtype=np.int16)
+                if samples.size <= scratch.size:
+                    buf = scratch[:samples.size]
+                    np.copyto(buf, samples)
+                    self._gain = apply_gain(buf, self._gain)
+                    data = buf.data
+            
+            # Send [type][name len][name][PCM] to server (no pickling)
+            self.client.send_udp(header + data, msg_type='audio')
+            
+            self.audio_sent_count += 1
+            
+            # Debug logging every 50 packets
+            if self.audio_sent_count % 50 == 0:
+                print(f"📤 Sent {self.audio_sent_count} audio packets to server")
+    
+    def handle_audio_raw(self, pcm):
+        """
+        Play a raw PCM frame received from the server mixer.
+        Fast path for binary mixed-audio packets (no unpickling).
+        
+        Args:
+            pcm: PCM 16-bit audio frame (bytes or memoryview)
+        """
+        if not pcm:
+            return
+        
+        # Hoist stream handle; (re)start only in the unlikely no-stream case
+        stream = self.output_stream
+        if stream is None or not self.is_receiving:
+            print("⚠️ No output stream available! Trying to start...")
+            if not self.start_receiving():
+                print("❌ Failed to start output stream")
+                return
+            stream = self.output_stream
+        
+        try:
+            # Queue for playback (never blocks); drop the packet if the ring
+            # is full to prevent delay buildup
+            if not self._ring.write(pcm):
+                self.audio_received_count += 1
+                if self.audio_received_count % 200 == 0:
+                    print(f"⚠️ Buffer full - dropping packets")
+                return
+            
+            # Ensure stream is active so the callback drains the ring
+            # (cached flag; only query PortAudio in the unlikely recovery case)
+            if not self._stream_active:
+                if not stream.is_active():
+                    print("⚠️ Output stream not active! Starting it...")
+                    stream.start_stream()
+                self._stream_active = True
+            
+            self.audio_received_count += 1
+            
+            # Debug logging
+            if self.audio_received_count % 100 == 0:
+                print(f"🔊 Received {self.audio_received_count} audio packets | Queued {len(pcm)} bytes")
+        except IOError as e:
+            if self.is_receiving:
+                print(f"❌ Audio output IOError: {e}")
+                # Try to restart stream on error
+                try:
+                    self.stop_receiving()
+                    time.sleep(0.1)
+                    self.start_receiving()
+                except:
+                    pass
+        except Exception as e:
+            if self.is_receiving and self.audio_received_count % 100 == 0:
+                print(f"❌ Unexpected audio write error: {e}")
+    
     def handle_audio(self, data):
         """
-        Handle incoming audio data from other clients.
-        Receives mixed audio from server and plays through speakers.
+        Handle incoming pickled audio data (legacy packet format).
+        Binary mixed-audio packets go through handle_audio_raw instead.
         
         Args:
             data: Pickled audio packet containing mixed audio frame
@@ -316,96 +638,24 @@ class AudioHandler(QObject):
             
         try:
             # Unpack incoming audio packet
-            payload = pickle.loads(data)
+            payload = safe_loads(data)
             
             # Extract audio frame (server sends mixed audio in 'frame' field)
-            if 'frame' in payload:
-                audio_frame = payload.get('frame')
-                
-                if audio_frame and len(audio_frame) > 0:
-                    try:
-                        # Buffer management to prevent excessive delay
-                        # Drop packets only if buffer is critically full
-                        if self.output_stream:
-                            try:
-                                available = self.output_stream.get_write_available()
-                                
-                                # Drop packet if less than half a chunk of space available
-                                if available < self.CHUNK*0.5:
-                                    self.audio_received_count += 1
-                                    if self.audio_received_count % 200 == 0:
-                                        print(f"⚠️ Buffer full - dropping packets")
-                                    return  # Skip packet to prevent delay buildup
-                            except:
-                                pass  # Continue if buffer check fails
-                        
-                        # Ensure stream is active before writing
-                        if not self.output_stream.is_active():
-                            print("⚠️ Output stream not active! Starting it...")
-                            self.output_stream.start_stream()
-                        
-                        # Play audio through speakers
-                        if self.output_stream:
-                            self.output_stream.write(audio_frame, exception_on_underflow=False)
-                            self.audio_received_count += 1
-                            
-                            # Debug logging
-                            if self.audio_received_count % 100 == 0:
-                                print(f"🔊 Received {self.audio_received_count} audio packets | Wrote {len(audio_frame)} bytes")
-                    except IOError as e:
-                        if self.is_receiving:
-                            print(f"❌ Audio output IOError: {e}")
-                            # Try to restart stream on error
-                            try:
-                                self.stop_receiving()
-                                time.sleep(0.1)
-                                self.start_receiving()
-                            except:
-                                pass
-                    except Exception as e:
-                        if self.is_receiving and self.audio_received_count % 100 == 0:
-                            print(f"❌ Unexpected audio write error: {e}")
+            frame = payload.get('frame')
+            if frame is not None:
+                self.handle_audio_raw(frame)
                 return
             
             # Handle alternative raw_data format (legacy compatibility)
             if 'raw_data' in payload:
                 raw_data = payload['raw_data']
                 
-                # Parse packet format: "type|data" (e.g., b'a|audio_bytes')
+                # Parse packet format: "type|data" (e.g., b'a|audio_bytes');
+                # fixed 2-byte prefix, so slice instead of scanning the PCM for '|'
                 try:
-                    parts = raw_data.split(b'|', 1)
-                    if len(parts) >= 2 and parts[0] == b'a':
-                        media_data = parts[1]
-                        
-                        # Same buffer management as above
-                        if self.output_stream:
-                            try:
-                                available = self.output_stream.get_write_available()
-                                if available < self.CHUNK:
-                                    self.audio_received_count += 1
-                                    return  # Drop if critically full
-                            except:
-                                pass
-                        
-                        # Ensure stream is active
-                        if not self.output_stream.is_active():
-                            print("⚠️ Output stream not active! Starting it...")
-                            self.output_stream.start_stream()
-                        
-                        # Write audio to output stream
-                        if self.output_stream:
-                            try:
-                                self.output_stream.write(media_data, exception_on_underflow=False)
-                                self.audio_received_count += 1
-                                
-                                if self.audio_received_count % 100 == 0:
-                                    print(f"🔊 Received {self.audio_received_count} audio packets (raw_data) | Wrote {len(media_data)} bytes")
-                            except OSError as e:
-                                if self.is_receiving:
-                                    print(f"❌ Audio output OSError: {e}")
-                            except Exception as e:
-                                if self.is_receiving:
-                                    print(f"❌ Unexpected audio write error: {e}")
+                    if len(raw_data) >= 2 and raw_data[0] == 0x61 and raw_data[1] == 0x7C:  # b'a|'
+                        # Same playback path as the 'frame' format
+                        self.handle_audio_raw(memoryview(raw_data)[2:])
                 except Exception as e:
                     print(f"❌ Error parsing raw audio format: {e}")
                         
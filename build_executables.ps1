@@ -26,6 +26,14 @@ if ($pyinstallerInstalled -notlike '*yes*') {
     pip install pyinstaller
 }
 
+# Compile icons into a Qt resource module (loaded from memory instead of disk)
+if (Get-Command pyrcc5 -ErrorAction SilentlyContinue) {
+    Write-Host "Compiling resources.qrc -> resources_rc.py"
+    pyrcc5 resources.qrc -o resources_rc.py
+} else {
+    Write-Host "pyrcc5 not found. Icons will be loaded from the icons folder."
+}
+
 # Build client using provided spec if present
 if (Test-Path .\VideoConference_Client.spec) {
     Write-Host "Building client with VideoConference_Client.spec"
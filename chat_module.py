@@ -5,8 +5,11 @@ Uses TCP for reliable message delivery.
 """
 
 import pickle
+import struct
 from datetime import datetime
 
+from utils import CHAT_TYPE_ID, pack_chat_message, unpack_chat_message, safe_loads
+
 
 class ChatHandler:
     """
@@ -34,16 +37,11 @@ class ChatHandler:
         # Get current username from client or use default
         username = self.client.username if hasattr(self.client, 'username') else self.username
         
-        # Create message packet with metadata
-        message = {
-            'type': 'chat',
-            'sender': username,
-            'timestamp': datetime.now().strftime('%H:%M:%S'),  # Format: HH:MM:SS
-            'text': text
-        }
+        # Binary chat packet with metadata (no pickling)
+        timestamp = datetime.now().strftime('%H:%M:%S')  # Format: HH:MM:SS
+        data = pack_chat_message(username, timestamp, text)
         
-        # Serialize and send via TCP for guaranteed delivery
-        data = pickle.dumps(message)
+        # Send via TCP for guaranteed delivery
         self.client.send_tcp(data)
 
     def handle_message(self, data):
@@ -51,18 +49,24 @@ class ChatHandler:
         Process incoming chat message and display in GUI.
         
         Args:
-            data: Pickled message data from server
+            data: Binary chat message, or legacy pickled message data from server
         """
         try:
-            # Deserialize message packet
-            message = pickle.loads(data)
+            if data[0] == CHAT_TYPE_ID:
+                sender, _, text = unpack_chat_message(data)
+            else:
+                # Legacy pickled message packet
+                message = safe_loads(data)
+                
+                # Verify it's a chat message
+                if message['type'] != 'chat':
+                    return
+                sender, text = message['sender'], message['text']
             
-            # Verify it's a chat message
-            if message['type'] == 'chat':
-                # Display message in chat panel if GUI is available
-                if self.client.gui:
-                    self.client.gui.add_chat_message(message['sender'], message['text'])
+            # Display message in chat panel if GUI is available
+            if self.client.gui:
+                self.client.gui.add_chat_message(sender, text)
                     
-        except (pickle.UnpicklingError, KeyError):
+        except (pickle.UnpicklingError, struct.error, IndexError, KeyError):
             # Ignore corrupted or non-chat messages
             pass
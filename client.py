@@ -7,12 +7,14 @@ Connects to FusionMeet server and provides PyQt5-based user interface.
 import socket
 import threading
 import pickle
+import re
 import struct
 import time
 import signal
 import atexit
+import logging
 from PyQt5.QtWidgets import QApplication, QMessageBox
-from PyQt5.QtCore import QMetaObject, Qt, Q_ARG
+from PyQt5.QtCore import QMetaObject, Qt, Q_ARG, QTimer
 import sys
 
 from config import *
@@ -23,7 +25,17 @@ from video_module import VideoHandler
 from audio_module import AudioHandler
 from screen_sharing_module import ScreenShareHandler
 from file_sharing_module import FileSharingHandler
-from utils import receive_with_size, send_with_size
+from utils import (receive_with_size, send_with_size, unpack_media_packet, set_socket_buffers, safe_loads,
+                   decode_message,
+                   pack_heartbeat, unpack_video_status,
+                   MIXED_AUDIO_TYPE_ID, CHAT_TYPE_ID, VIDEO_TYPE_ID, SCREEN_TYPE_ID, VIDEO_STATUS_TYPE_ID,
+                   FILE_CHUNK_TYPE_ID)
+
+# Server join/leave notices, e.g. "alice has joined the session"
+SYSTEM_PRESENCE_PATTERN = re.compile(r'^(.+?) has (joined|left) the session')
+
+# Per-packet diagnostics go through logger.debug so they cost a level check at INFO
+logger = logging.getLogger("fusionmeet.client")
 
 
 class Client:
@@ -38,19 +50,32 @@ class Client:
         self.server_port = TCP_PORT
         self.session_name = None
         self.username = None
-        self.tcp_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.tcp_socket = self._new_tcp_socket()
         self.udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        # Relayed webcam frames arrive on their own socket so JPEG decoding
+        # never queues mixed audio behind it
+        self.udp_video_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         self.is_running = False
         self.gui = None
         self.chat_handler = ChatHandler(self)
         
         # Participant tracking
-        self.participants = set()  # Set of usernames
+        self.participants = {}  # username -> {'joined_at', 'video_on'}, in join order
+        self._participants_version = 0  # Bumped on every membership change
         
         # Thread management
         self.tcp_thread = None
         self.udp_thread = None
+        self.video_udp_thread = None
         self.heartbeat_thread = None
+        self._shutdown_evt = threading.Event()  # Wakes the heartbeat thread on stop()
+        self.tcp_send_lock = threading.Lock()  # One frame at a time on tcp_socket (GUI, heartbeat, uploads)
+        
+        # Media receive counters (bumped by the UDP thread, logged by stats_timer)
+        self.video_rx_count = 0
+        self.audio_rx_count = 0
+        self.stats_timer = None
+        self._last_stats_time = time.time()
         
         # Media handlers (created after QApplication initialization)
         self.video_handler = None
@@ -58,8 +83,28 @@ class Client:
         self.screen_share_handler = None
         self.file_sharing_handler = None
         
+        # TCP message dispatch table {msg_type: handler(payload, data)}
+        self._tcp_handlers = {
+            'chat': self._handle_chat,
+            'video_status': self._handle_video_status,
+            'participants_list': self._handle_participants_list,
+            'presenter_changed': self._handle_presenter_changed,
+            'screen_share_approved': self._handle_screen_share_approved,
+            'screen_share_denied': self._handle_screen_share_denied,
+            'screen': self._handle_screen,
+            'screen_stop': self._handle_screen,
+            'file_request': self._handle_file_request,
+            'file_info': self._handle_file_info,
+            'available_files': self._handle_file_info,
+            'file_end': self._handle_file_chunk,
+            'file_error': self._handle_file_error,
+        }
+        
         # Network configuration
         self.udp_port = None  # Client's UDP port for receiving
+        self.udp_video_port = None  # Client's UDP port for relayed video
+        self.tcp_rtt = None  # Round-trip time measured by the TCP handshake (seconds)
+        self.udp_server_addr = None  # Server UDP endpoint (TCP port + 1), set on connect
         
         # Graceful shutdown handlers
         atexit.register(self._emergency_cleanup)
@@ -76,6 +121,7 @@ class Client:
         """Emergency cleanup on interpreter shutdown."""
         if self.is_running:
             self.is_running = False
+            self._shutdown_evt.set()
             try:
                 if hasattr(self, 'tcp_socket'):
                     self.tcp_socket.close()
@@ -92,6 +138,12 @@ class Client:
         Initializes PyQt5 app, displays login dialog, and launches main GUI.
         """
         app = QApplication(sys.argv)
+        logging.basicConfig(level=logging.INFO)
+        
+        # Receiver threads spend most of their time blocked in recv (GIL released);
+        # a shorter switch interval lets them reclaim the GIL promptly when a
+        # packet arrives instead of waiting out the Qt thread's time slice
+        sys.setswitchinterval(GIL_SWITCH_INTERVAL)
         
         # Apply global stylesheet for consistent dialog appearance
         app.setStyleSheet("""
@@ -148,22 +200,33 @@ class Client:
                 # Set connection timeout to prevent hanging
                 self.tcp_socket.settimeout(5)
                 
-                # Attempt TCP connection to server
+                # Attempt TCP connection to server (the handshake doubles as an RTT sample)
+                connect_start = time.monotonic()
                 self.tcp_socket.connect((self.server_host, self.server_port))
+                self.tcp_rtt = time.monotonic() - connect_start
                 
                 # Reset timeout after successful connection
                 self.tcp_socket.settimeout(None)
                 
-                # Bind UDP socket to random available port
-                self.udp_socket.bind(('', 0))
-                _, self.udp_port = self.udp_socket.getsockname()
+                # Bind UDP sockets to random available ports (once; a retry
+                # after a failed registration reuses the bound sockets)
+                if self.udp_port is None:
+                    self.udp_socket.bind(('', 0))
+                    set_socket_buffers(self.udp_socket, UDP_SOCKET_BUFFER)
+                    _, self.udp_port = self.udp_socket.getsockname()
+                    
+                    self.udp_video_socket.bind(('', 0))
+                    set_socket_buffers(self.udp_video_socket, UDP_SOCKET_BUFFER)
+                    _, self.udp_video_port = self.udp_video_socket.getsockname()
+                self.udp_server_addr = (self.server_host, self.server_port + 1)
                 
-                print(f"Connected to server, UDP port: {self.udp_port}")
+                print(f"Connected to server, UDP port: {self.udp_port} (video: {self.udp_video_port})")
 
-                # Register UDP port and session info with server
+                # Register UDP ports and session info with server
                 reg_msg = pickle.dumps({
                     'type': 'register_udp', 
                     'port': self.udp_port,
+                    'video_port': self.udp_video_port,
                     'username': self.username,
                     'session': self.session_name
                 })
@@ -179,8 +242,10 @@ class Client:
                 # Start network receiver threads
                 self.tcp_thread = threading.Thread(target=self.receive_tcp_data, daemon=False)
                 self.udp_thread = threading.Thread(target=self.receive_udp_data, daemon=False)
+                self.video_udp_thread = threading.Thread(target=self.receive_video_data, daemon=False)
                 self.tcp_thread.start()
                 self.udp_thread.start()
+                self.video_udp_thread.start()
 
                 # Initialize and display main GUI window
                 self.gui = MainWindow(self, self.username)
@@ -189,6 +254,12 @@ class Client:
                 # Display welcome message
                 self.gui.add_chat_message("System", f"Welcome to {self.session_name}, {self.username}!")
                 
+                # Log receive rates periodically instead of timing every packet
+                self._last_stats_time = time.time()
+                self.stats_timer = QTimer()
+                self.stats_timer.timeout.connect(self._log_media_rates)
+                self.stats_timer.start(3000)
+                
                 # Start Qt event loop
                 return_code = app.exec_()
                 self.stop()
@@ -202,10 +273,6 @@ class Client:
                 msg_box.setIcon(QMessageBox.Critical)
                 msg_box.exec_()
                 
-                # Recreate socket for next retry
-                self.tcp_socket.close()
-                self.tcp_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                
             except socket.timeout:
                 # Connection attempt timed out
                 msg_box = QMessageBox(None)
@@ -214,10 +281,6 @@ class Client:
                 msg_box.setIcon(QMessageBox.Critical)
                 msg_box.exec_()
                 
-                # Recreate socket for next retry
-                self.tcp_socket.close()
-                self.tcp_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                
             except Exception as e:
                 # Unexpected error during connection
                 msg_box = QMessageBox(None)
@@ -226,35 +289,51 @@ class Client:
                 msg_box.setIcon(QMessageBox.Critical)
                 msg_box.exec_()
                 print(f"Exception: {str(e)}")
-                
-                # Recreate socket for next retry
-                self.tcp_socket.close()
-                self.tcp_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            
+            # Only reached after a failed attempt (success exits above):
+            # a socket that failed connect() can't be reused, so replace it
+            self._reset_tcp_socket()
                 
         # Failed to connect after all attempts
         print("Failed to connect to server after multiple attempts")
         sys.exit(1)
 
+    def _new_tcp_socket(self):
+        """
+        Create the control connection socket.
+        
+        Returns:
+            socket.socket: TCP socket with Nagle disabled (chat and control
+            messages are small and latency-sensitive) and enlarged buffers
+            for file transfers (set before connect so the window scale covers them)
+        """
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        set_socket_buffers(sock, TCP_SOCKET_BUFFER)
+        return sock
+    
+    def _reset_tcp_socket(self):
+        """Close the current TCP socket and replace it with a fresh one for a retry."""
+        try:
+            self.tcp_socket.close()
+        except OSError:
+            pass
+        self.tcp_socket = self._new_tcp_socket()
+
     def _send_heartbeat(self):
         """
         Send periodic heartbeat to maintain server connection.
         Keeps UDP registration alive and prevents timeout.
         """
-        while self.is_running:
+        # Heartbeat interval: 15 seconds; stop() wakes the wait immediately
+        while not self._shutdown_evt.wait(15):
             try:
-                time.sleep(15)  # Heartbeat interval: 15 seconds
-                
                 if not self.is_running:
                     break
                     
                 # Send TCP heartbeat (reliable delivery)
-                heartbeat_msg = pickle.dumps({
-                    'type': 'heartbeat',
-                    'username': self.username,
-                    'udp_port': self.udp_port,
-                    'session': self.session_name
-                })
-                send_with_size(self.tcp_socket, heartbeat_msg)
+                with self.tcp_send_lock:
+                    send_with_size(self.tcp_socket, pack_heartbeat(self.udp_port))
                 
                 # Send UDP heartbeat to keep NAT mapping alive
                 try:
@@ -262,7 +341,7 @@ class Client:
                         'type': 'heartbeat',
                         'username': self.username
                     })
-                    self.udp_socket.sendto(udp_heartbeat, (self.server_host, self.server_port + 1))
+                    self.udp_socket.sendto(udp_heartbeat, self.udp_server_addr)
                 except:
                     pass  # UDP heartbeat is optional
                     
@@ -271,11 +350,29 @@ class Client:
                     print(f"Heartbeat error: {e}")
                 break
 
+    def _log_media_rates(self):
+        """Log video FPS and audio packet rate since the last call (runs on stats_timer)."""
+        now = time.time()
+        elapsed = now - self._last_stats_time
+        self._last_stats_time = now
+        
+        # Read and reset counters (approximate under concurrent increments; fine for stats)
+        video_count, self.video_rx_count = self.video_rx_count, 0
+        audio_count, self.audio_rx_count = self.audio_rx_count, 0
+        
+        if elapsed <= 0:
+            return
+        if video_count:
+            print(f"Receiving video at {video_count / elapsed:.1f} FPS")
+        if audio_count:
+            print(f"Receiving audio at {audio_count / elapsed:.1f} packets/second")
+    
     def stop(self):
         """
         Gracefully stop client and cleanup resources.
         Stops all media streams, closes sockets, and joins threads.
         """
+        self._shutdown_evt.set()
         print("🛑 Stopping client...")
         self.is_running = False
         
@@ -319,10 +416,17 @@ class Client:
         except Exception as e:
             print(f"Error closing UDP socket: {e}")
         
+        try:
+            if hasattr(self, 'udp_video_socket') and self.udp_video_socket:
+                self.udp_video_socket.close()
+        except Exception as e:
+            print(f"Error closing UDP video socket: {e}")
+        
         # Wait for all threads to finish (with timeout to prevent hanging)
         threads_to_join = [
             ('TCP receiver', self.tcp_thread),
             ('UDP receiver', self.udp_thread),
+            ('UDP video receiver', self.video_udp_thread),
             ('Heartbeat', self.heartbeat_thread)
         ]
         
@@ -343,13 +447,13 @@ class Client:
         Clears participants and notifies user via GUI.
         """
         # Clear participant list (server connection lost)
-        self.participants.clear()
+        self._set_participants([])
         
         # Update participants list in GUI
         if self.gui:
             QMetaObject.invokeMethod(
                 self.gui,
-                "update_participants_list",
+                "schedule_participants_update",
                 Qt.QueuedConnection
             )
             
@@ -370,10 +474,20 @@ class Client:
         reconnect_attempts = 0
         max_reconnect_attempts = 3
         
+        # Bind per-message lookups once; the socket and handlers are fixed
+        # before this thread starts
+        tcp_socket = self.tcp_socket
+        receive = receive_with_size
+        loads = decode_message
+        handle_chat = self.chat_handler.handle_message
+        handle_screen_frame = self.screen_share_handler.handle_screen_frame
+        handle_file_chunk = self.file_sharing_handler.handle_file_chunk_raw
+        get_handler = self._tcp_handlers.get
+        
         while self.is_running:
             try:
                 # Receive data with size prefix
-                data = receive_with_size(self.tcp_socket)
+                data = receive(tcp_socket)
                 if not data:
                     # Connection closed by server
                     if self.is_running:
@@ -395,134 +509,33 @@ class Client:
                                 )
                     break
                 
+                # Binary messages are routed by their tag byte without unpickling
+                tag = data[0]
+                if tag == CHAT_TYPE_ID:
+                    handle_chat(data)
+                    continue
+                if tag == SCREEN_TYPE_ID:
+                    handle_screen_frame(data)
+                    continue
+                if tag == VIDEO_STATUS_TYPE_ID:
+                    self._apply_video_status(*unpack_video_status(data))
+                    continue
+                if tag == FILE_CHUNK_TYPE_ID:
+                    handle_file_chunk(data)
+                    continue
+                
                 try:
                     # Deserialize message
-                    payload = pickle.loads(data)
+                    payload = loads(data)
                     msg_type = payload.get('type')
-                    print(f"Received message of type: {msg_type}")
-                    
-                    if msg_type == 'chat':
-                        # Handle chat messages and system notifications
-                        try:
-                            chat_data = pickle.loads(data)
-                            sender = chat_data.get('sender')
-                            message = chat_data.get('message', '')
-                            
-                            # Track participant changes from system messages
-                            if sender == 'System':
-                                if 'has joined the session' in message:
-                                    # Extract username from join notification
-                                    username = message.split(' has joined')[0]
-                                    print(f"Detected user connection: {username}")
-                                    if username != self.username:
-                                        self.participants.add(username)
-                                        
-                                        # Update GUI participants list
-                                        if self.gui:
-                                            QMetaObject.invokeMethod(
-                                                self.gui,
-                                                "update_participants_list",
-                                                Qt.QueuedConnection
-                                            )
-                                
-                                elif 'left the session' in message:
-                                    # Extract username from leave notification
-                                    username = message.split(' has left')[0]
-                                    print(f"Detected user disconnection: {username}")
-                                    self.participants.discard(username)
-                                    
-                                    # Update GUI participants list
-                                    if self.gui:
-                                        QMetaObject.invokeMethod(
-                                            self.gui,
-                                            "update_participants_list",
-                                            Qt.QueuedConnection
-                                        )
-                                    
-                                    # Remove their video widget
-                                    QMetaObject.invokeMethod(
-                                        self.video_handler, 
-                                        "remove_remote_video", 
-                                        Qt.QueuedConnection,
-                                        Q_ARG(str, username)
-                                    )
-                        except Exception as e:
-                            print(f"Error processing system message: {str(e)}")
-                            
-                        # Forward to chat handler for display
-                        self.chat_handler.handle_message(data)
-                        
-                    elif msg_type == 'video_status':
-                        # Handle video streaming status updates
-                        username = payload.get('username')
-                        is_streaming = payload.get('is_streaming')
-                        
-                        # Ignore own status updates
-                        if username != self.username:
-                            print(f"Video status update: {username} is {'streaming' if is_streaming else 'not streaming'}")
-                            self.video_handler.handle_video_status(username, is_streaming)
+                    logger.debug("Received message of type: %s", msg_type)
                     
-                    elif msg_type == 'participants_list':
-                        # Server sent current participants list
-                        participants = payload.get('participants', [])
-                        print(f"📋 Received participants list from server: {participants}")
-                        
-                        # Replace local participants list (don't merge)
-                        self.participants.clear()
-                        for username in participants:
-                            if username != self.username:
-                                self.participants.add(username)
-                        
-                        print(f"📋 Updated local participants: {sorted(self.participants)}")
-                        
-                        # Update GUI
-                        if self.gui:
-                            QMetaObject.invokeMethod(
-                                self.gui,
-                                "update_participants_list",
-                                Qt.QueuedConnection
-                            )
-                    
-                    elif msg_type == 'presenter_changed':
-                        # Screen sharing presenter has changed
-                        print(f"Received presenter_changed: {payload}")
-                        self.screen_share_handler.handle_presenter_changed(payload)
-                    
-                    elif msg_type == 'screen_share_approved':
-                        # Server approved our screen sharing request
-                        print(f"Received screen_share_approved: {payload}")
-                        self.screen_share_handler.handle_screen_share_approved(payload)
-                    
-                    elif msg_type == 'screen_share_denied':
-                        # Server denied our screen sharing request
-                        print(f"Received screen_share_denied: {payload}")
-                        self.screen_share_handler.handle_screen_share_denied(payload)
-                    
-                    elif msg_type == 'screen' or msg_type == 'screen_stop':
-                        # Screen sharing frame or stop notification
-                        self.screen_share_handler.handle_screen_frame(data)
-                    
-                    elif msg_type == 'file_request':
-                        # Another client requesting our shared file
-                        print(f"Got file request from server, forwarding to file_sharing_handler")
-                        self.file_sharing_handler.handle_file_info(data)
-                        
-                    elif msg_type in ['file_info', 'available_files']:
-                        # File availability information
-                        self.file_sharing_handler.handle_file_info(data)
-                        
-                    elif msg_type == 'file_chunk' or msg_type == 'file_end':
-                        # File data chunk or completion notification
-                        self.file_sharing_handler.handle_file_chunk(data)
-                        
-                    elif msg_type == 'file_error':
-                        # File transfer error
-                        print(f"File error: {payload.get('message', 'Unknown error')}")
-                        filename = payload.get('filename', 'unknown file')
-                        if hasattr(self, 'gui'):
-                            self.gui.add_chat_message("System", f"File error for {filename}: {payload.get('message')}")
+                    # Dispatch to the handler for this message type
+                    handler = get_handler(msg_type)
+                    if handler:
+                        handler(payload, data)
                             
-                except (pickle.UnpicklingError, KeyError):
+                except (pickle.UnpicklingError, KeyError, ValueError):
                     pass  # Ignore malformed messages
 
             except (ConnectionResetError, ConnectionAbortedError, OSError) as e:
@@ -541,6 +554,164 @@ class Client:
                 break
         
         print("📡 TCP receiver thread exiting")
+    
+    def _handle_chat(self, payload, data):
+        """
+        Handle chat messages and system notifications.
+        
+        Args:
+            payload: Deserialized message
+            data: Raw pickled message
+        """
+        try:
+            # Track participant changes from system messages
+            if payload.get('sender') == 'System':
+                match = SYSTEM_PRESENCE_PATTERN.match(payload.get('message', ''))
+                if match:
+                    username, action = match.groups()
+                    
+                    if action == 'joined':
+                        print(f"Detected user connection: {username}")
+                        if username != self.username:
+                            self._add_participant(username)
+                            
+                            # Update GUI participants list
+                            if self.gui:
+                                QMetaObject.invokeMethod(
+                                    self.gui,
+                                    "schedule_participants_update",
+                                    Qt.QueuedConnection
+                                )
+                    else:
+                        print(f"Detected user disconnection: {username}")
+                        self._remove_participant(username)
+                        
+                        # Update GUI participants list
+                        if self.gui:
+                            QMetaObject.invokeMethod(
+                                self.gui,
+                                "schedule_participants_update",
+                                Qt.QueuedConnection
+                            )
+                        
+                        # Remove their video widget
+                        QMetaObject.invokeMethod(
+                            self.video_handler, 
+                            "remove_remote_video", 
+                            Qt.QueuedConnection,
+                            Q_ARG(str, username)
+                        )
+        except Exception as e:
+            print(f"Error processing system message: {str(e)}")
+            
+        # Forward to chat handler for display
+        self.chat_handler.handle_message(data)
+    
+    def _handle_video_status(self, payload, data):
+        """Handle video streaming status updates from other clients."""
+        self._apply_video_status(payload.get('username'), payload.get('is_streaming'))
+    
+    def _apply_video_status(self, username, is_streaming):
+        """Record another client's camera state and update their video tile."""
+        # Ignore own status updates
+        if username != self.username:
+            print(f"Video status update: {username} is {'streaming' if is_streaming else 'not streaming'}")
+            info = self.participants.get(username)
+            if info is not None:
+                info['video_on'] = bool(is_streaming)
+            self.video_handler.handle_video_status(username, is_streaming)
+    
+    def _handle_participants_list(self, payload, data):
+        """Replace the local participants list with the server's."""
+        participants = payload.get('participants', [])
+        print(f"📋 Received participants list from server: {participants}")
+        
+        # Replace local participants list (don't merge)
+        self._set_participants(participants)
+        
+        print(f"📋 Updated local participants: {list(self.participants)}")
+        
+        # Update GUI
+        if self.gui:
+            QMetaObject.invokeMethod(
+                self.gui,
+                "schedule_participants_update",
+                Qt.QueuedConnection
+            )
+    
+    def _add_participant(self, username):
+        """Record a joined user; bumps the membership version if new."""
+        if username not in self.participants:
+            # Copy-on-write, like _set_participants: the GUI thread may be iterating
+            participants = dict(self.participants)
+            participants[username] = {'joined_at': time.time(), 'video_on': False}
+            self.participants = participants
+            self._participants_version += 1
+    
+    def _remove_participant(self, username):
+        """Forget a user who left; bumps the membership version if known."""
+        if username in self.participants:
+            participants = dict(self.participants)
+            del participants[username]
+            self.participants = participants
+            self._participants_version += 1
+    
+    def _set_participants(self, usernames):
+        """
+        Replace the participant table with the server's list.
+        Existing entries keep their join time and video state; the table is
+        swapped in one assignment so the GUI thread never sees it half-built.
+        
+        Args:
+            usernames: Usernames in the session (own name is skipped)
+        """
+        old = self.participants
+        new = {}
+        for username in usernames:
+            if username and username != self.username:
+                new[username] = old.get(username) or {'joined_at': time.time(), 'video_on': False}
+        if new.keys() != old.keys():
+            self.participants = new
+            self._participants_version += 1
+    
+    def _handle_presenter_changed(self, payload, data):
+        """Screen sharing presenter has changed."""
+        print(f"Received presenter_changed: {payload}")
+        self.screen_share_handler.handle_presenter_changed(payload)
+    
+    def _handle_screen_share_approved(self, payload, data):
+        """Server approved our screen sharing request."""
+        print(f"Received screen_share_approved: {payload}")
+        self.screen_share_handler.handle_screen_share_approved(payload)
+    
+    def _handle_screen_share_denied(self, payload, data):
+        """Server denied our screen sharing request."""
+        print(f"Received screen_share_denied: {payload}")
+        self.screen_share_handler.handle_screen_share_denied(payload)
+    
+    def _handle_screen(self, payload, data):
+        """Screen sharing frame or stop notification."""
+        self.screen_share_handler.handle_screen_frame(data)
+    
+    def _handle_file_request(self, payload, data):
+        """Another client requesting our shared file."""
+        print(f"Got file request from server, forwarding to file_sharing_handler")
+        self.file_sharing_handler.handle_file_info(payload)
+    
+    def _handle_file_info(self, payload, data):
+        """File availability information."""
+        self.file_sharing_handler.handle_file_info(payload)
+    
+    def _handle_file_chunk(self, payload, data):
+        """File transfer completion notification (chunks arrive as binary messages)."""
+        self.file_sharing_handler.handle_file_chunk(payload)
+    
+    def _handle_file_error(self, payload, data):
+        """File transfer error."""
+        print(f"File error: {payload.get('message', 'Unknown error')}")
+        filename = payload.get('filename', 'unknown file')
+        if hasattr(self, 'gui'):
+            self.gui.add_chat_message("System", f"File error for {filename}: {payload.get('message')}")
 
 
     def receive_udp_data(self):
@@ -548,59 +719,69 @@ class Client:
         UDP receiver thread - handles real-time media streams.
         Processes video frames and audio packets with minimal latency.
         """
-        # Performance tracking
-        frame_count = 0
-        last_fps_time = time.time()
-        audio_count = 0
-        last_audio_time = time.time()
+        # Reused receive buffer: handlers consume each packet before the next
+        # recv (audio is copied into the playback ring, video is decoded)
+        recv_buf = bytearray(65536)
+        recv_view = memoryview(recv_buf)
+        
+        # Bind per-packet lookups once; the socket and handlers are fixed
+        # before this thread starts
+        recvfrom_into = self.udp_socket.recvfrom_into
+        unpack_packet = unpack_media_packet
+        loads = safe_loads
+        handle_audio_raw = self.audio_handler.handle_audio_raw if self.audio_handler else None
+        handle_frame_raw = self.video_handler.handle_frame_raw
         
         while self.is_running:
             try:
                 # Receive UDP packet (blocking call)
-                data, addr = self.udp_socket.recvfrom(65536)
+                nbytes, addr = recvfrom_into(recv_buf)
                 
                 # Check if client is shutting down
                 if not self.is_running:
                     break
+                
+                if not nbytes:
+                    continue
+                data = recv_view[:nbytes]
+                tag = data[0]
+                
+                # Server-mixed audio: [type][PCM], played without unpickling
+                if tag == MIXED_AUDIO_TYPE_ID:
+                    self.audio_rx_count += 1
+                    if handle_audio_raw:
+                        handle_audio_raw(data[1:])
+                    continue
+                
+                # Relayed webcam frame: [type][name len][name][JPEG]
+                # (servers without per-client video ports relay it here)
+                if tag == VIDEO_TYPE_ID:
+                    _, username, frame_data = unpack_packet(data)
+                    self.video_rx_count += 1
+                    handle_frame_raw(username, frame_data, addr)
+                    continue
                     
                 try:
                     # Deserialize packet
-                    payload = pickle.loads(data)
+                    payload = loads(data)
                     data_type = payload.get('type')
-                    username = payload.get('username', 'Unknown')
                     
                     if data_type == 'video':
                         # Video frame received
-                        frame_count += 1
-                        current_time = time.time()
-                        
-                        # Log FPS every 3 seconds
-                        if current_time - last_fps_time > 3:
-                            fps = frame_count / (current_time - last_fps_time)
-                            print(f"Receiving video from {username} at {fps:.1f} FPS")
-                            frame_count = 0
-                            last_fps_time = current_time
+                        self.video_rx_count += 1
                         
                         # Forward to video handler
                         self.video_handler.handle_frame(data, addr)
                         
                     elif data_type == 'audio' or data_type == 'mixed_audio':
                         # Audio packet received
-                        audio_count += 1
-                        current_time = time.time()
-                        
-                        # Log audio rate every 5 seconds
-                        if current_time - last_audio_time > 5:
-                            rate = audio_count / (current_time - last_audio_time)
-                            print(f"Receiving {data_type} at {rate:.1f} packets/second")
-                            audio_count = 0
-                            last_audio_time = current_time
+                        self.audio_rx_count += 1
                         
                         # Forward to audio handler
                         if self.audio_handler:
                             self.audio_handler.handle_audio(data)
                         else:
-                            print("No audio handler available to process audio")
+                            logger.debug("No audio handler available to process audio")
                     
                 except (pickle.UnpicklingError, KeyError) as e:
                     if self.is_running:
@@ -621,6 +802,48 @@ class Client:
         print("📡 UDP receiver thread exiting")
 
 
+    def receive_video_data(self):
+        """
+        Video receiver thread - handles relayed webcam frames.
+        Runs beside receive_udp_data so frame decoding never delays audio.
+        """
+        recv_buf = bytearray(65536)
+        recv_view = memoryview(recv_buf)
+        
+        # Bind per-packet lookups once; the socket and handler are fixed
+        # before this thread starts
+        recvfrom_into = self.udp_video_socket.recvfrom_into
+        unpack_packet = unpack_media_packet
+        handle_frame_raw = self.video_handler.handle_frame_raw
+        
+        while self.is_running:
+            try:
+                nbytes, addr = recvfrom_into(recv_buf)
+                
+                if not self.is_running:
+                    break
+                
+                if not nbytes or recv_buf[0] != VIDEO_TYPE_ID:
+                    continue
+                
+                # Relayed webcam frame: [type][name len][name][JPEG]
+                _, username, frame_data = unpack_packet(recv_view[:nbytes])
+                self.video_rx_count += 1
+                handle_frame_raw(username, frame_data, addr)
+                
+            except OSError as e:
+                # Socket error (likely during shutdown)
+                if self.is_running:
+                    print(f"UDP video socket error: {e}")
+                break
+                
+            except Exception as e:
+                # Malformed frame; keep receiving
+                if self.is_running:
+                    logger.debug("Dropped video packet: %s", e)
+        
+        print("📡 UDP video receiver thread exiting")
+
     def send_tcp(self, data):
         """
         Send data via TCP (reliable, ordered delivery).
@@ -629,16 +852,19 @@ class Client:
             data: Pickled data to send
         """
         try:
-            send_with_size(self.tcp_socket, data)
+            with self.tcp_send_lock:
+                send_with_size(self.tcp_socket, data)
         except OSError:
             pass  # Socket closed during shutdown
 
-    def send_udp(self, data):
+    def send_udp(self, data, msg_type=None):
         """
         Send data via UDP (fast, unreliable delivery for real-time media).
         
         Args:
-            data: Pickled data to send
+            data: Binary media packet (header from pack_media_header already
+                  carries the username for server routing)
+            msg_type: Optional packet kind ('video', 'audio') for debug logging
             
         Returns:
             bool: True if sent successfully, False otherwise
@@ -646,50 +872,24 @@ class Client:
         if not self.is_running:
             return False
         
-        try:
-            # Ensure username is in packet for server routing
-            try:
-                payload = pickle.loads(data)
-                if 'username' not in payload:
-                    payload['username'] = self.username
-                    data = pickle.dumps(payload)
-            except:
-                pass
-            
-            packet_size = len(data)
-            MAX_UDP_PACKET = 8192
-        
-            if packet_size <= MAX_UDP_PACKET:
-                # Retry logic for reliability
-                max_retries = 2
-                for attempt in range(max_retries):
-                    try:
-                        self.udp_socket.sendto(data, (self.server_host, self.server_port + 1))
-                    
-                        # Log video sends (reduced frequency)
-                        try:
-                            payload = pickle.loads(data)
-                            if payload.get('type') == 'video' and attempt == 0:
-                                print(f"✅ Video frame sent by {self.username}")
-                        except:
-                            pass
-                        
-                        return True
-                        
-                    except Exception as e:
-                        if attempt == max_retries - 1:
-                            print(f"❌ Failed to send UDP packet after {max_retries} attempts: {e}")
-                            return False
-                        time.sleep(0.001)  # Brief delay before retry
-            else:
-                print(f"Packet too large ({packet_size} bytes), reducing quality")
-                return False
-            
-            return True
+        packet_size = len(data)
+        MAX_UDP_PACKET = 8192
         
+        if packet_size > MAX_UDP_PACKET:
+            print(f"Packet too large ({packet_size} bytes), reducing quality")
+            return False
+        
+        # Single send, no retry: a failed datagram is stale by the time a
+        # retry would go out, and sleeping here stalls the media thread
+        try:
+            self.udp_socket.sendto(data, self.udp_server_addr)
         except Exception as e:
-            print(f"Error sending UDP data: {e}")
+            if self.is_running:
+                print(f"❌ Failed to send UDP packet: {e}")
             return False
+        
+        logger.debug("✅ %s packet sent by %s", msg_type or 'UDP', self.username)
+        return True
 
 
 if __name__ == "__main__":
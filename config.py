@@ -12,6 +12,9 @@ Contains network ports, media parameters, and GUI styling.
 HOST = '0.0.0.0'  # Bind to all network interfaces (allows external connections)
 TCP_PORT = 65435  # Control channel port (chat, signaling, file transfers)
 UDP_PORT = 65436  # Media channel port (audio, video streams)
+UDP_SOCKET_BUFFER = 4 * 1024 * 1024  # UDP kernel send/receive buffer (absorbs media bursts)
+TCP_SOCKET_BUFFER = 1024 * 1024  # TCP send/receive buffer (keeps file transfers from stalling on flow control)
+GIL_SWITCH_INTERVAL = 0.001  # Seconds; lets receiver threads take the GIL sooner (CPython default 0.005)
 
 # Client default server address
 SERVER_HOST = '127.0.0.1'  # Default localhost (overridden by login dialog)
@@ -34,18 +37,28 @@ VIDEO_FPS = 20      # Target frames per second (balance between quality and band
 AUDIO_FORMAT = 8       # PyAudio format: paInt16 (16-bit PCM audio)
 AUDIO_CHANNELS = 1     # Mono audio (reduces bandwidth, prevents phase issues)
 AUDIO_RATE = 22050     # Sample rate in Hz (balance between quality and bandwidth)
-AUDIO_CHUNK = 2048     # Samples per buffer (larger = more latency, smaller = more CPU)
+AUDIO_CHUNK = 2048     # Samples per network audio frame (must match the server's mixer)
+
+# Device buffering (independent of AUDIO_CHUNK: PyAudio reads any frame count)
+AUDIO_TARGET_LATENCY_MS = 30  # Desired device buffer latency; rounded up to a power of two
+AUDIO_BUFFER_PRESETS = {
+    'low_latency': 128,   # Smallest practical device buffer (more CPU, risk of underruns)
+    'stable': 1024,       # Large device buffer (robust on slow or busy machines)
+}
 
 # Audio buffering and processing
 AUDIO_BUFFER_MS = 60   # Output buffer size in milliseconds (prevents crackling)
 AUDIO_MIN_LEVEL = 0.005  # Silence detection threshold (0.0 = silent, 1.0 = max volume)
+AUDIO_SILENCE_HANGOVER_MS = 500  # Keep sending this long after speech so pauses aren't clipped
 AUDIO_FALLBACK_RATES = [48000, 16000, 8000]  # Alternative rates if hardware doesn't support default
 AUDIO_MAX_RETRY = 3    # Retry attempts for audio device initialization
 AUDIO_DEVICE_TIMEOUT = 2.0  # Seconds to wait when testing audio devices
 
 # Audio quality enhancement
-AUDIO_DYNAMIC_GAIN = True   # Automatically adjust volume levels
+AUDIO_DYNAMIC_GAIN = False  # Automatically boost quiet mics (opt-in, up to AUDIO_MAX_GAIN)
 AUDIO_NORMALIZE = True      # Normalize audio to prevent clipping
+AUDIO_TARGET_PEAK = 0.9     # Peak level (fraction of full scale) gain aims for
+AUDIO_MAX_GAIN = 4.0        # Upper bound on dynamic gain so quiet mics don't amplify noise
 AUDIO_FRAME_TIMEOUT = 0.2   # Seconds before discarding stale audio frames
 
 
@@ -53,7 +66,15 @@ AUDIO_FRAME_TIMEOUT = 0.2   # Seconds before discarding stale audio frames
 # FILE SHARING CONFIGURATION
 # =============================================================================
 
-FILE_CHUNK_SIZE = 32768  # 32 KB per chunk (balance between memory and transfer speed)
+FILE_CHUNK_SIZE = 262144  # 256 KB per chunk (default until a transfer rate has been measured)
+FILE_CHUNK_MIN = 64 * 1024         # Chunk size for small files
+FILE_CHUNK_MAX = 4 * 1024 * 1024   # Upper bound for bandwidth-delay sized chunks
+FILE_SMALL_SIZE = 1024 * 1024      # Files below this always use FILE_CHUNK_MIN
+FILE_LARGE_SIZE = 16 * 1024 * 1024  # Files at or above this use chunks of at least FILE_CHUNK_LARGE
+FILE_CHUNK_LARGE = 1024 * 1024      # Chunk size floor for large files
+FILE_CHUNK_RAMP_START = 16 * 1024  # First chunk of a transfer; doubles per chunk up to the chosen size
+FILE_WRITE_BUFFER = 1024 * 1024     # Downloads are written to disk in blocks of up to this size
+FILE_WRITE_QUEUE = 32               # Received chunks a download's writer thread may fall behind by
 DEFAULT_DOWNLOAD_DIR = "G_meet_downloads"  # Download folder name (created in user's Downloads)
 MAX_FILE_SIZE = 1024 * 1024 * 500  # 500 MB maximum file size (prevents memory issues)
 
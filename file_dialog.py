@@ -4,12 +4,258 @@ GUI dialog for viewing and downloading shared files within a session.
 Displays available files in a table with download functionality.
 """
 
-from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QPushButton, 
-                          QTableWidget, QTableWidgetItem, QLabel, QHeaderView,
-                          QFileDialog, QMessageBox, QDesktopWidget)
-from PyQt5.QtCore import Qt, QSize
-from PyQt5.QtGui import QFont, QIcon
-from utils import resource_path
+import functools
+
+from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QPushButton, QLineEdit,
+                          QTableView, QLabel, QHeaderView, QStyledItemDelegate, QStyle,
+                          QFileDialog, QMessageBox)
+from PyQt5.QtCore import (Qt, QSize, QEvent, QAbstractTableModel, QModelIndex, pyqtSignal,
+                          QSortFilterProxyModel)
+from PyQt5.QtGui import QFont, QIcon, QColor, QPainter, QGuiApplication
+from utils import icon_source
+
+
+# Size units indexed by (bit_length - 1) // 10: bytes, KB, MB, GB
+_KB = 1 << 10
+_MB = 1 << 20
+_GB = 1 << 30
+_SIZE_UNITS = ((1, None), (_KB, "KB"), (_MB, "MB"), (_GB, "GB"))
+
+
+@functools.lru_cache(maxsize=1024)
+def format_size(size_bytes):
+    """
+    Convert file size in bytes to human-readable format.
+    Cached, since refreshes re-format the same sizes.
+    
+    Args:
+        size_bytes: File size in bytes
+        
+    Returns:
+        str: Formatted size (e.g., "1.5 MB", "234 KB")
+    """
+    unit_index = min(max((size_bytes.bit_length() - 1) // 10, 0), 3)
+    divisor, suffix = _SIZE_UNITS[unit_index]
+    if suffix is None:
+        return f"{size_bytes} bytes"
+    return f"{size_bytes / divisor:.1f} {suffix}"
+
+
+class SharedFilesModel(QAbstractTableModel):
+    """
+    Table model over a snapshot of the shared files list.
+    Columns: file name, formatted size, download action (painted by
+    DownloadButtonDelegate). Shows a single placeholder row when empty.
+    Rows are exposed PAGE_SIZE at a time through fetchMore, so the view
+    only ever sees the rows it has scrolled to. The snapshot is kept in the
+    view's sort order, so each fetched page sorts after the rows already shown.
+    """
+    
+    HEADERS = ("File Name", "Size", "Action")
+    PLACEHOLDER = "No files available"
+    PAGE_SIZE = 500
+    
+    def __init__(self, parent=None):
+        """
+        Args:
+            parent: Owning QObject
+        """
+        super().__init__(parent)
+        self._rows = []  # [(filename, filesize)]
+        self._loaded = 0  # Rows exposed to the view so far
+        self._sort = None  # (column, order) the snapshot is kept in, or None
+    
+    def set_files(self, files):
+        """
+        Replace the snapshot with the current shared files.
+        
+        Args:
+            files: Dict of {filename: filesize}
+        """
+        self.beginResetModel()
+        self._rows = self._sorted(list(files.items()))
+        self._loaded = min(len(self._rows), self.PAGE_SIZE)
+        self.endResetModel()
+    
+    def sort_rows(self, column, order):
+        """
+        Keep the snapshot sorted like the view (see SharedFilesProxyModel.sort).
+        
+        Args:
+            column: Sorted column, or -1 for unsorted
+            order: Qt.AscendingOrder or Qt.DescendingOrder
+        """
+        self._sort = (column, order) if column >= 0 else None
+        if self._rows:
+            self.beginResetModel()
+            self._rows = self._sorted(self._rows)
+            self.endResetModel()
+    
+    def _sorted(self, rows):
+        """Rows in the current sort order, using the same keys as Qt.UserRole."""
+        if self._sort is None:
+            return rows
+        column, order = self._sort
+        if column == 1:
+            key = lambda row: row[1]
+        else:
+            key = lambda row: row[0].lower()
+        return sorted(rows, key=key, reverse=order == Qt.DescendingOrder)
+    
+    def is_placeholder(self):
+        """True when the model is showing the "no files" row."""
+        return not self._rows
+    
+    def filename_at(self, row):
+        """Filename for a row, or None for the placeholder row."""
+        if 0 <= row < self._loaded:
+            return self._rows[row][0]
+        return None
+    
+    def canFetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return False
+        return self._loaded < len(self._rows)
+    
+    def fetchMore(self, parent=QModelIndex(), count=None):
+        """Expose the next page of rows (or count rows) to the view."""
+        if parent.isValid():
+            return
+        remaining = len(self._rows) - self._loaded
+        count = min(remaining, self.PAGE_SIZE if count is None else count)
+        if count <= 0:
+            return
+        self.beginInsertRows(QModelIndex(), self._loaded, self._loaded + count - 1)
+        self._loaded += count
+        self.endInsertRows()
+    
+    def fetch_all(self):
+        """Expose every remaining row (needed before filtering the full list)."""
+        self.fetchMore(count=len(self._rows) - self._loaded)
+    
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return self._loaded or 1
+    
+    def columnCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return 3
+    
+    def data(self, index, role=Qt.DisplayRole):
+        # Views query many roles per cell while painting; answer only what is used
+        if role == Qt.DisplayRole:
+            if not self._rows:
+                return self.PLACEHOLDER if index.column() == 0 else None
+            column = index.column()
+            if column == 0:
+                return self._rows[index.row()][0]
+            if column == 1:
+                return format_size(self._rows[index.row()][1])
+            return ""
+        if role == Qt.UserRole:
+            # Sort key: case-insensitive name, raw byte count for size
+            if not self._rows:
+                return None
+            filename, filesize = self._rows[index.row()]
+            return filesize if index.column() == 1 else filename.lower()
+        if role == Qt.TextAlignmentRole:
+            if not self._rows or index.column() == 1:
+                return Qt.AlignCenter
+        return None
+    
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return None
+    
+    def flags(self, index):
+        if not self._rows:
+            return Qt.ItemIsEnabled  # Placeholder is not selectable
+        return Qt.ItemIsSelectable | Qt.ItemIsEnabled
+
+
+class SharedFilesProxyModel(QSortFilterProxyModel):
+    """
+    Sorts and filters a SharedFilesModel by file name (case-insensitive
+    substring). The placeholder row is never filtered out.
+    """
+    
+    def __init__(self, parent=None):
+        """
+        Args:
+            parent: Owning QObject
+        """
+        super().__init__(parent)
+        self.setFilterCaseSensitivity(Qt.CaseInsensitive)
+        self.setFilterKeyColumn(0)
+        self.setSortRole(Qt.UserRole)
+    
+    def sort(self, column, order=Qt.AscendingOrder):
+        # Sort the source snapshot too: the proxy only sorts loaded rows, and a
+        # page fetched later would otherwise land in the middle of them
+        self.sourceModel().sort_rows(column, order)
+        super().sort(column, order)
+    
+    def filterAcceptsRow(self, source_row, source_parent):
+        if self.sourceModel().is_placeholder():
+            return True
+        return super().filterAcceptsRow(source_row, source_parent)
+    
+    def is_placeholder(self):
+        """True when the source model is showing the "no files" row."""
+        return self.sourceModel().is_placeholder()
+    
+    def filename_at(self, row):
+        """Filename for a proxy row, or None for the placeholder row."""
+        source_index = self.mapToSource(self.index(row, 0))
+        if not source_index.isValid():
+            return None
+        return self.sourceModel().filename_at(source_index.row())
+
+
+class DownloadButtonDelegate(QStyledItemDelegate):
+    """
+    Paints a "Download" button in the action column and reports clicks,
+    instead of creating a QPushButton widget per row.
+    """
+    
+    download_clicked = pyqtSignal(str)
+    
+    BUTTON_COLOR = QColor("#4CAF50")
+    BUTTON_HOVER_COLOR = QColor("#45a049")
+    BUTTON_MARGIN = 4
+    
+    def paint(self, painter, option, index):
+        model = index.model()
+        if model.is_placeholder():
+            super().paint(painter, option, index)
+            return
+        
+        rect = option.rect.adjusted(self.BUTTON_MARGIN, self.BUTTON_MARGIN,
+                                    -self.BUTTON_MARGIN, -self.BUTTON_MARGIN)
+        hovered = bool(option.state & QStyle.State_MouseOver)
+        
+        painter.save()
+        painter.setRenderHint(QPainter.Antialiasing)
+        painter.setPen(Qt.NoPen)
+        painter.setBrush(self.BUTTON_HOVER_COLOR if hovered else self.BUTTON_COLOR)
+        painter.drawRoundedRect(rect, 3, 3)
+        painter.setPen(Qt.white)
+        painter.drawText(rect, Qt.AlignCenter, "Download")
+        painter.restore()
+    
+    def editorEvent(self, event, model, option, index):
+        if event.type() == QEvent.MouseButtonRelease and event.button() == Qt.LeftButton:
+            filename = model.filename_at(index.row())
+            if filename is not None and option.rect.contains(event.pos()):
+                self.download_clicked.emit(filename)
+                return True
+        return super().editorEvent(event, model, option, index)
+    
+    def sizeHint(self, option, index):
+        return QSize(100, 32)
 
 
 class SharedFilesDialog(QDialog):
@@ -18,6 +264,20 @@ class SharedFilesDialog(QDialog):
     Allows users to view available files and initiate downloads.
     """
     
+    # Button icons, loaded once and shared by every dialog instance
+    REFRESH_ICON = None
+    SHARE_ICON = None
+    
+    # Center of the primary screen's available area, queried once
+    _cached_center = None
+    
+    @classmethod
+    def _ensure_icons(cls):
+        """Load the button icons on first use."""
+        if cls.REFRESH_ICON is None:
+            cls.REFRESH_ICON = QIcon(icon_source("icons/refresh.png"))
+            cls.SHARE_ICON = QIcon(icon_source("icons/file_transfer.png"))
+    
     def __init__(self, parent, file_handler):
         """
         Initialize shared files dialog.
@@ -41,16 +301,16 @@ class SharedFilesDialog(QDialog):
                 background-color: #212121;
                 color: white;
             }
-            QTableWidget {
+            QTableView {
                 background-color: #333333;
                 color: white;
                 border: none;
                 gridline-color: #444444;
             }
-            QTableWidget::item {
+            QTableView::item {
                 padding: 10px;
             }
-            QTableWidget::item:selected {
+            QTableView::item:selected {
                 background-color: #0078d7;
             }
             QHeaderView::section {
@@ -76,6 +336,13 @@ class SharedFilesDialog(QDialog):
             QLabel {
                 color: white;
             }
+            QLineEdit {
+                background-color: #333333;
+                color: white;
+                border: 1px solid #444444;
+                border-radius: 4px;
+                padding: 6px;
+            }
         """)
         
         # Create title label
@@ -84,25 +351,48 @@ class SharedFilesDialog(QDialog):
         self.title_label.setAlignment(Qt.AlignCenter)
         self.layout.addWidget(self.title_label)
         
-        # Create files table (3 columns: name, size, action)
-        self.files_table = QTableWidget(0, 3)
-        self.files_table.setHorizontalHeaderLabels(["File Name", "Size", "Action"])
-        self.files_table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)  # Filename stretches
-        self.files_table.horizontalHeader().setSectionResizeMode(1, QHeaderView.ResizeToContents)  # Size fits content
-        self.files_table.horizontalHeader().setSectionResizeMode(2, QHeaderView.ResizeToContents)  # Action fits button
+        # Filter box: narrows the table by file name as the user types
+        self.filter_edit = QLineEdit()
+        self.filter_edit.setPlaceholderText("Filter files…")
+        self.filter_edit.setClearButtonEnabled(True)
+        self.filter_edit.textChanged.connect(self.filter_files)
+        self.layout.addWidget(self.filter_edit)
+        
+        # Create files table (3 columns: name, size, action) backed by a model;
+        # only visible rows are painted and no widget is created per row
+        self.files_model = SharedFilesModel(self)
+        self.files_proxy = SharedFilesProxyModel(self)
+        self.files_proxy.setSourceModel(self.files_model)
+        self.download_delegate = DownloadButtonDelegate(self)
+        self.download_delegate.download_clicked.connect(self.download_file)
+        
+        self.files_table = QTableView()
+        self.files_table.setModel(self.files_proxy)
+        self.files_table.setSortingEnabled(True)
+        self.files_table.sortByColumn(0, Qt.AscendingOrder)
+        self.files_table.setItemDelegateForColumn(2, self.download_delegate)
+        self.files_table.setMouseTracking(True)  # Hover state for the painted buttons
+        header = self.files_table.horizontalHeader()
+        header.setSectionResizeMode(0, QHeaderView.Stretch)  # Filename stretches
+        # Fixed widths: ResizeToContents would measure every cell on each refresh
+        header.setSectionResizeMode(1, QHeaderView.Fixed)
+        header.setSectionResizeMode(2, QHeaderView.Fixed)
+        self.files_table.setColumnWidth(1, 100)
+        self.files_table.setColumnWidth(2, 110)
         self.files_table.verticalHeader().setVisible(False)  # Hide row numbers
-        self.files_table.setSelectionBehavior(QTableWidget.SelectRows)  # Select entire rows
+        self.files_table.setSelectionBehavior(QTableView.SelectRows)  # Select entire rows
         self.layout.addWidget(self.files_table)
         
         # Create bottom action buttons
         self.buttons_layout = QHBoxLayout()
+        self._ensure_icons()
         
         self.refresh_button = QPushButton("Refresh")
-        self.refresh_button.setIcon(QIcon(resource_path("icons/refresh.png")))
+        self.refresh_button.setIcon(self.REFRESH_ICON)
         self.refresh_button.clicked.connect(self.refresh_files)
         
         self.share_button = QPushButton("Share New File")
-        self.share_button.setIcon(QIcon(resource_path("icons/file_transfer.png")))
+        self.share_button.setIcon(self.SHARE_ICON)
         self.share_button.clicked.connect(self.share_new_file)
         
         self.close_button = QPushButton("Close")
@@ -121,80 +411,36 @@ class SharedFilesDialog(QDialog):
     def refresh_files(self):
         """
         Update table with latest shared files from server.
-        Clears existing entries and repopulates with current file list.
-        """
-        self.files_table.setRowCount(0)  # Clear all rows
-        
-        # Populate table with files from file handler
-        file_count = 0
-        for row, (filename, filesize) in enumerate(self.file_handler.files.items()):
-            self.files_table.insertRow(row)
-            file_count += 1
-            
-            # Column 0: File name (read-only)
-            name_item = QTableWidgetItem(filename)
-            name_item.setFlags(Qt.ItemIsSelectable | Qt.ItemIsEnabled)
-            self.files_table.setItem(row, 0, name_item)
-            
-            # Column 1: File size (formatted, centered)
-            size_str = self.format_size(filesize)
-            size_item = QTableWidgetItem(size_str)
-            size_item.setFlags(Qt.ItemIsSelectable | Qt.ItemIsEnabled)
-            size_item.setTextAlignment(Qt.AlignCenter)
-            self.files_table.setItem(row, 1, size_item)
-            
-            # Column 2: Download button
-            download_button = QPushButton("Download")
-            download_button.setStyleSheet("""
-                QPushButton {
-                    background-color: #4CAF50;
-                    color: white;
-                    border: none;
-                    padding: 5px 10px;
-                    border-radius: 3px;
-                }
-                QPushButton:hover {
-                    background-color: #45a049;
-                }
-            """)
-            # Connect button to download function with filename
-            download_button.clicked.connect(lambda _, f=filename: self.download_file(f))
-            
-            self.files_table.setCellWidget(row, 2, download_button)
-            
-        # Show message if no files available
-        if file_count == 0:
-            self.files_table.setRowCount(1)
-            no_files_item = QTableWidgetItem("No files available")
-            no_files_item.setFlags(Qt.ItemIsEnabled)  # Not selectable
-            no_files_item.setTextAlignment(Qt.AlignCenter)
-            self.files_table.setSpan(0, 0, 1, 3)  # Span all 3 columns
-            self.files_table.setItem(0, 0, no_files_item)
-    
-    def format_size(self, size_bytes):
-        """
-        Convert file size in bytes to human-readable format.
+        Swaps the model's snapshot; the view repaints only visible rows.
+        """
+        _, files = self.file_handler.files_snapshot()
+        self.files_model.set_files(files)
+        if self.filter_edit.text():
+            self.files_model.fetch_all()  # Filter must see every file, not just the first page
+        
+        # Placeholder message spans all 3 columns
+        self.files_table.clearSpans()
+        if self.files_model.is_placeholder():
+            self.files_table.setSpan(0, 0, 1, 3)
+    
+    def filter_files(self, text):
+        """
+        Show only files whose name contains text (case-insensitive).
         
         Args:
-            size_bytes: File size in bytes
-            
-        Returns:
-            str: Formatted size (e.g., "1.5 MB", "234 KB")
-        """
-        if size_bytes < 1024:
-            return f"{size_bytes} bytes"
-        elif size_bytes < 1024 * 1024:
-            return f"{size_bytes / 1024:.1f} KB"
-        elif size_bytes < 1024 * 1024 * 1024:
-            return f"{size_bytes / (1024 * 1024):.1f} MB"
-        else:
-            return f"{size_bytes / (1024 * 1024 * 1024):.1f} GB"
-            
+            text: Substring to match; empty shows every file
+        """
+        if text:
+            self.files_model.fetch_all()
+        self.files_proxy.setFilterFixedString(text)
+    
     def center_on_screen(self):
         """Position dialog at center of screen."""
+        cls = SharedFilesDialog
+        if cls._cached_center is None:
+            cls._cached_center = QGuiApplication.primaryScreen().availableGeometry().center()
         qr = self.frameGeometry()
-        cp = QDesktopWidget().availableGeometry().center()
-        qr.moveCenter(cp)
+        qr.moveCenter(cls._cached_center)
         self.move(qr.topLeft())
     
     def share_new_file(self):
@@ -4,16 +4,515 @@ Handles peer-to-peer file upload, distribution, and download within sessions.
 Uses TCP for reliable chunked transfer with progress tracking.
 """
 
+import errno
+import hashlib
+import logging
 import os
-import pickle
+import queue
+import shutil
 import struct
+import threading
 import time
+import zlib
+from contextlib import closing, nullcontext
 from PyQt5.QtWidgets import QFileDialog, QProgressDialog, QMessageBox, QWidget, QDialog, QLabel, QHBoxLayout, QVBoxLayout, QPushButton, QStyle
-from PyQt5.QtCore import Qt, pyqtSignal, QObject, QMetaObject, Q_ARG
+from PyQt5.QtCore import Qt, pyqtSignal, QObject, QMetaObject, QRunnable, QThreadPool, QTimer, Q_ARG
 from PyQt5.QtGui import QPalette, QColor, QPixmap
 
-from utils import send_with_size, receive_with_size
-from config import FILE_CHUNK_SIZE, DEFAULT_DOWNLOAD_DIR, MAX_FILE_SIZE
+from utils import (send_with_size, receive_with_size, pack_json, send_parts_with_size,
+                   send_file_range_with_size, send_mapped_range_with_size, map_file, HAVE_SENDFILE,
+                   pack_file_chunk_header, unpack_file_chunk,
+                   set_tcp_cork)
+from config import (FILE_CHUNK_SIZE, FILE_CHUNK_MIN, FILE_CHUNK_MAX, FILE_SMALL_SIZE,
+                    FILE_LARGE_SIZE, FILE_CHUNK_LARGE,
+                    FILE_CHUNK_RAMP_START, FILE_WRITE_BUFFER, FILE_WRITE_QUEUE, DEFAULT_DOWNLOAD_DIR,
+                    MAX_FILE_SIZE)
+
+
+# Per-chunk diagnostics go through logger.debug so they cost a level check at INFO
+logger = logging.getLogger("fusionmeet.file_sharing")
+
+# Size units indexed by (bit_length - 1) // 10: bytes, KB, MB, GB (see format_size)
+_KB = 1 << 10
+_MB = 1 << 20
+_GB = 1 << 30
+_SIZE_UNITS = ((1, None), (_KB, "KB"), (_MB, "MB"), (_GB, "GB"))
+
+# Shared files are kept in uploads/ next to this module
+_MODULE_DIR = os.path.dirname(os.path.abspath(__file__))
+_UPLOADS_DIR = os.path.join(_MODULE_DIR, "uploads")
+_PATHS_FILE = os.path.join(_MODULE_DIR, "file_paths.txt")  # Extra search folders for find_local_file
+
+
+# Light-theme stylesheets for the file sharing dialogs (override the app's dark theme)
+
+# Open/save file dialogs
+_FILE_DIALOG_QSS = """
+QFileDialog {
+    background-color: #f0f0f0;
+    color: #000000;
+}
+QFileDialog QWidget {
+    background-color: #f0f0f0;
+    color: #000000;
+}
+QLabel {
+    background-color: #f0f0f0;
+    color: #000000;
+    font-size: 12px;
+}
+QLineEdit {
+    background-color: #FFFFFF;
+    color: #000000;
+    border: 1px solid #CCCCCC;
+    padding: 5px;
+    border-radius: 3px;
+}
+QPushButton {
+    background-color: #4CAF50;
+    color: white;
+    font-weight: bold;
+    padding: 6px 16px;
+    border: none;
+    border-radius: 4px;
+    min-width: 70px;
+}
+QPushButton:hover {
+    background-color: #45a049;
+}
+QTreeView, QListView {
+    background-color: #FFFFFF;
+    color: #000000;
+    border: 1px solid #CCCCCC;
+    alternate-background-color: #f8f8f8;
+}
+QTreeView::item, QListView::item {
+    background-color: #FFFFFF;
+    color: #000000;
+    padding: 4px;
+}
+QTreeView::item:hover, QListView::item:hover {
+    background-color: #E8F5E9;
+    color: #000000;
+}
+QTreeView::item:selected, QListView::item:selected {
+    background-color: #4CAF50;
+    color: white;
+}
+QHeaderView::section {
+    background-color: #F5F5F5;
+    color: #000000;
+    padding: 5px;
+    border: 1px solid #CCCCCC;
+    font-weight: bold;
+}
+QComboBox {
+    background-color: #FFFFFF;
+    color: #000000;
+    border: 1px solid #CCCCCC;
+    padding: 5px;
+    border-radius: 3px;
+}
+QComboBox:hover {
+    border: 1px solid #4CAF50;
+}
+QComboBox::drop-down {
+    border: none;
+}
+QComboBox QAbstractItemView {
+    background-color: #FFFFFF;
+    color: #000000;
+    selection-background-color: #4CAF50;
+    selection-color: white;
+    border: 1px solid #CCCCCC;
+}
+QComboBox::item {
+    background-color: #FFFFFF;
+    color: #000000;
+}
+QComboBox::item:selected {
+    background-color: #4CAF50;
+    color: white;
+}
+"""
+
+# Upload progress dialog
+_PROGRESS_QSS = """
+QProgressDialog {
+    background-color: #f0f0f0;
+    border: 1px solid #CCCCCC;
+    border-radius: 6px;
+}
+QProgressDialog QLabel {
+    background-color: #f0f0f0;
+    color: #000000;
+    font-size: 13px;
+    padding: 10px;
+}
+QProgressBar {
+    border: 1px solid #CCCCCC;
+    border-radius: 4px;
+    text-align: center;
+    background-color: #FFFFFF;
+    color: #000000;
+}
+QProgressBar::chunk {
+    background-color: #4CAF50;
+    border-radius: 3px;
+}
+QPushButton {
+    background-color: #FF5252;
+    color: white;
+    font-weight: bold;
+    padding: 6px 16px;
+    border: none;
+    border-radius: 4px;
+    min-width: 70px;
+}
+QPushButton:hover {
+    background-color: #E53935;
+}
+"""
+
+# Styled message boxes (see _create_msgbox)
+_MSGBOX_QSS = """
+QDialog {
+    background-color: #f0f0f0;
+}
+/* Force light colors for content widget and all children */
+QWidget#dialog_content, QWidget#dialog_content * {
+    background-color: #f0f0f0 !important;
+    color: #000000 !important;
+}
+QLabel#info {
+    background-color: #f0f0f0 !important;
+    color: #000000 !important;
+    font-size: 13px;
+    padding: 10px;
+}
+QLabel.icon_label {
+    background-color: transparent !important;
+}
+QTextEdit, QTextBrowser, QPlainTextEdit {
+    background-color: #FFFFFF !important;
+    color: #000000 !important;
+    border: 1px solid #CCCCCC !important;
+    padding: 6px !important;
+    border-radius: 3px !important;
+}
+QPushButton#okbtn {
+    background-color: #4CAF50 !important;
+    color: #FFFFFF !important;
+    padding: 8px 16px !important;
+    border-radius: 6px !important;
+    font-weight: bold !important;
+    min-width: 80px !important;
+    border: none !important;
+}
+QPushButton#okbtn:hover {
+    background-color: #45a049 !important;
+}
+QPushButton#okbtn:pressed {
+    background-color: #3d8b40 !important;
+}
+"""
+
+
+# Light palette for _create_msgbox, built on first use (needs a QApplication)
+_LIGHT_PALETTE = None
+
+
+def _light_palette():
+    """
+    Light gray palette shared by every styled message box.
+    
+    Returns:
+        QPalette: Cached palette
+    """
+    global _LIGHT_PALETTE
+    if _LIGHT_PALETTE is None:
+        pal = QPalette()
+        pal.setColor(QPalette.Window, QColor("#f0f0f0"))
+        pal.setColor(QPalette.Base, QColor("#f0f0f0"))
+        pal.setColor(QPalette.WindowText, QColor("#000000"))
+        pal.setColor(QPalette.Text, QColor("#000000"))
+        _LIGHT_PALETTE = pal
+    return _LIGHT_PALETTE
+
+
+def choose_chunk_size(file_size, est_bandwidth_bps, est_rtt_s):
+    """
+    Pick a transfer chunk size from the file size and the measured link.
+    Small files use small chunks; larger ones use roughly one
+    bandwidth-delay product per chunk, clamped to [FILE_CHUNK_SIZE, FILE_CHUNK_MAX].
+    Large files never go below FILE_CHUNK_LARGE, so they take few trips
+    through the send loop even before the link has been measured.
+    
+    Args:
+        file_size: Size of the file being sent in bytes
+        est_bandwidth_bps: Estimated throughput in bits/s, or None if unmeasured
+        est_rtt_s: Estimated round-trip time in seconds, or None if unmeasured
+        
+    Returns:
+        int: Chunk size in bytes
+    """
+    if file_size < FILE_SMALL_SIZE:
+        return FILE_CHUNK_MIN
+    floor = FILE_CHUNK_LARGE if file_size >= FILE_LARGE_SIZE else FILE_CHUNK_SIZE
+    if not est_bandwidth_bps or not est_rtt_s:
+        return floor
+    bdp_bytes = int(est_bandwidth_bps * est_rtt_s / 8)
+    return min(FILE_CHUNK_MAX, max(floor, bdp_bytes))
+
+
+def ramp_chunk_size(sent_bytes, ceiling):
+    """
+    Size of the next chunk in a transfer.
+    Starts at FILE_CHUNK_RAMP_START and doubles each chunk (the next size is
+    the smallest doubling above what has been sent) until it reaches ceiling,
+    so short transfers send small chunks and long ones amortize per-chunk cost.
+    
+    Args:
+        sent_bytes: Bytes of the file sent so far
+        ceiling: Largest chunk size to use (see choose_chunk_size)
+        
+    Returns:
+        int: Chunk size in bytes
+    """
+    size = FILE_CHUNK_RAMP_START
+    while size < ceiling and size <= sent_bytes:
+        size <<= 1
+    return min(size, ceiling)
+
+
+def is_sparse(st):
+    """
+    Check whether a file is mostly holes (less than half its size allocated).
+    Always False where the OS doesn't report st_blocks (Windows).
+    
+    Args:
+        st: os.stat_result of the file
+        
+    Returns:
+        bool: True if the file is sparse
+    """
+    blocks = getattr(st, 'st_blocks', None)
+    return blocks is not None and blocks * 512 * 2 < st.st_size
+
+
+def preallocate(f, size):
+    """
+    Reserve disk space for a file about to be written.
+    One up-front allocation keeps the file contiguous, and a full disk
+    fails here rather than partway through a transfer.
+    Uses posix_fallocate, or on Windows extends the file (NTFS allocates
+    the clusters); a no-op elsewhere (macOS would only make a sparse file).
+    The caller truncates the file to what was written once it is done.
+    
+    Args:
+        f: File opened for writing
+        size: Expected final size in bytes
+        
+    Raises:
+        OSError: ENOSPC if the disk can't hold the file
+    """
+    if size <= 0:
+        return
+    if os.name == 'nt':
+        f.truncate(size)  # SetEndOfFile; the write position stays at 0
+        return
+    if not hasattr(os, 'posix_fallocate'):
+        return
+    try:
+        os.posix_fallocate(f.fileno(), 0, size)
+    except OSError as e:
+        if e.errno == errno.ENOSPC:
+            raise
+        # Filesystem without fallocate support: blocks are allocated as written
+
+
+def advise_sequential(f):
+    """
+    Tell the kernel a file will be read front to back, doubling its readahead.
+    No-op where posix_fadvise is unavailable (Windows, macOS).
+    
+    Args:
+        f: File opened for reading
+    """
+    if hasattr(os, 'posix_fadvise'):
+        try:
+            os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        except OSError:
+            pass  # Only a hint
+
+
+# copy_file_range errors that mean "not supported here", not a real failure
+_COPY_RANGE_UNSUPPORTED = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP}
+
+
+def fast_copy(src, dst):
+    """
+    Copy a file with its metadata, letting the kernel move the data.
+    Uses os.copy_file_range where available (Linux; a reflink on btrfs/xfs,
+    so no data is copied at all), otherwise shutil.copy2.
+    
+    Args:
+        src: Source file path
+        dst: Destination file path
+    """
+    copy_range = getattr(os, 'copy_file_range', None)
+    if copy_range is None:
+        shutil.copy2(src, dst)
+        return
+    
+    try:
+        with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+            while copy_range(fsrc.fileno(), fdst.fileno(), 1 << 30):
+                pass
+    except OSError as e:
+        if e.errno not in _COPY_RANGE_UNSUPPORTED:
+            raise
+        shutil.copy2(src, dst)
+        return
+    shutil.copystat(src, dst)
+
+
+def read_ahead(f, chunk_size, depth=2):
+    """
+    Yield the chunks of a file while a helper thread reads the next ones.
+    Reads go into depth + 1 reusable bytearrays, so the disk works on the
+    next chunk while the caller sends the current one, without any
+    per-chunk bytes object. Chunk sizes ramp up like ramp_chunk_size().
+    
+    Args:
+        f: File opened for binary reading (readinto)
+        chunk_size: Largest chunk to read
+        depth: Chunks the reader may get ahead of the caller
+        
+    Yields:
+        memoryview: Read-only view of the next chunk; only valid until the
+                    following one is requested
+    """
+    free = queue.Queue()
+    filled = queue.Queue()  # Never holds more than the depth + 1 buffers
+    for _ in range(depth + 1):
+        free.put(memoryview(bytearray(chunk_size)))
+    
+    def reader():
+        pos = 0
+        while True:
+            buf = free.get()
+            if buf is None:
+                return  # Consumer stopped early
+            try:
+                n = f.readinto(buf[:ramp_chunk_size(pos, chunk_size)])
+            except OSError as e:
+                filled.put((e, 0))
+                return
+            filled.put((buf, n))
+            if not n:
+                return  # EOF
+            pos += n
+    
+    thread = threading.Thread(target=reader, daemon=True)
+    thread.start()
+    try:
+        while True:
+            buf, n = filled.get()
+            if isinstance(buf, OSError):
+                raise buf
+            if not n:
+                return
+            yield buf.toreadonly()[:n]
+            free.put(buf)
+    finally:
+        free.put(None)
+        thread.join()  # Before the caller closes f
+
+
+class _UploadSignals(QObject):
+    """Signals an _UploadTask emits; delivered on the GUI thread."""
+    progress = pyqtSignal(int, int)  # (bytes_sent, total_size)
+    finished = pyqtSignal(int, float)  # (bytes_sent, elapsed_seconds)
+    failed = pyqtSignal(str)  # error message
+    cancelled = pyqtSignal()
+
+
+class _UploadTask(QRunnable):
+    """
+    Streams one file to the server on a QThreadPool thread.
+    Makes no Qt calls itself; everything the GUI needs goes out through signals.
+    """
+    
+    def __init__(self, filepath, filename, filesize, sock, send_lock, chunk_size, signals):
+        """
+        Args:
+            filepath: Full path to file on disk
+            filename: Name the file is shared under
+            filesize: Size of the file in bytes
+            sock: Connected TCP socket to the server
+            send_lock: Lock held while writing each frame to sock
+            chunk_size: Largest chunk to send
+            signals: _UploadSignals to report through
+        """
+        super().__init__()
+        self.setAutoDelete(False)  # Owned by FileSharingHandler._upload_tasks
+        self.filepath = filepath
+        self.filename = filename
+        self.sock = sock
+        self.send_lock = send_lock
+        self.chunk_size = chunk_size
+        self.signals = signals
+        self.filesize = filesize
+        self.sent_bytes = 0  # Read by the GUI's progress timer
+        self.start_time = time.time()
+        self.half_noted = False  # 50% chat message posted (GUI side)
+        self._cancel = threading.Event()
+    
+    def cancel(self):
+        """Stop the upload before its next chunk."""
+        self._cancel.set()
+    
+    def run(self):
+        # Cork so headers and chunks leave as full segments (uncorked in finally)
+        set_tcp_cork(self.sock, True)
+        try:
+            # Unbuffered: chunk data goes from the page cache to the socket,
+            # via sendfile(2) or, where that's missing, a read-only mapping
+            with open(self.filepath, 'rb', buffering=0) as f, \
+                    (map_file(f) if self.filesize and not HAVE_SENDFILE else nullcontext()) as mapped:
+                advise_sequential(f)
+                header = pack_file_chunk_header(self.filename)  # No requester: plain upload
+                
+                while self.sent_bytes < self.filesize:
+                    if self._cancel.is_set():
+                        print("Upload cancelled.")
+                        self.signals.cancelled.emit()
+                        return
+                    n = min(ramp_chunk_size(self.sent_bytes, self.chunk_size), self.filesize - self.sent_bytes)
+                    
+                    # Raw framed chunk: header, then the data via sendfile()
+                    with self.send_lock:
+                        if mapped is None:
+                            send_file_range_with_size(self.sock, header, f, self.sent_bytes, n)
+                        else:
+                            send_mapped_range_with_size(self.sock, header, mapped, self.sent_bytes, n)
+                    self.sent_bytes += n
+                    self.signals.progress.emit(self.sent_bytes, self.filesize)
+            
+            # Send end-of-file marker after the loop finishes
+            eof_marker = {'type': 'file_end', 'filename': self.filename}
+            with self.send_lock:
+                send_with_size(self.sock, pack_json(eof_marker))
+        except Exception as e:
+            # Any error must reach the dialog, or it and its timer stay open
+            self.signals.failed.emit(str(e))
+            return
+        finally:
+            set_tcp_cork(self.sock, False)
+        
+        print(f"Finished uploading {self.filename}")
+        self.signals.finished.emit(self.sent_bytes, time.time() - self.start_time)
 
 
 class FileSharingHandler(QObject):
@@ -24,6 +523,7 @@ class FileSharingHandler(QObject):
     
     # PyQt signals for async notifications
     new_file_available = pyqtSignal(str, int)  # (filename, size)
+    new_files_available_batch = pyqtSignal(dict)  # {filename: size}, e.g. the list sent on join
     download_progress = pyqtSignal(str, int, int)  # (filename, bytes_received, total_size)
     download_complete = pyqtSignal(str, str)  # (filename, filepath)
     
@@ -37,11 +537,43 @@ class FileSharingHandler(QObject):
         super().__init__()
         self.client = client
         self.files = {}  # Available files in session: {filename: size}
+        self.files_version = 0  # Bumped on every change to files
+        self._files_lock = threading.Lock()  # Guards files against the network thread
         self.downloads = {}  # Active downloads: {filename: {'path', 'file', 'size', 'received'}}
+        self.est_bandwidth_bps = None  # Smoothed send rate of past transfers (bits/s)
+        self._compressed_files = set()  # Shared files sent zlib-compressed (sparse originals)
+        self._file_dialog = None  # Reused open/save dialog (see _styled_file_dialog)
+        self._share_dir = None  # Folder the last shared files were picked from
+        self._digest_cache = {}  # Served files: {path: (size, mtime_ns, sha256 hex)}
+        self._search_paths_cache = None  # find_local_file folders (see _search_paths)
+        self._paths_file_mtime = None  # file_paths.txt mtime the cache was built from
+        self._upload_tasks = set()  # _UploadTasks on the thread pool
         
         # Helper for creating styled message boxes
         self.create_styled_msgbox = lambda title, text, icon_type: self._create_msgbox(title, text, icon_type)
         
+    def files_snapshot(self):
+        """
+        Copy of the shared files list, taken under the lock so the network
+        thread can't resize it mid-iteration.
+        
+        Returns:
+            tuple: (files_version, {filename: size})
+        """
+        with self._files_lock:
+            return self.files_version, dict(self.files)
+    
+    def _add_files(self, files):
+        """
+        Merge new entries into the shared files list and bump files_version.
+        
+        Args:
+            files: Dict of {filename: size}
+        """
+        with self._files_lock:
+            self.files.update(files)
+            self.files_version += 1
+    
     def _create_msgbox(self, title, text, icon_type):
         """
         Create custom styled message dialog with light theme.
@@ -63,47 +595,7 @@ class FileSharingHandler(QObject):
         dlg.setAutoFillBackground(True)
 
         # Force light theme styling (overrides global dark theme)
-        dlg.setStyleSheet("""
-            QDialog {
-                background-color: #f0f0f0;
-            }
-            /* Force light colors for content widget and all children */
-            QWidget#dialog_content, QWidget#dialog_content * {
-                background-color: #f0f0f0 !important;
-                color: #000000 !important;
-            }
-            QLabel#info {
-                background-color: #f0f0f0 !important;
-                color: #000000 !important;
-                font-size: 13px;
-                padding: 10px;
-            }
-            QLabel.icon_label {
-                background-color: transparent !important;
-            }
-            QTextEdit, QTextBrowser, QPlainTextEdit {
-                background-color: #FFFFFF !important;
-                color: #000000 !important;
-                border: 1px solid #CCCCCC !important;
-                padding: 6px !important;
-                border-radius: 3px !important;
-            }
-            QPushButton#okbtn {
-                background-color: #4CAF50 !important;
-                color: #FFFFFF !important;
-                padding: 8px 16px !important;
-                border-radius: 6px !important;
-                font-weight: bold !important;
-                min-width: 80px !important;
-                border: none !important;
-            }
-            QPushButton#okbtn:hover {
-                background-color: #45a049 !important;
-            }
-            QPushButton#okbtn:pressed {
-                background-color: #3d8b40 !important;
-            }
-        """)
+        dlg.setStyleSheet(_MSGBOX_QSS)
 
         # Create a white content widget that will hold everything (this prevents odd child widgets painting darker)
         content = QWidget(dlg)
@@ -112,12 +604,7 @@ class FileSharingHandler(QObject):
         content.setAutoFillBackground(True)
 
         # Ensure palette for content explicitly light gray
-        pal = content.palette()
-        pal.setColor(QPalette.Window, QColor("#f0f0f0"))
-        pal.setColor(QPalette.Base, QColor("#f0f0f0"))
-        pal.setColor(QPalette.WindowText, QColor("#000000"))
-        pal.setColor(QPalette.Text, QColor("#000000"))
-        content.setPalette(pal)
+        content.setPalette(_light_palette())
 
         # Layouts
         main_layout = QVBoxLayout(dlg)
@@ -174,136 +661,67 @@ class FileSharingHandler(QObject):
         btn_row.addWidget(ok_btn)
         content_layout.addLayout(btn_row)
 
-        # Final safety: set light gray palette on known widget children to override any global theme
-        for w in dlg.findChildren(QWidget):
-            try:
-                w.setAutoFillBackground(True)
-                wp = w.palette()
-                wp.setColor(QPalette.Window, QColor("#f0f0f0"))
-                wp.setColor(QPalette.Base, QColor("#f0f0f0"))
-                wp.setColor(QPalette.WindowText, QColor("#000000"))
-                wp.setColor(QPalette.Text, QColor("#000000"))
-                w.setPalette(wp)
-            except Exception:
-                pass
+        # Final safety: light palette on the widgets that paint backgrounds
+        # (the stylesheet covers the rest of the tree)
+        dlg.setPalette(_light_palette())
+        info_label.setPalette(_light_palette())
 
         return dlg
 
+    def _styled_file_dialog(self):
+        """
+        Shared light-themed file dialog for sharing and saving files.
+        Built and styled once; callers set the title and modes for each use.
+        
+        Returns:
+            QFileDialog: Non-native dialog parented to the main window
+        """
+        if self._file_dialog is None:
+            self._file_dialog = QFileDialog(self.client.gui)
+            self._file_dialog.setStyleSheet(_FILE_DIALOG_QSS)
+            # Non-native dialog so the stylesheet applies
+            self._file_dialog.setOption(QFileDialog.DontUseNativeDialog, True)
+        return self._file_dialog
 
     def send_file(self):
         """
-        Open file selection dialog and upload chosen file to session.
-        File is copied to uploads directory and announced to server.
+        Open file selection dialog and upload the chosen files to session.
+        Each file is copied to uploads directory and announced to server;
+        several files upload side by side on the thread pool.
         """
-        # Create styled file selection dialog
-        file_dialog = QFileDialog(self.client.gui)
-        file_dialog.setWindowTitle("Select File to Share")
-        file_dialog.setFileMode(QFileDialog.ExistingFile)
-        
-        # Apply styling to make it visible and professional
-        file_dialog.setStyleSheet("""
-            QFileDialog {
-                background-color: #f0f0f0;
-                color: #000000;
-            }
-            QFileDialog QWidget {
-                background-color: #f0f0f0;
-                color: #000000;
-            }
-            QLabel {
-                background-color: #f0f0f0;
-                color: #000000;
-                font-size: 12px;
-            }
-            QLineEdit {
-                background-color: #FFFFFF;
-                color: #000000;
-                border: 1px solid #CCCCCC;
-                padding: 5px;
-                border-radius: 3px;
-            }
-            QPushButton {
-                background-color: #4CAF50;
-                color: white;
-                font-weight: bold;
-                padding: 6px 16px;
-                border: none;
-                border-radius: 4px;
-                min-width: 70px;
-            }
-            QPushButton:hover {
-                background-color: #45a049;
-            }
-            QTreeView, QListView {
-                background-color: #FFFFFF;
-                color: #000000;
-                border: 1px solid #CCCCCC;
-                alternate-background-color: #f8f8f8;
-            }
-            QTreeView::item, QListView::item {
-                background-color: #FFFFFF;
-                color: #000000;
-                padding: 4px;
-            }
-            QTreeView::item:hover, QListView::item:hover {
-                background-color: #E8F5E9;
-                color: #000000;
-            }
-            QTreeView::item:selected, QListView::item:selected {
-                background-color: #4CAF50;
-                color: white;
-            }
-            QHeaderView::section {
-                background-color: #F5F5F5;
-                color: #000000;
-                padding: 5px;
-                border: 1px solid #CCCCCC;
-                font-weight: bold;
-            }
-            QComboBox {
-                background-color: #FFFFFF;
-                color: #000000;
-                border: 1px solid #CCCCCC;
-                padding: 5px;
-                border-radius: 3px;
-            }
-            QComboBox:hover {
-                border: 1px solid #4CAF50;
-            }
-            QComboBox::drop-down {
-                border: none;
-            }
-            QComboBox QAbstractItemView {
-                background-color: #FFFFFF;
-                color: #000000;
-                selection-background-color: #4CAF50;
-                selection-color: white;
-                border: 1px solid #CCCCCC;
-            }
-            QComboBox::item {
-                background-color: #FFFFFF;
-                color: #000000;
-            }
-            QComboBox::item:selected {
-                background-color: #4CAF50;
-                color: white;
-            }
-        """)
-
-        # Use non-native dialog for consistent styling
-        file_dialog.setOption(QFileDialog.DontUseNativeDialog, True)      
-        if file_dialog.exec_() == QFileDialog.Accepted:
-            files = file_dialog.selectedFiles()
-            if files:
-                filepath = files[0]
-            else:
-                return  # No file selected
-        else:
+        # Styled file selection dialog
+        file_dialog = self._styled_file_dialog()
+        file_dialog.setWindowTitle("Select Files to Share")
+        file_dialog.setAcceptMode(QFileDialog.AcceptOpen)
+        file_dialog.setFileMode(QFileDialog.ExistingFiles)
+        file_dialog.setNameFilter("All Files (*)")
+        # The dialog is shared with request_download: reopen where the last
+        # share came from, without the last download's name preselected
+        if self._share_dir:
+            file_dialog.setDirectory(self._share_dir)
+        file_dialog.selectFile('')
+        
+        if file_dialog.exec_() != QFileDialog.Accepted:
             return  # Dialog cancelled
+        files = file_dialog.selectedFiles()
+        self._share_dir = file_dialog.directory().absolutePath()
+        
+        # One completion box for a single file; the chat reports a batch
+        for filepath in files:
+            self.share_file(filepath, show_done=len(files) == 1)
+    
+    def share_file(self, filepath, show_done=True):
+        """
+        Copy a file to the uploads directory, announce it and start its upload.
         
-        # Extract file information
+        Args:
+            filepath: Full path to file on disk
+            show_done: Show a message box when the upload completes
+        """
+        # Extract file information (one stat for size and allocation)
         filename = os.path.basename(filepath)
-        filesize = os.path.getsize(filepath)
+        st = os.stat(filepath)
+        filesize = st.st_size
         
         # Validate file size against maximum limit
         if filesize > MAX_FILE_SIZE:
@@ -314,17 +732,28 @@ class FileSharingHandler(QObject):
             )
             msg_box.exec_()
             return
+        
+        # Sparse files are mostly zeros: compress them on the wire. Checked on
+        # the original, since the uploads copy below is written out densely.
+        if is_sparse(st):
+            print(f"Warning: {filename} is sparse ({self.format_size(st.st_blocks * 512)} allocated "
+                  f"of {self.format_size(filesize)}); it will be sent compressed")
+            self._compressed_files.add(filename)
+        else:
+            self._compressed_files.discard(filename)
 
         # Create uploads directory for file storage
-        uploads_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "uploads")
-        os.makedirs(uploads_dir, exist_ok=True)
+        os.makedirs(_UPLOADS_DIR, exist_ok=True)
         
         # Copy file to uploads directory for persistent sharing
         try:
-            import shutil
-            uploads_path = os.path.join(uploads_dir, filename)
-            shutil.copy2(filepath, uploads_path)
-            print(f"Saved a copy of {filename} to uploads directory for future sharing")
+            uploads_path = os.path.join(_UPLOADS_DIR, filename)
+            if os.path.exists(uploads_path) and os.path.samefile(filepath, uploads_path):
+                # Re-sharing the uploads copy itself; copying would truncate it
+                print(f"{filename} is already in the uploads directory")
+            else:
+                fast_copy(filepath, uploads_path)
+                print(f"Saved a copy of {filename} to uploads directory for future sharing")
             
             # Use the uploaded copy from now on
             filepath = uploads_path
@@ -338,19 +767,20 @@ class FileSharingHandler(QObject):
             'filesize': filesize,
             'sender': self.client.username
         }
-        send_with_size(self.client.tcp_socket, pickle.dumps(file_info))
+        with self.client.tcp_send_lock:
+            send_with_size(self.client.tcp_socket, pack_json(file_info))
         
         # Add to local files list for immediate UI update
-        self.files[filename] = filesize
+        self._add_files({filename: filesize})
         
         # Emit signal to update UI
         self.new_file_available.emit(filename, filesize)
         print(f"Added file to local list: {filename} ({filesize} bytes)")
 
         # Upload file data to server
-        self.upload_file(filepath, filename)
+        self.upload_file(filepath, filename, filesize, show_done)
 
-    def upload_file(self, filepath, filename):
+    def upload_file(self, filepath, filename, filesize, show_done=True):
         """
         Upload file to server in chunks with progress tracking.
         Displays progress dialog during upload.
@@ -358,12 +788,14 @@ class FileSharingHandler(QObject):
         Args:
             filepath: Full path to file on disk
             filename: Name of file being uploaded
+            filesize: Size of the file in bytes (already stat'ed by the caller)
+            show_done: Show a message box when the upload completes
         """
-        filesize = os.path.getsize(filepath)
+        size_str = self.format_size(filesize)  # Fixed for the whole upload
         
         # Create upload progress dialog
         progress = QProgressDialog(
-            f"Uploading {filename}...\n0% complete (0 KB of {self.format_size(filesize)})", 
+            f"Uploading {filename}...\n0% complete (0 KB of {size_str})", 
             "Cancel", 
             0, 
             filesize, 
@@ -373,42 +805,7 @@ class FileSharingHandler(QObject):
         progress.setMinimumWidth(400)
         
         # Style the progress dialog
-        progress.setStyleSheet("""
-            QProgressDialog {
-                background-color: #f0f0f0;
-                border: 1px solid #CCCCCC;
-                border-radius: 6px;
-            }
-            QProgressDialog QLabel {
-                background-color: #f0f0f0;
-                color: #000000;
-                font-size: 13px;
-                padding: 10px;
-            }
-            QProgressBar {
-                border: 1px solid #CCCCCC;
-                border-radius: 4px;
-                text-align: center;
-                background-color: #FFFFFF;
-                color: #000000;
-            }
-            QProgressBar::chunk {
-                background-color: #4CAF50;
-                border-radius: 3px;
-            }
-            QPushButton {
-                background-color: #FF5252;
-                color: white;
-                font-weight: bold;
-                padding: 6px 16px;
-                border: none;
-                border-radius: 4px;
-                min-width: 70px;
-            }
-            QPushButton:hover {
-                background-color: #E53935;
-            }
-        """)
+        progress.setStyleSheet(_PROGRESS_QSS)
         
         progress.show()
         
@@ -416,108 +813,63 @@ class FileSharingHandler(QObject):
         if hasattr(self.client, 'gui'):
             self.client.gui.add_chat_message("System", f"Uploading <b>{filename}</b>...")
 
-        try:
-            start_time = time.time()
-            # Open with buffering for better performance
-            with open(filepath, 'rb', buffering=8192) as f:
-                sent_bytes = 0
-                # Use configured chunk size for better performance
-                chunk_size = FILE_CHUNK_SIZE
-                
-                while True:
-                    chunk = f.read(chunk_size)
-                    if not chunk:
-                        break  # End of file
-                    if progress.wasCanceled():
-                        print("Upload cancelled.")
-                        # Optionally send a cancellation message to the server
-                        return
-
-                    data = {
-                        'type': 'file_chunk', 
-                        'filename': filename, 
-                        'chunk': chunk,
-                        # No requester field here - it will be added by server when forwarding
-                    }
-                    send_with_size(self.client.tcp_socket, pickle.dumps(data))
-                    sent_bytes += len(chunk)
-                    
-                    # Update progress only every ~100KB to reduce overhead
-                    if sent_bytes % 102400 < chunk_size or sent_bytes >= filesize:
-                        progress.setValue(sent_bytes)
-                        
-                            # Update progress text with speed and ETA
-                        elapsed = time.time() - start_time
-                        if elapsed > 0:
-                                speed = sent_bytes / elapsed
-                                percent = int(100 * sent_bytes / filesize)
-                                
-                                speed_str = self.format_size(speed) + "/s"
-                                
-                                # Calculate ETA
-                                if speed > 0:
-                                    remaining_bytes = filesize - sent_bytes
-                                    eta_seconds = remaining_bytes / speed
-                                    if eta_seconds < 60:
-                                        eta = f"{int(eta_seconds)} seconds"
-                                    elif eta_seconds < 3600:
-                                        eta = f"{int(eta_seconds / 60)} minutes"
-                                    else:
-                                        eta = f"{int(eta_seconds / 3600)} hours, {int((eta_seconds % 3600) / 60)} minutes"
-                                else:
-                                    eta = "unknown"
-                                    
-                                # Add a message at 50% complete
-                                if percent >= 50 and (sent_bytes - chunk_size) * 100 / filesize < 50:
-                                    if hasattr(self.client, 'gui'):
-                                        self.client.gui.add_chat_message("System", f"Upload of {filename} is 50% complete")
-                                        
-                        progress.setLabelText(
-                                f"Uploading {filename}...\n"
-                                f"{percent}% complete ({self.format_size(sent_bytes)} of {self.format_size(filesize)})\n"
-                                f"Speed: {speed_str} | ETA: {eta}"
-                            )
-            
-            # Send end-of-file marker after the loop finishes
-            eof_marker = {'type': 'file_end', 'filename': filename}
-            send_with_size(self.client.tcp_socket, pickle.dumps(eof_marker))
-            print(f"Finished uploading {filename}")
+        # The send loop runs on the thread pool; the dialog follows its signals
+        signals = _UploadSignals()
+        task = _UploadTask(filepath, filename, filesize, self.client.tcp_socket, self.client.tcp_send_lock,
+                           self._chunk_size_for(filesize), signals)
+        self._upload_tasks.add(task)  # Keep the Python wrapper alive while it runs
+        
+        # A timer repaints the label ~10x/s from the task's counters
+        progress_timer = QTimer(progress)
+        progress_timer.setInterval(100)
+        progress_timer.timeout.connect(lambda: self._update_upload_progress(progress, task, size_str))
+        
+        def finish():
+            progress_timer.stop()
+            progress.setValue(progress.maximum())
+            progress.close()
+            self._upload_tasks.discard(task)
+        
+        def on_finished(sent_bytes, elapsed):
+            finish()
+            self._record_transfer_rate(sent_bytes, elapsed)
             
             # Refresh the UI to show the file is now available
             if hasattr(self.client, 'gui'):
                 self.client.gui.refresh_files()
                 self.client.gui.add_chat_message("System", f"<b>{filename}</b> uploaded successfully!")
             
-            # Show a success message
-            if hasattr(self.client, 'gui'):
-                # Create and show a styled success message
+            # Create and show a styled success message
+            if show_done and hasattr(self.client, 'gui'):
                 msg_box = self.create_styled_msgbox(
                     "Upload Complete", 
                     f"The file {filename} has been uploaded successfully.",
                     "information"
                 )
                 msg_box.exec_()
-                
-                # Make sure GUI refreshes file list
-                if hasattr(self.client.gui, 'refresh_files'):
-                    self.client.gui.refresh_files()
-
-        except FileNotFoundError:
-            print(f"Error: File not found at {filepath}")
-        finally:
-            progress.setValue(os.path.getsize(filepath))
-            progress.close()
+        
+        def on_failed(error):
+            finish()
+            print(f"Error uploading {filename}: {error}")
+        
+        signals.progress.connect(lambda sent_bytes, total: progress.setValue(sent_bytes))
+        signals.finished.connect(on_finished)
+        signals.failed.connect(on_failed)
+        signals.cancelled.connect(finish)
+        progress.canceled.connect(task.cancel)
+        
+        progress_timer.start()
+        QThreadPool.globalInstance().start(task)
 
-    def handle_file_info(self, data):
+    def handle_file_info(self, payload):
         """
         Process incoming file availability notifications from server.
         Handles file_info (new file), available_files (list), and file_request messages.
         
         Args:
-            data: Pickled payload containing file information
+            payload: Message dict, already decoded by the TCP receiver
         """
         try:
-            payload = pickle.loads(data)
             msg_type = payload.get('type')
             
             # Log message type for debugging
@@ -530,7 +882,7 @@ class FileSharingHandler(QObject):
                 sender = payload.get('sender', 'Unknown')
                 
                 # Store file info and emit signal
-                self.files[filename] = filesize
+                self._add_files({filename: filesize})
                 self.new_file_available.emit(filename, filesize)
                 
                 print(f"New file available: {filename} ({filesize} bytes) from {sender}")
@@ -545,9 +897,9 @@ class FileSharingHandler(QObject):
                 print(f"Received available files list from server: {len(available_files)} files")
                 
                 # Update local file list and notify UI
-                self.files.update(available_files)
-                for filename, filesize in available_files.items():
-                    self.new_file_available.emit(filename, filesize)
+                self._add_files(available_files)
+                if available_files:
+                    self.new_files_available_batch.emit(dict(available_files))
                 
                 # Refresh files panel
                 if hasattr(self.client, 'gui') and hasattr(self.client.gui, 'refresh_files'):
@@ -560,12 +912,10 @@ class FileSharingHandler(QObject):
                 print(f"Request details - filename: {filename}, requester: {requester}")
                 
                 self.handle_file_request(payload)
-        except (pickle.UnpicklingError, KeyError) as e:
+        except (KeyError, ValueError) as e:
             print(f"Error handling file info: {e}")
             import traceback
             traceback.print_exc()
-        except (pickle.UnpicklingError, KeyError) as e:
-            print(f"Error handling file info: {e}")
 
     def request_download(self, filename):
         """
@@ -581,14 +931,26 @@ class FileSharingHandler(QObject):
         if filename not in self.files:
             raise ValueError(f"File {filename} not available for download")
         
+        # The announced size comes from a peer and is preallocated on disk below,
+        # so hold it to the same limit as uploads
+        filesize = self.files[filename]
+        if not isinstance(filesize, int) or not 0 <= filesize <= MAX_FILE_SIZE:
+            msg_box = self.create_styled_msgbox(
+                "File Too Large",
+                f"This file exceeds the maximum allowed size of {self.format_size(MAX_FILE_SIZE)}.",
+                "warning"
+            )
+            msg_box.exec_()
+            return
+        
         # Create downloads directory
         download_dir = os.path.join(os.path.expanduser("~"), "Downloads", DEFAULT_DOWNLOAD_DIR)
         os.makedirs(download_dir, exist_ok=True)
         
         default_save_path = os.path.join(download_dir, filename)
         
-        # Create and style save file dialog
-        file_dialog = QFileDialog(self.client.gui)
+        # Styled save file dialog
+        file_dialog = self._styled_file_dialog()
         file_dialog.setWindowTitle("Save File As")
         file_dialog.setAcceptMode(QFileDialog.AcceptSave)
         file_dialog.setFileMode(QFileDialog.AnyFile)
@@ -596,99 +958,6 @@ class FileSharingHandler(QObject):
         file_dialog.selectFile(filename)
         file_dialog.setNameFilter("All Files (*)")
         
-        # Apply the same styling as the open dialog
-        file_dialog.setStyleSheet("""
-            QFileDialog {
-                background-color: #f0f0f0;
-                color: #000000;
-            }
-            QFileDialog QWidget {
-                background-color: #f0f0f0;
-                color: #000000;
-            }
-            QLabel {
-                background-color: #f0f0f0;
-                color: #000000;
-                font-size: 12px;
-            }
-            QLineEdit {
-                background-color: #FFFFFF;
-                color: #000000;
-                border: 1px solid #CCCCCC;
-                padding: 5px;
-                border-radius: 3px;
-            }
-            QPushButton {
-                background-color: #4CAF50;
-                color: white;
-                font-weight: bold;
-                padding: 6px 16px;
-                border: none;
-                border-radius: 4px;
-                min-width: 70px;
-            }
-            QPushButton:hover {
-                background-color: #45a049;
-            }
-            QTreeView, QListView {
-                background-color: #FFFFFF;
-                color: #000000;
-                border: 1px solid #CCCCCC;
-                alternate-background-color: #f8f8f8;
-            }
-            QTreeView::item, QListView::item {
-                background-color: #FFFFFF;
-                color: #000000;
-                padding: 4px;
-            }
-            QTreeView::item:hover, QListView::item:hover {
-                background-color: #E8F5E9;
-                color: #000000;
-            }
-            QTreeView::item:selected, QListView::item:selected {
-                background-color: #4CAF50;
-                color: white;
-            }
-            QHeaderView::section {
-                background-color: #F5F5F5;
-                color: #000000;
-                padding: 5px;
-                border: 1px solid #CCCCCC;
-                font-weight: bold;
-            }
-            QComboBox {
-                background-color: #FFFFFF;
-                color: #000000;
-                border: 1px solid #CCCCCC;
-                padding: 5px;
-                border-radius: 3px;
-            }
-            QComboBox:hover {
-                border: 1px solid #4CAF50;
-            }
-            QComboBox::drop-down {
-                border: none;
-            }
-            QComboBox QAbstractItemView {
-                background-color: #FFFFFF;
-                color: #000000;
-                selection-background-color: #4CAF50;
-                selection-color: white;
-                border: 1px solid #CCCCCC;
-            }
-            QComboBox::item {
-                background-color: #FFFFFF;
-                color: #000000;
-            }
-            QComboBox::item:selected {
-                background-color: #4CAF50;
-                color: white;
-            }
-        """)
-
-        file_dialog.setOption(QFileDialog.DontUseNativeDialog, True)
-
-        
         if file_dialog.exec_() == QFileDialog.Accepted:
             files = file_dialog.selectedFiles()
             if files:
@@ -699,22 +968,41 @@ class FileSharingHandler(QObject):
             return  # User canceled
         
         try:
-            # Open file with 64KB buffer for better write performance
-            file_obj = open(save_path, 'wb', buffering=65536)
+            # Buffered so small chunks reach the disk in ~1 MB writes; larger
+            # chunks bypass the buffer. truncate()/close() flush the rest.
+            file_obj = open(save_path, 'wb', buffering=FILE_WRITE_BUFFER)
+            try:
+                preallocate(file_obj, filesize)
+            except OSError:
+                file_obj.close()
+                os.remove(save_path)
+                raise
             
             # Store download state
             self.downloads[filename] = {
                 'path': save_path,
                 'file': file_obj,
-                'size': self.files[filename],
+                'size': filesize,
+                'size_str': self.format_size(filesize),  # For progress text
                 'received': 0,
-                'start_time': time.time()  # Track download speed
+                'next_update': 0,  # Byte count at which progress is next reported
+                'digest': hashlib.sha256(),  # Running hash of received chunks
+                'start_time': time.time(),  # Track download speed
+                'writes': queue.Queue(maxsize=FILE_WRITE_QUEUE),  # Chunks for the writer thread
+                'write_error': None  # First OSError the writer hit
             }
             
+            # Disk writes (and hashing) run on their own thread so a slow disk
+            # doesn't stall the TCP receive thread until the queue fills
+            writer = threading.Thread(target=self._write_download, args=(self.downloads[filename],), daemon=True)
+            self.downloads[filename]['writer'] = writer
+            writer.start()
+            
             # Send download request to server
             req = {'type': 'file_request', 'filename': filename}
             print(f"Sending file request for {filename} to server")
-            send_with_size(self.client.tcp_socket, pickle.dumps(req))
+            with self.client.tcp_send_lock:
+                send_with_size(self.client.tcp_socket, pack_json(req))
             
             # Show progress tracking
             self.show_download_progress(filename)
@@ -733,6 +1021,7 @@ class FileSharingHandler(QObject):
             
             # Clean up download state
             if filename in self.downloads:
+                self._finish_writes(self.downloads[filename])
                 if 'file' in self.downloads[filename]:
                     self.downloads[filename]['file'].close()
                 del self.downloads[filename]
@@ -760,47 +1049,94 @@ class FileSharingHandler(QObject):
         print(f"Download started for {filename}")
         
         # Progress update callback (called periodically as chunks arrive)
+        size_str = download_info['size_str']
+        
         def update_progress_text():
             if filename not in self.downloads:
                 return
                 
-            current_info = self.downloads[filename]
-            received = current_info['received']
+            received = self.downloads[filename]['received']
             percent = int(100 * received / filesize) if filesize > 0 else 0
-            elapsed = time.time() - current_info['start_time']
-            
-            # Calculate download speed and ETA
-            if elapsed > 0:
-                speed = received / elapsed if received > 0 else 0
-                speed_str = self.format_size(speed) + "/s"
-                
-                if speed > 0:
-                    remaining_bytes = filesize - received
-                    eta_seconds = remaining_bytes / speed
-                    if eta_seconds < 60:
-                        eta = f"{int(eta_seconds)} seconds"
-                    elif eta_seconds < 3600:
-                        eta = f"{int(eta_seconds / 60)} minutes"
-                    else:
-                        eta = f"{int(eta_seconds / 3600)} hours, {int((eta_seconds % 3600) / 60)} minutes"
-                else:
-                    eta = "calculating..."
-            else:
-                speed_str = "0 B/s"
-                eta = "calculating..."
             
             # Update GUI every 10% to avoid flooding chat
             if hasattr(self.client, 'gui') and percent % 10 == 0:
-                progress_message = f"Downloading {filename}... {percent}% ({self.format_size(received)} of {self.format_size(filesize)})"
+                progress_message = f"Downloading {filename}... {percent}% ({self.format_size(received)} of {size_str})"
                 self.download_progress.emit(filename, received, filesize)
                 print(progress_message)
                 
-            print(f"Progress update: {percent}% ({self.format_size(received)} of {self.format_size(filesize)})")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Progress update: %d%% (%s of %s)", percent, self.format_size(received), size_str)
         
         # Store update function and show initial state
         self.downloads[filename]['update_text'] = update_progress_text
         update_progress_text()
     
+    def _update_upload_progress(self, progress, task, size_str):
+        """Repaint the upload progress label from an _UploadTask's counters
+        
+        Args:
+            progress: QProgressDialog for the upload
+            task: _UploadTask doing the upload
+            size_str: format_size() of the file size, formatted once per upload
+        """
+        sent_bytes = task.sent_bytes
+        filesize = task.filesize
+        filename = task.filename
+        if filesize <= 0:
+            return
+        
+        elapsed = time.time() - task.start_time
+        if elapsed <= 0:
+            return
+        speed = sent_bytes / elapsed
+        percent = int(100 * sent_bytes / filesize)
+        speed_str = self.format_size(speed) + "/s"
+        
+        # Calculate ETA
+        if speed > 0:
+            eta_seconds = (filesize - sent_bytes) / speed
+            if eta_seconds < 60:
+                eta = f"{int(eta_seconds)} seconds"
+            elif eta_seconds < 3600:
+                eta = f"{int(eta_seconds / 60)} minutes"
+            else:
+                eta = f"{int(eta_seconds / 3600)} hours, {int((eta_seconds % 3600) / 60)} minutes"
+        else:
+            eta = "unknown"
+        
+        # Add a message at 50% complete
+        if percent >= 50 and not task.half_noted:
+            task.half_noted = True
+            if hasattr(self.client, 'gui'):
+                self.client.gui.add_chat_message("System", f"Upload of {filename} is 50% complete")
+        
+        progress.setLabelText(
+            f"Uploading {filename}...\n"
+            f"{percent}% complete ({self.format_size(sent_bytes)} of {size_str})\n"
+            f"Speed: {speed_str} | ETA: {eta}"
+        )
+
+    def _chunk_size_for(self, filesize):
+        """Chunk size for a new transfer, from past transfer rates and the connect RTT."""
+        return choose_chunk_size(filesize, self.est_bandwidth_bps, getattr(self.client, 'tcp_rtt', None))
+    
+    def _record_transfer_rate(self, sent_bytes, elapsed):
+        """
+        Fold a finished transfer into the bandwidth estimate.
+        Small transfers mostly measure socket buffering, so they are skipped.
+        
+        Args:
+            sent_bytes: Bytes sent
+            elapsed: Transfer duration in seconds
+        """
+        if sent_bytes < FILE_SMALL_SIZE or elapsed <= 0:
+            return
+        rate = sent_bytes * 8 / elapsed
+        if self.est_bandwidth_bps is None:
+            self.est_bandwidth_bps = rate
+        else:
+            self.est_bandwidth_bps = 0.7 * self.est_bandwidth_bps + 0.3 * rate
+    
     def format_size(self, size_bytes):
         """
         Convert byte count to human-readable size string.
@@ -811,64 +1147,83 @@ class FileSharingHandler(QObject):
         Returns:
             Formatted string (e.g., "1.5 MB", "320.0 KB")
         """
-        if size_bytes < 1024:
+        # Speeds arrive as floats; the unit only depends on the integer part
+        unit_index = min(max((int(size_bytes).bit_length() - 1) // 10, 0), 3)
+        divisor, suffix = _SIZE_UNITS[unit_index]
+        if suffix is None:
             return f"{size_bytes} bytes"
-        elif size_bytes < 1024 * 1024:
-            return f"{size_bytes / 1024:.1f} KB"
-        elif size_bytes < 1024 * 1024 * 1024:
-            return f"{size_bytes / (1024 * 1024):.1f} MB"
-        else:
-            return f"{size_bytes / (1024 * 1024 * 1024):.1f} GB"
+        return f"{size_bytes / divisor:.1f} {suffix}"
             
-    def find_local_file(self, filename):
+    def _search_paths(self):
         """
-        Search for a file in uploads directory, common locations, and custom paths.
-        Checks file_paths.txt for additional search directories.
+        Folders find_local_file searches after uploads/: common locations plus
+        those listed in file_paths.txt (supports ${HOME}, ${DOWNLOADS}, ${CWD}
+        variables). Built once and rebuilt only when file_paths.txt changes.
         
-        Args:
-            filename: Name of file to locate
-            
         Returns:
-            Full path to file if found, None otherwise
+            list: Folder paths in search order
         """
-        # Check uploads directory first (primary location for shared files)
-        uploads_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "uploads")
-        os.makedirs(uploads_dir, exist_ok=True)
-        uploads_path = os.path.join(uploads_dir, filename)
+        try:
+            mtime = os.stat(_PATHS_FILE).st_mtime_ns
+        except OSError:
+            mtime = None  # No file_paths.txt
+        if self._search_paths_cache is not None and mtime == self._paths_file_mtime:
+            return self._search_paths_cache
         
-        if os.path.exists(uploads_path):
-            print(f"Found file {filename} in uploads directory at {uploads_path}")
-            return uploads_path
+        home = os.path.expanduser("~")
+        downloads = os.path.join(home, "Downloads")
+        cwd = os.getcwd()
         
         # Common search locations
         search_paths = [
-            os.path.dirname(os.path.abspath(__file__)),
-            os.getcwd(),
-            os.path.join(os.path.expanduser("~"), "Downloads"),
-            os.path.join(os.path.expanduser("~"), "Documents"),
+            _MODULE_DIR,
+            cwd,
+            downloads,
+            os.path.join(home, "Documents"),
         ]
         
-        # Load custom search paths from file_paths.txt (supports ${HOME}, ${DOWNLOADS}, ${CWD} variables)
-        try:
-            paths_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), "file_paths.txt")
-            if os.path.exists(paths_file):
-                with open(paths_file, 'r') as f:
+        # Load custom search paths from file_paths.txt
+        if mtime is not None:
+            try:
+                with open(_PATHS_FILE, 'r') as f:
                     for line in f:
                         line = line.strip()
                         if not line or line.startswith('#'):
                             continue  # Skip comments and empty lines
                             
                         # Expand path variables
-                        line = line.replace("${HOME}", os.path.expanduser("~"))
-                        line = line.replace("${DOWNLOADS}", os.path.join(os.path.expanduser("~"), "Downloads"))
-                        line = line.replace("${CWD}", os.getcwd())
+                        line = line.replace("${HOME}", home)
+                        line = line.replace("${DOWNLOADS}", downloads)
+                        line = line.replace("${CWD}", cwd)
                         
                         search_paths.append(line)
-        except Exception as e:
-            print(f"Error loading custom file paths: {e}")
+            except Exception as e:
+                print(f"Error loading custom file paths: {e}")
+        
+        self._search_paths_cache = search_paths
+        self._paths_file_mtime = mtime
+        return search_paths
+    
+    def find_local_file(self, filename):
+        """
+        Search for a file in uploads directory, common locations, and custom paths.
+        Checks file_paths.txt for additional search directories.
+        
+        Args:
+            filename: Name of file to locate
+            
+        Returns:
+            Full path to file if found, None otherwise
+        """
+        # Check uploads directory first (primary location for shared files)
+        uploads_path = os.path.join(_UPLOADS_DIR, filename)
+        
+        if os.path.exists(uploads_path):
+            print(f"Found file {filename} in uploads directory at {uploads_path}")
+            return uploads_path
         
         # Search all paths for the file
-        for path in search_paths:
+        for path in self._search_paths():
             full_path = os.path.join(path, filename)
             if os.path.exists(full_path):
                 print(f"Found file {filename} at {full_path}")
@@ -877,6 +1232,42 @@ class FileSharingHandler(QObject):
         print(f"Could not find file {filename} in any search path")
         return None
     
+    @staticmethod
+    def _write_download(download_info):
+        """
+        Writer thread for one download: writes and hashes queued chunks
+        until _finish_writes queues the None sentinel.
+        
+        Args:
+            download_info: Entry of self.downloads
+        """
+        writes = download_info['writes']
+        while True:
+            chunk = writes.get()
+            if chunk is None:
+                return
+            if download_info['write_error'] is not None:
+                continue  # Already failed; just drain
+            try:
+                download_info['file'].write(chunk)
+                download_info['digest'].update(chunk)
+            except OSError as e:
+                download_info['write_error'] = e
+    
+    @staticmethod
+    def _finish_writes(download_info):
+        """
+        Stop a download's writer thread once every queued chunk is written.
+        Safe to call more than once.
+        
+        Args:
+            download_info: Entry of self.downloads
+        """
+        writer = download_info.pop('writer', None)
+        if writer is not None:
+            download_info['writes'].put(None)
+            writer.join()
+    
     def cancel_download(self, filename):
         """
         Cancel an in-progress download and clean up resources.
@@ -887,76 +1278,101 @@ class FileSharingHandler(QObject):
         if filename in self.downloads:
             print(f"Download of {filename} canceled")
             
-            # Close file handle
+            # Close file handle, dropping any preallocated space past what arrived
+            self._finish_writes(self.downloads[filename])
             if 'file' in self.downloads[filename]:
+                self.downloads[filename]['file'].truncate()
                 self.downloads[filename]['file'].close()
             
             # Notify server of cancellation
             cancel_msg = {'type': 'file_cancel', 'filename': filename}
             try:
-                send_with_size(self.client.tcp_socket, pickle.dumps(cancel_msg))
+                with self.client.tcp_send_lock:
+                    send_with_size(self.client.tcp_socket, pack_json(cancel_msg))
             except:
                 pass  # Connection may be closed
             
             # Remove from downloads dict
             del self.downloads[filename]
     
-    def handle_file_chunk(self, data):
+    def handle_file_chunk_raw(self, data):
         """
-        Process incoming file chunk during download.
-        Writes chunk to file, updates progress, and handles completion.
+        Process an incoming binary file chunk during download.
+        Writes chunk to file and updates progress.
         
         Args:
-            data: Pickled payload containing file_chunk or file_end message
+            data: Binary file chunk message (see pack_file_chunk_header)
         """
+        filename = None
         try:
-            payload = pickle.loads(data)
-            if payload['type'] == 'file_chunk':
-                filename = payload['filename']
-                chunk = payload.get('chunk')
-                
-                if not chunk:
-                    print(f"WARNING: Received empty chunk for file {filename}")
-                    return
-                    
-                print(f"Received chunk for {filename} of size {len(chunk)} bytes")
-                
-                # Ignore chunks for files we're not downloading
-                if filename not in self.downloads:
-                    print(f"Received chunk for file {filename} but we're not downloading it")
-                    return
-                
-                download_info = self.downloads[filename]
-                
-                # Write chunk and update byte count
-                download_info['file'].write(chunk)
-                download_info['received'] += len(chunk)
-                
-                first_chunk = (download_info['received'] == len(chunk))
-                
-                # Update progress every 256KB or 5% to reduce GUI overhead
-                update_needed = first_chunk or \
-                               (download_info['received'] % 262144 < len(chunk)) or \
-                               (download_info['received'] >= download_info['size']) or \
-                               (download_info['received'] * 20 // download_info['size'] > 
-                                (download_info['received'] - len(chunk)) * 20 // download_info['size'])
-                
-                if update_needed:
-                    if 'update_text' in download_info:
-                        download_info['update_text']()
-                    
-                    self.download_progress.emit(
-                        filename, 
-                        download_info['received'], 
-                        download_info['size']
-                    )
-                
-                # Log every 1MB for debugging
-                if download_info['received'] % 1048576 < len(chunk):
-                    percent = int(100 * download_info['received'] / download_info['size'])
-                    print(f"Download progress: {filename} - {percent}% ({self.format_size(download_info['received'])} / {self.format_size(download_info['size'])})")
-                
-            elif payload['type'] == 'file_end':
+            filename, _, compressed, chunk = unpack_file_chunk(data)
+            
+            if not chunk:
+                print(f"WARNING: Received empty chunk for file {filename}")
+                return
+            
+            logger.debug("Received chunk for %s of size %d bytes", filename, len(chunk))
+            
+            # Ignore chunks for files we're not downloading
+            if filename not in self.downloads:
+                logger.debug("Received chunk for file %s but we're not downloading it", filename)
+                return
+            
+            download_info = self.downloads[filename]
+            
+            # Inflate compressed chunks (sparse files are sent zlib-encoded)
+            if compressed:
+                inflater = download_info.get('inflater')
+                if inflater is None:
+                    inflater = download_info['inflater'] = zlib.decompressobj()
+                chunk = inflater.decompress(chunk)
+            
+            # A failed disk write ends the download
+            if download_info['write_error'] is not None:
+                raise download_info['write_error']
+            
+            # Queue chunk for writing and hashing; update byte count
+            download_info['writes'].put(chunk)
+            download_info['received'] += len(chunk)
+            
+            # Update progress on the first chunk, then every 256KB or 5% (whichever
+            # comes first) to reduce GUI overhead; only a crossing does any division
+            received = download_info['received']
+            if received >= download_info['next_update'] or received >= download_info['size']:
+                percent_step = max(download_info['size'] // 20, 1)
+                download_info['next_update'] = min((received // 262144 + 1) * 262144,
+                                                   (received // percent_step + 1) * percent_step)
+                if 'update_text' in download_info:
+                    download_info['update_text']()
+            
+                self.download_progress.emit(
+                    filename, 
+                    download_info['received'], 
+                    download_info['size']
+                )
+            
+            # Log every 1MB for debugging
+            if logger.isEnabledFor(logging.DEBUG) and download_info['received'] % 1048576 < len(chunk):
+                percent = int(100 * download_info['received'] / download_info['size'])
+                logger.debug("Download progress: %s - %d%% (%s / %s)", filename, percent,
+                             self.format_size(download_info['received']), download_info['size_str'])
+        
+        except (struct.error, IOError, zlib.error) as e:
+            print(f"Error handling file chunk: {e}")
+            # Clean up failed download
+            if filename and filename in self.downloads:
+                self.cancel_download(filename)
+    
+    def handle_file_chunk(self, payload):
+        """
+        Process the file_end message that completes a download.
+        Verifies the file and notifies the GUI.
+        
+        Args:
+            payload: file_end message dict, already decoded by the TCP receiver
+        """
+        try:
+            if payload['type'] == 'file_end':
                 # Download complete - finalize and emit signal
                 filename = payload['filename']
                 
@@ -968,20 +1384,38 @@ class FileSharingHandler(QObject):
                 
                 print(f"Download completed: {filename} - received {self.format_size(download_info['received'])} of {self.format_size(download_info['size'])}")
                 
-                # Close file and store path
+                # Let the writer drain, then close file (cut back to what arrived,
+                # in case it was preallocated larger) and store path
+                self._finish_writes(download_info)
+                if download_info['write_error'] is not None:
+                    raise download_info['write_error']
+                download_info['file'].truncate()
                 download_info['file'].close()
                 final_path = download_info['path']
                 
                 # Remove from downloads before emitting to prevent recursion
                 del self.downloads[filename]
                 
+                # Verify integrity (senders without hashing omit sha256)
+                expected = payload.get('sha256')
+                if expected and download_info['digest'].hexdigest() != expected:
+                    print(f"Integrity check failed for {filename}: SHA-256 mismatch")
+                    try:
+                        os.remove(final_path)
+                    except OSError:
+                        pass
+                    if hasattr(self.client, 'gui'):
+                        self.client.gui.add_chat_message(
+                            "System", f"Download of <b>{filename}</b> was corrupted in transit and has been discarded")
+                    return
+                
                 # Notify GUI of completion
                 self.download_complete.emit(filename, final_path)
                 
                 print(f"Download complete signal emitted for {filename}")
                 print(f"Download of {filename} completed")
                 
-        except (pickle.UnpicklingError, KeyError, IOError) as e:
+        except (KeyError, ValueError, IOError) as e:
             print(f"Error handling file chunk: {e}")
             # Clean up failed download
             filename = payload.get('filename')
@@ -1006,8 +1440,7 @@ class FileSharingHandler(QObject):
         print(f"Received request for file {filename} from another client")
         
         # Check uploads directory first (primary location for shared files)
-        uploads_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "uploads")
-        uploads_path = os.path.join(uploads_dir, filename)
+        uploads_path = os.path.join(_UPLOADS_DIR, filename)
         
         if os.path.exists(uploads_path):
             print(f"Found file {filename} in uploads directory")
@@ -1026,7 +1459,8 @@ class FileSharingHandler(QObject):
                 'filename': filename,
                 'requester': requester
             }
-            send_with_size(self.client.tcp_socket, pickle.dumps(error_msg))
+            with self.client.tcp_send_lock:
+                send_with_size(self.client.tcp_socket, pack_json(error_msg))
             return
             
         # Initiate file transfer
@@ -1049,61 +1483,97 @@ class FileSharingHandler(QObject):
         # No progress dialog - this runs in background thread
         progress = None
         
+        # Cork so headers and chunks leave as full segments (uncorked in finally)
+        set_tcp_cork(self.client.tcp_socket, True)
         try:
             start_time = time.time()
             sent_bytes = 0
             
             # Read and send file in chunks
-            with open(filepath, 'rb', buffering=8192) as f:
-                chunk_size = FILE_CHUNK_SIZE
+            # Hash the chunks as they are sent, so integrity costs no extra read pass
+            digest = hashlib.sha256()
+            with open(filepath, 'rb', buffering=0) as f:
+                advise_sequential(f)
+                chunk_size = self._chunk_size_for(filesize)
                 
-                while True:
-                    chunk = f.read(chunk_size)
-                    if not chunk:
-                        break  # EOF
-                    if progress and progress.wasCanceled():
-                        print("File sending cancelled.")
-                        return
-                        
-                    # Send chunk to server with requester ID
-                    data = {
-                        'type': 'file_chunk',
-                        'filename': filename,
-                        'chunk': chunk,
-                        'requester': requester  # Routes chunk to correct client
-                    }
-                    send_with_size(self.client.tcp_socket, pickle.dumps(data))
-                    sent_bytes += len(chunk)
+                # Level 1 is plenty for runs of zeros; each chunk is flushed so
+                # the receiver can inflate it on arrival
+                compressor = None
+                st = os.fstat(f.fileno())
+                if filename in self._compressed_files or is_sparse(st):
+                    compressor = zlib.compressobj(1)
+                header = pack_file_chunk_header(filename, requester, compressed=compressor is not None)
+                
+                # A file already hashed at this size and mtime needs no read pass:
+                # its chunks go out with sendfile() and the cached digest is reused
+                cached = self._digest_cache.get(filepath)
+                sha256 = None
+                if compressor is None and HAVE_SENDFILE and cached and cached[:2] == (st.st_size, st.st_mtime_ns):
+                    sha256 = cached[2]
+                
+                if sha256 is not None:
+                    while sent_bytes < filesize:
+                        n = min(ramp_chunk_size(sent_bytes, chunk_size), filesize - sent_bytes)
+                        with self.client.tcp_send_lock:
+                            send_file_range_with_size(self.client.tcp_socket, header, f, sent_bytes, n)
+                        sent_bytes += n
+                else:
+                    # The next chunks are read on a helper thread while this one is sent;
+                    # closing() stops that thread before the file is closed
+                    with closing(read_ahead(f, chunk_size)) as chunks:
+                        for chunk in chunks:
+                            n = len(chunk)
+                            digest.update(chunk)
+                            if progress and progress.wasCanceled():
+                                print("File sending cancelled.")
+                                return
+                                
+                            # Send chunk to server; the header's requester routes it to the right client.
+                            # Compressed output goes out as its two parts, without joining them.
+                            if compressor is not None:
+                                parts = (compressor.compress(chunk), compressor.flush(zlib.Z_SYNC_FLUSH))
+                            else:
+                                parts = (chunk,)
+                            with self.client.tcp_send_lock:
+                                send_parts_with_size(self.client.tcp_socket, header, *parts)
+                            sent_bytes += n
+                            
+                            # Update progress dialog if present
+                            if progress:
+                                progress.setValue(sent_bytes)
+                                
+                                if sent_bytes % 262144 < chunk_size:  # Update every 256KB
+                                    percent = int(100 * sent_bytes / filesize)
+                                    elapsed = time.time() - start_time
+                                    if elapsed > 0:
+                                        speed = sent_bytes / elapsed
+                                        speed_str = self.format_size(speed) + "/s"
+                                        progress.setLabelText(
+                                            f"Sending {filename} to another client...\n"
+                                            f"{percent}% complete ({self.format_size(sent_bytes)} of {self.format_size(filesize)})\n"
+                                            f"Speed: {speed_str}"
+                                        )
                     
-                    # Update progress dialog if present
-                    if progress:
-                        progress.setValue(sent_bytes)
-                        
-                        if sent_bytes % 262144 < chunk_size:  # Update every 256KB
-                            percent = int(100 * sent_bytes / filesize)
-                            elapsed = time.time() - start_time
-                            if elapsed > 0:
-                                speed = sent_bytes / elapsed
-                                speed_str = self.format_size(speed) + "/s"
-                                progress.setLabelText(
-                                    f"Sending {filename} to another client...\n"
-                                    f"{percent}% complete ({self.format_size(sent_bytes)} of {self.format_size(filesize)})\n"
-                                    f"Speed: {speed_str}"
-                                )
+                    sha256 = digest.hexdigest()
+                    self._digest_cache[filepath] = (st.st_size, st.st_mtime_ns, sha256)
             
             # Send completion marker
             eof_marker = {
                 'type': 'file_end',
                 'filename': filename,
-                'requester': requester
+                'requester': requester,
+                'sha256': sha256
             }
-            send_with_size(self.client.tcp_socket, pickle.dumps(eof_marker))
+            with self.client.tcp_send_lock:
+                send_with_size(self.client.tcp_socket, pack_json(eof_marker))
             print(f"Finished sending {filename} to requester")
+            self._record_transfer_rate(sent_bytes, time.time() - start_time)
             
         except Exception as e:
             print(f"Error sending file to requester: {e}")
             import traceback
             traceback.print_exc()
         finally:
+            set_tcp_cork(self.client.tcp_socket, False)
             if progress:
                 progress.close()
\ No newline at end of file
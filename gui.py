@@ -8,10 +8,10 @@ from PyQt5.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QPu
                           QTextEdit, QLineEdit, QLabel, QGridLayout, QFrame, QMessageBox, 
                           QFileDialog, QTableWidget, QTableWidgetItem, QHeaderView)
 from PyQt5.QtGui import QIcon, QFont, QPixmap
-from PyQt5.QtCore import Qt, QSize, QTimer, pyqtSlot
+from PyQt5.QtCore import Qt, QSize, QTimer, QSignalBlocker, QSignalMapper, pyqtSlot
 
 from config import *
-from utils import resource_path
+from utils import icon_source
 
 from screen_sharing_module import ScreenShareDisplay
 from file_dialog import SharedFilesDialog
@@ -20,6 +20,32 @@ from join_media_dialog import JoinMediaDialog
 class MainWindow(QMainWindow):
     """Main application window for FusionMeet video conferencing."""
     
+    # Download button styles, shared by every files table row (one string each,
+    # so Qt's stylesheet cache sees the same text instead of a fresh copy per row)
+    DOWNLOAD_BUTTON_QSS = ("QPushButton { background-color: #4CAF50; color: white; border: none; padding: 5px 10px; border-radius: 3px; } "
+                           "QPushButton:hover { background-color: #45a049; }")
+    DOWNLOAD_PROGRESS_QSS = "QPushButton { background-color: #007bff; color: white; border: none; padding: 5px 10px; border-radius: 3px; }"
+    DOWNLOAD_COMPLETE_QSS = "QPushButton { background-color: #28a745; color: white; border: none; padding: 5px 10px; border-radius: 3px; }"
+    
+    # Toolbar icons, loaded from disk once per path
+    _icons = {}
+    
+    @classmethod
+    def icon(cls, relative_path):
+        """
+        Return a cached QIcon for an icon (compiled Qt resource or file on disk).
+        
+        Args:
+            relative_path: Icon path relative to the app root (e.g., 'icons/mic_on.png')
+            
+        Returns:
+            QIcon: Shared icon instance
+        """
+        icon = cls._icons.get(relative_path)
+        if icon is None:
+            icon = cls._icons[relative_path] = QIcon(icon_source(relative_path))
+        return icon
+    
     def __init__(self, client, username):
         """
         Initialize main window with video grid, controls, and side panels.
@@ -40,6 +66,14 @@ class MainWindow(QMainWindow):
         self.initial_camera_preference = False
         self.initial_mic_preference = False
         
+        # Coalesce participant list refreshes: joins, leaves and per-frame video
+        # notifications only arm this timer, so the list redraws at most every 100 ms
+        self._participants_timer = QTimer(self)
+        self._participants_timer.setInterval(100)
+        self._participants_timer.setSingleShot(True)
+        self._participants_timer.timeout.connect(self.update_participants_list)
+        self._rendered_participants_version = None  # Skips redraws when unchanged
+        
         # Light-themed message box style for better readability
         self.dialog_style = """
             QMessageBox {
@@ -74,6 +108,7 @@ class MainWindow(QMainWindow):
             if hasattr(self.client.file_sharing_handler, 'new_file_available'):
                 print("Connecting new_file_available signal")
                 self.client.file_sharing_handler.new_file_available.connect(self.on_new_file_available)
+                self.client.file_sharing_handler.new_files_available_batch.connect(self.on_new_files_available_batch)
             else:
                 print("WARNING: new_file_available signal not found")
                 
@@ -128,7 +163,7 @@ class MainWindow(QMainWindow):
             if hasattr(self.client, 'video_handler') and hasattr(self.client.video_handler, 'participants_changed_signal'):
                 print("Connecting participants_changed signal")
                 self.client.video_handler.participants_changed_signal.connect(
-                    self.update_participants_list
+                    self.schedule_participants_update
                 )
             else:
                 print("WARNING: participants_changed_signal not found")
@@ -306,7 +341,7 @@ class MainWindow(QMainWindow):
         
         self.video_button = QPushButton()
         self.video_button.setStyleSheet(button_style)
-        self.video_button.setIcon(QIcon(resource_path("icons/video_on.png")))
+        self.video_button.setIcon(self.icon("icons/video_on.png"))
         self.video_button.setIconSize(QSize(30, 30))
         self.video_button.setToolTip("Toggle Video")
         self.video_button.clicked.connect(self.toggle_video)
@@ -337,7 +372,7 @@ class MainWindow(QMainWindow):
         
         self.mute_button = QPushButton()
         self.mute_button.setStyleSheet(button_style)
-        self.mute_button.setIcon(QIcon(resource_path("icons/mic_on.png")))
+        self.mute_button.setIcon(self.icon("icons/mic_on.png"))
         self.mute_button.setIconSize(QSize(30, 30))
         self.mute_button.setToolTip("Toggle Audio")
         self.mute_button.clicked.connect(self.toggle_mute)
@@ -357,7 +392,7 @@ class MainWindow(QMainWindow):
         
         self.share_screen_button = QPushButton()
         self.share_screen_button.setStyleSheet(button_style)
-        self.share_screen_button.setIcon(QIcon(resource_path("icons/screen_share.png")))
+        self.share_screen_button.setIcon(self.icon("icons/screen_share.png"))
         self.share_screen_button.setIconSize(QSize(30, 30))
         self.share_screen_button.setToolTip("Share Screen")
         self.share_screen_button.clicked.connect(self.toggle_screen_share)
@@ -380,7 +415,7 @@ class MainWindow(QMainWindow):
         
         self.file_button = QPushButton()
         self.file_button.setStyleSheet(button_style)
-        self.file_button.setIcon(QIcon(resource_path("icons/file_transfer.png")))
+        self.file_button.setIcon(self.icon("icons/file_transfer.png"))
         self.file_button.setIconSize(QSize(30, 30))
         self.file_button.setToolTip("Share File")
         self.file_button.clicked.connect(self.share_file)
@@ -400,7 +435,7 @@ class MainWindow(QMainWindow):
         
         self.leave_button = QPushButton()
         self.leave_button.setStyleSheet(button_style + "background-color: #FF5252;")
-        self.leave_button.setIcon(QIcon(resource_path("icons/leave.png")))
+        self.leave_button.setIcon(self.icon("icons/leave.png"))
         self.leave_button.setIconSize(QSize(30, 30))
         self.leave_button.setToolTip("Leave Meeting")
         self.leave_button.clicked.connect(self.close)
@@ -485,6 +520,16 @@ class MainWindow(QMainWindow):
         # Initialize with current user
         self.update_participants_list()
     
+    @pyqtSlot()
+    def schedule_participants_update(self):
+        """
+        Request a participants list refresh on the next timer tick.
+        Calls while the timer is pending are absorbed, so a steady stream of
+        requests (e.g. one per video frame) can't keep postponing the refresh.
+        """
+        if not self._participants_timer.isActive():
+            self._participants_timer.start()
+    
     @pyqtSlot()
     def update_participants_list(self):
         """
@@ -492,33 +537,32 @@ class MainWindow(QMainWindow):
         Aggregates participants from client.participants and video_handler.
         """
         try:
-            self.participants_list.clear()
-            
-            # Collect unique participants from multiple sources
-            participants = set()
-            participants.add(self.username)  # Add yourself first
-            
-            # Add from client's tracked participants
-            if hasattr(self.client, 'participants'):
-                participants.update(self.client.participants)
-                print(f"🔍 Participants from client.participants: {self.client.participants}")
-            
-            # Add users with active video streams
+            # Users with active video streams (may include anyone the server
+            # list hasn't reported yet)
+            video_users = ()
             if hasattr(self.client, 'video_handler'):
                 if hasattr(self.client.video_handler, 'remote_video_widgets'):
-                    video_users = list(self.client.video_handler.remote_video_widgets.keys())
-                    participants.update(video_users)
-                    print(f"🔍 Participants from video widgets: {video_users}")
+                    video_users = tuple(self.client.video_handler.remote_video_widgets.keys())
             
-            # Filter out invalid entries
-            participants = {p for p in participants if p and p != "creating"}
+            # Skip the redraw when neither membership nor video streams changed
+            version = (getattr(self.client, '_participants_version', None), video_users)
+            if version == self._rendered_participants_version:
+                return
             
-            # Display: current user first, then others alphabetically
+            # Client's tracked participants in join order, then video-only users
+            participants = dict.fromkeys(getattr(self.client, 'participants', ()))
+            participants.update(dict.fromkeys(video_users))
+            
+            # Display: current user first, then others in join order
+            self.participants_list.clear()
             self.participants_list.addItem(f"👤 {self.username} (You)")
-            for username in sorted(participants - {self.username}):
-                self.participants_list.addItem(f"👤 {username}")
+            for username in participants:
+                if username and username != "creating" and username != self.username:
+                    self.participants_list.addItem(f"👤 {username}")
             
-            print(f"🔄 Participants list updated: {sorted(participants)}")
+            # Recorded only once the redraw succeeded, so a failed one is retried
+            self._rendered_participants_version = version
+            print(f"🔄 Participants list updated: {list(participants)}")
             
         except Exception as e:
             print(f"Error updating participants list: {e}")
@@ -542,8 +586,11 @@ class MainWindow(QMainWindow):
         self.files_table = QTableWidget(0, 3)
         self.files_table.setHorizontalHeaderLabels(["File Name", "Size", "Action"])
         self.files_table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
-        self.files_table.horizontalHeader().setSectionResizeMode(1, QHeaderView.ResizeToContents)
-        self.files_table.horizontalHeader().setSectionResizeMode(2, QHeaderView.ResizeToContents)
+        # Fixed widths: ResizeToContents re-measures every cell on each row change
+        self.files_table.horizontalHeader().setSectionResizeMode(1, QHeaderView.Fixed)
+        self.files_table.horizontalHeader().setSectionResizeMode(2, QHeaderView.Fixed)
+        self.files_table.setColumnWidth(1, 80)
+        self.files_table.setColumnWidth(2, 90)
         self.files_table.verticalHeader().setVisible(False)
         self.files_table.setSelectionBehavior(QTableWidget.SelectRows)
         self.files_table.setMaximumHeight(120)
@@ -564,6 +611,19 @@ class MainWindow(QMainWindow):
         """)
         files_layout.addWidget(self.files_table)
         
+        # Rows currently shown, in table order, so refreshes only touch the delta
+        self._displayed_files = {}  # {filename: filesize}
+        self._file_rows = {}  # {filename: row index}
+        self._displayed_files_version = None  # Handler files_version the table reflects
+        
+        # One mapper routes every row's download button to download_file(filename);
+        # mappings are dropped automatically when a row's button is destroyed
+        self._download_mapper = QSignalMapper(self)
+        mapped = getattr(self._download_mapper, 'mappedString', None)  # Qt >= 5.15
+        if mapped is None:
+            mapped = self._download_mapper.mapped[str]
+        mapped.connect(self.download_file)
+        
         # Add buttons
         buttons_layout = QHBoxLayout()
         
@@ -735,7 +795,7 @@ class MainWindow(QMainWindow):
                 try:
                     result = self.client.audio_handler.start_stream()
                     if result:
-                        self.mute_button.setIcon(QIcon(resource_path("icons/mic_on.png")))
+                        self.mute_button.setIcon(self.icon("icons/mic_on.png"))
                         self.mute_button.setToolTip("Click to stop microphone")
                         
                         # Start audio level visualization timer
@@ -753,7 +813,7 @@ class MainWindow(QMainWindow):
                 try:
                     result = self.client.video_handler.start_stream()
                     if result:
-                        self.video_button.setIcon(QIcon(resource_path("icons/video_on.png")))
+                        self.video_button.setIcon(self.icon("icons/video_on.png"))
                 except Exception as e:
                     print(f"Error starting video: {str(e)}")
 
@@ -768,7 +828,7 @@ class MainWindow(QMainWindow):
                 # Stop microphone
                 print("🔇 Stopping microphone...")
                 self.client.audio_handler.stop_stream()
-                self.mute_button.setIcon(QIcon(resource_path("icons/mic_off.png")))
+                self.mute_button.setIcon(self.icon("icons/mic_off.png"))
                 self.mute_button.setToolTip("Click to start microphone")
                 if hasattr(self, 'audio_level_timer') and self.audio_level_timer:
                     self.audio_level_timer.stop()
@@ -777,7 +837,7 @@ class MainWindow(QMainWindow):
                 print("🎤 Starting microphone...")
                 result = self.client.audio_handler.start_stream()
                 if result:
-                    self.mute_button.setIcon(QIcon(resource_path("icons/mic_on.png")))
+                    self.mute_button.setIcon(self.icon("icons/mic_on.png"))
                     self.mute_button.setToolTip("Click to stop microphone")
                     
                     # Start audio level visualization (10 Hz update)
@@ -799,11 +859,11 @@ class MainWindow(QMainWindow):
         try:
             if self.client.video_handler.is_streaming:
                 self.client.video_handler.stop_stream()
-                self.video_button.setIcon(QIcon(resource_path("icons/video_off.png")))
+                self.video_button.setIcon(self.icon("icons/video_off.png"))
             else:
                 result = self.client.video_handler.start_stream()
                 if result:
-                    self.video_button.setIcon(QIcon(resource_path("icons/video_on.png")))
+                    self.video_button.setIcon(self.icon("icons/video_on.png"))
         except Exception as e:
             print(f"Error toggling video: {str(e)}")
 
@@ -821,14 +881,14 @@ class MainWindow(QMainWindow):
                 # Stop sharing
                 print("Stopping screen sharing...")
                 self.client.screen_share_handler.stop_sharing()
-                self.share_screen_button.setIcon(QIcon(resource_path("icons/screen_share.png")))
+                self.share_screen_button.setIcon(self.icon("icons/screen_share.png"))
                 self.client.screen_share_handler.hide_screen_share_signal.emit()
             else:
                 # Start sharing
                 print("Starting screen sharing...")
                 result = self.client.screen_share_handler.start_sharing()
                 if result:
-                    self.share_screen_button.setIcon(QIcon(resource_path("icons/screen_share_off.png")))
+                    self.share_screen_button.setIcon(self.icon("icons/screen_share_off.png"))
                     print("Screen sharing started successfully")
                 else:
                     print("Failed to start screen sharing")
@@ -860,60 +920,120 @@ class MainWindow(QMainWindow):
         scrollbar.setValue(scrollbar.maximum())
         
     def refresh_files(self):
-        """Update files table with currently available shared files."""
-        self.files_table.setRowCount(0)
-        
+        """
+        Update files table with currently available shared files.
+        Diffs against the rows already shown and only inserts, removes or
+        updates the changed ones (existing download buttons keep their state).
+        """
         try:
-            # Get files from file sharing handler
-            if not hasattr(self.client.file_sharing_handler, 'files'):
-                print("File sharing handler has no 'files' attribute")
+            # Consistent copy of the handler's files; nothing to do if the
+            # list hasn't changed since the last refresh
+            version, files = self.client.file_sharing_handler.files_snapshot()
+            if version == self._displayed_files_version:
                 return
-                
-            files = self.client.file_sharing_handler.files
             print(f"Refreshing files list. Files available: {len(files)}")
-            print(f"Files: {files}")
-            
-            # Show "No files" message if empty
-            if len(files) == 0:
-                self.files_table.setRowCount(1)
-                no_files = QTableWidgetItem("No shared files available")
-                no_files.setTextAlignment(Qt.AlignCenter)
-                no_files.setFlags(Qt.ItemIsEnabled)
-                self.files_table.setSpan(0, 0, 1, 3)  # Span all columns
-                self.files_table.setItem(0, 0, no_files)
-                return
             
-            # Populate table with available files
-            for row, (filename, filesize) in enumerate(files.items()):
-                self.files_table.insertRow(row)
-                print(f"Adding file to table: {filename} ({self.format_size(filesize)})")
-                
-                # Filename column
-                name_item = QTableWidgetItem(filename)
-                name_item.setFlags(Qt.ItemIsSelectable | Qt.ItemIsEnabled)
-                self.files_table.setItem(row, 0, name_item)
-                
-                # Size column
-                size_str = self.format_size(filesize)
-                size_item = QTableWidgetItem(size_str)
-                size_item.setFlags(Qt.ItemIsSelectable | Qt.ItemIsEnabled)
-                size_item.setTextAlignment(Qt.AlignCenter)
-                self.files_table.setItem(row, 1, size_item)
-                
-                # Download button
-                download_btn = QPushButton("Download")
-                download_btn.setStyleSheet("QPushButton { background-color: #4CAF50; color: white; border: none; padding: 5px 10px; border-radius: 3px; } "
-                                           "QPushButton:hover { background-color: #45a049; }")
-                download_btn.clicked.connect(lambda _, f=filename: self.download_file(f))
-                
-                self.files_table.setCellWidget(row, 2, download_btn)
-                
-            self.files_table.update()
+            # Batch the row mutations: one repaint and no per-cell signals
+            self.files_table.setUpdatesEnabled(False)
+            blocker = QSignalBlocker(self.files_table)
+            try:
+                self._sync_files_table(files)
+                self._displayed_files_version = version
+            finally:
+                blocker.unblock()
+                self.files_table.setUpdatesEnabled(True)
         except Exception as e:
             import traceback
             print(f"Error refreshing files: {e}")
             traceback.print_exc()
     
+    def _sync_files_table(self, files):
+        """
+        Bring the files table in line with a snapshot of the shared files.
+        
+        Args:
+            files: Dict of {filename: filesize}
+        """
+        # Show "No files" message if empty
+        if len(files) == 0:
+            self.files_table.setRowCount(0)
+            self._displayed_files = {}
+            self._file_rows = {}
+            self.files_table.setRowCount(1)
+            no_files = QTableWidgetItem("No shared files available")
+            no_files.setTextAlignment(Qt.AlignCenter)
+            no_files.setFlags(Qt.ItemIsEnabled)
+            self.files_table.setSpan(0, 0, 1, 3)  # Span all columns
+            self.files_table.setItem(0, 0, no_files)
+            return
+        
+        # Drop the "No files" placeholder row before adding real ones
+        if not self._displayed_files:
+            self.files_table.setRowCount(0)
+            self.files_table.clearSpans()
+        
+        displayed = self._displayed_files
+        removed = displayed.keys() - files.keys()
+        added = [filename for filename in files if filename not in displayed]
+        changed = [filename for filename in files
+                   if filename in displayed and files[filename] != displayed[filename]]
+        
+        # Remove from the bottom up so pending row indices stay valid
+        for row in sorted((self._file_rows[filename] for filename in removed), reverse=True):
+            self.files_table.removeRow(row)
+        
+        # Surviving rows keep their relative order
+        self._displayed_files = {filename: files[filename] for filename in displayed if filename not in removed}
+        self._file_rows = {filename: row for row, filename in enumerate(self._displayed_files)}
+        
+        for filename in changed:
+            self.files_table.item(self._file_rows[filename], 1).setText(self.format_size(files[filename]))
+            self._displayed_files[filename] = files[filename]
+        
+        for filename in added:
+            row = self.files_table.rowCount()
+            self.files_table.insertRow(row)
+            self._add_file_row(row, filename, files[filename])
+            self._displayed_files[filename] = files[filename]
+            self._file_rows[filename] = row
+    
+    def _add_file_row(self, row, filename, filesize):
+        """
+        Fill an inserted files table row: name, size and download button.
+        
+        Args:
+            row: Index of the freshly inserted row
+            filename: Shared file name
+            filesize: Size in bytes
+        """
+        print(f"Adding file to table: {filename} ({self.format_size(filesize)})")
+        
+        # Filename column
+        name_item = QTableWidgetItem(filename)
+        name_item.setFlags(Qt.ItemIsSelectable | Qt.ItemIsEnabled)
+        self.files_table.setItem(row, 0, name_item)
+        
+        # Size column
+        size_item = QTableWidgetItem(self.format_size(filesize))
+        size_item.setFlags(Qt.ItemIsSelectable | Qt.ItemIsEnabled)
+        size_item.setTextAlignment(Qt.AlignCenter)
+        self.files_table.setItem(row, 1, size_item)
+        
+        # Download button
+        download_btn = QPushButton("Download")
+        download_btn.setStyleSheet(self.DOWNLOAD_BUTTON_QSS)
+        download_btn.clicked.connect(self._download_mapper.map)
+        self._download_mapper.setMapping(download_btn, filename)
+        
+        self.files_table.setCellWidget(row, 2, download_btn)
+    
+    def _download_button(self, filename):
+        """Return the download button for a shown file, or None."""
+        row = self._file_rows.get(filename)
+        if row is None:
+            return None
+        return self.files_table.cellWidget(row, 2)
+    
     def download_file(self, filename):
         """
         Initiate file download and update UI to show progress.
@@ -923,14 +1043,11 @@ class MainWindow(QMainWindow):
         """
         try:
             # Update download button to show 0% progress
-            for row in range(self.files_table.rowCount()):
-                if self.files_table.item(row, 0) and self.files_table.item(row, 0).text() == filename:
-                    download_btn = self.files_table.cellWidget(row, 2)
-                    if download_btn:
-                        download_btn.setText("0%")
-                        download_btn.setEnabled(True)
-                        download_btn.setStyleSheet("QPushButton { background-color: #007bff; color: white; border: none; padding: 5px 10px; border-radius: 3px; }")
-                    break
+            download_btn = self._download_button(filename)
+            if download_btn:
+                download_btn.setText("0%")
+                download_btn.setEnabled(True)
+                download_btn.setStyleSheet(self.DOWNLOAD_PROGRESS_QSS)
             
             # Show download notification in chat
             self.add_chat_message("System", f"Downloading <b>{filename}</b>...")
@@ -958,6 +1075,21 @@ class MainWindow(QMainWindow):
         self.add_chat_message("System", f"New file available: <b>{filename}</b> ({self.format_size(filesize)}) - See Shared Files panel to download")
         print(f"New file available signal received: {filename} ({self.format_size(filesize)})")
         self.refresh_files()
+    
+    def on_new_files_available_batch(self, files):
+        """
+        Handle a list of available files (sent when joining) with one
+        chat message and one table refresh.
+        
+        Args:
+            files: Dict of {filename: filesize}
+        """
+        if len(files) == 1:
+            self.on_new_file_available(*next(iter(files.items())))
+            return
+        self.add_chat_message("System", f"{len(files)} shared files available - See Shared Files panel to download")
+        print(f"New files available signal received: {len(files)} files")
+        self.refresh_files()
         
     def on_download_complete(self, filename, path):
         """
@@ -976,15 +1108,11 @@ class MainWindow(QMainWindow):
             self._completed_downloads.add(filename)
             
             # Reset download button to original state
-            for row in range(self.files_table.rowCount()):
-                if self.files_table.item(row, 0) and self.files_table.item(row, 0).text() == filename:
-                    download_btn = self.files_table.cellWidget(row, 2)
-                    if download_btn:
-                        download_btn.setText("Download")
-                        download_btn.setEnabled(True)
-                        download_btn.setStyleSheet("QPushButton { background-color: #4CAF50; color: white; border: none; padding: 5px 10px; border-radius: 3px; } "
-                                                  "QPushButton:hover { background-color: #45a049; }")
-                    break
+            download_btn = self._download_button(filename)
+            if download_btn:
+                download_btn.setText("Download")
+                download_btn.setEnabled(True)
+                download_btn.setStyleSheet(self.DOWNLOAD_BUTTON_QSS)
             
             # Show success dialog
             self.show_message_box(
@@ -1008,16 +1136,13 @@ class MainWindow(QMainWindow):
         percent = int(100 * received / total) if total > 0 else 0
         
         # Update download button progress
-        for row in range(self.files_table.rowCount()):
-            if self.files_table.item(row, 0) and self.files_table.item(row, 0).text() == filename:
-                download_btn = self.files_table.cellWidget(row, 2)
-                if download_btn:
-                    if percent < 100:
-                        download_btn.setText(f"{percent}%")
-                    else:
-                        download_btn.setText("Complete")
-                        download_btn.setStyleSheet("QPushButton { background-color: #28a745; color: white; border: none; padding: 5px 10px; border-radius: 3px; }")
-                break
+        download_btn = self._download_button(filename)
+        if download_btn:
+            if percent < 100:
+                download_btn.setText(f"{percent}%")
+            else:
+                download_btn.setText("Complete")
+                download_btn.setStyleSheet(self.DOWNLOAD_COMPLETE_QSS)
                 
         # Show progress notification at 50%
         if percent == 50 and received > 0 and received < total:
@@ -1143,12 +1268,12 @@ class MainWindow(QMainWindow):
             is_streaming: True if microphone is active, False otherwise
         """
         if is_streaming:
-            self.mute_button.setIcon(QIcon(resource_path("icons/mic_on.png")))
+            self.mute_button.setIcon(self.icon("icons/mic_on.png"))
             # Start audio level updates if not running
             if hasattr(self, 'audio_level_timer') and not self.audio_level_timer.isActive():
                 self.audio_level_timer.start(100)
         else:
-            self.mute_button.setIcon(QIcon(resource_path("icons/mic_off.png")))
+            self.mute_button.setIcon(self.icon("icons/mic_off.png"))
             # Stop audio level updates
             if hasattr(self, 'audio_level_timer') and self.audio_level_timer.isActive():
                 self.audio_level_timer.stop()
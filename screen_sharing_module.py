@@ -10,9 +10,9 @@ import threading
 import time
 from PyQt5.QtCore import QTimer, QObject, pyqtSignal, pyqtSlot, Qt, QMetaObject, Q_ARG
 from PyQt5.QtWidgets import QWidget, QLabel, QVBoxLayout
-from PyQt5.QtGui import QImage, QPixmap, QIcon
+from PyQt5.QtGui import QImage, QPixmap
 
-from utils import send_with_size, resource_path
+from utils import send_with_size, pack_screen_frame, unpack_screen_frame, safe_loads, SCREEN_TYPE_ID
 
 
 class ScreenShareHandler(QObject):
@@ -88,7 +88,8 @@ class ScreenShareHandler(QObject):
                 'type': 'screen_share_request',
                 'action': 'start'
             }
-            send_with_size(self.client.tcp_socket, pickle.dumps(request))
+            with self.client.tcp_send_lock:
+                send_with_size(self.client.tcp_socket, pickle.dumps(request))
             print("📤 Sent screen share start request to server")
             return True
         except Exception as e:
@@ -207,7 +208,8 @@ class ScreenShareHandler(QObject):
                     'type': 'screen_stop',
                     'username': self.client.username
                 }
-                send_with_size(self.client.tcp_socket, pickle.dumps(stop_notification))
+                with self.client.tcp_send_lock:
+                    send_with_size(self.client.tcp_socket, pickle.dumps(stop_notification))
                 print("📤 Sent screen_stop notification to other clients")
             except Exception as e:
                 print(f"Error sending screen_stop notification: {e}")
@@ -218,7 +220,8 @@ class ScreenShareHandler(QObject):
                     'type': 'screen_share_request',
                     'action': 'stop'
                 }
-                send_with_size(self.client.tcp_socket, pickle.dumps(request))
+                with self.client.tcp_send_lock:
+                    send_with_size(self.client.tcp_socket, pickle.dumps(request))
                 print("📤 Sent screen share stop request to server")
             except Exception as e:
                 print(f"Error notifying server of stop: {e}")
@@ -376,7 +379,8 @@ class ScreenShareHandler(QObject):
                         'username': self.client.username
                     }
             
-            data = pickle.dumps(payload)
+            # Binary frame: fixed header + image bytes (no pickling)
+            data = pack_screen_frame(payload['format'], payload['size'], payload['username'], payload['frame'])
             
             # Skip frame if packet exceeds 1MB
             MAX_PACKET_SIZE = 1024 * 1024
@@ -385,7 +389,8 @@ class ScreenShareHandler(QObject):
                 return
                 
             print(f"Sending screen frame: {payload['size'][0]}x{payload['size'][1]}, {len(data)} bytes, format: {payload.get('format', 'rgb')}")
-            send_with_size(self.client.tcp_socket, data)
+            with self.client.tcp_send_lock:
+                send_with_size(self.client.tcp_socket, data)
             
         except ConnectionError as e:
             print(f"Connection error in screen sharing: {str(e)}")
@@ -400,10 +405,16 @@ class ScreenShareHandler(QObject):
         Process incoming screen share frame from presenter.
         
         Args:
-            data: Pickled screen frame or stop notification
+            data: Binary screen frame, or pickled frame / stop notification
         """
         try:
-            payload = pickle.loads(data)
+            # Binary frame: fixed header, no unpickling
+            if data[0] == SCREEN_TYPE_ID:
+                frame_format, size, username, frame_bytes = unpack_screen_frame(data)
+                self._display_frame(username, frame_bytes, size, frame_format)
+                return
+            
+            payload = safe_loads(data)
             
             # Handle presenter stop notification
             if payload['type'] == 'screen_stop':
@@ -412,30 +423,10 @@ class ScreenShareHandler(QObject):
                 self.hide_screen_share_signal.emit()
                 return
                 
-            # Process screen frame
+            # Process legacy pickled screen frame
             elif payload['type'] == 'screen':
-                username = payload.get('username', 'Someone')
-                print(f"Received screen sharing frame from {username}")
-                
-                # Create display widget if first frame
-                if not self.display_widget:
-                    # Create in main thread
-                    QMetaObject.invokeMethod(
-                        self,
-                        "create_display_widget",
-                        Qt.BlockingQueuedConnection
-                    )
-                
-                if self.display_widget:
-                    frame_bytes = payload['frame']
-                    width, height = payload['size']
-                    frame_format = payload.get('format', 'rgb')
-                    print(f"Screen frame size: {width}x{height}, {len(frame_bytes)} bytes, format: {frame_format}")
-                    
-                    # Update display in GUI thread
-                    self.update_screen_signal.emit(frame_bytes, width, height)
-                else:
-                    print("Display widget not created yet")
+                self._display_frame(payload.get('username', 'Someone'), payload['frame'],
+                                    payload['size'], payload.get('format', 'rgb'))
                     
         except (pickle.UnpicklingError, KeyError) as e:
             print(f"Error processing screen share data: {str(e)}")
@@ -444,6 +435,36 @@ class ScreenShareHandler(QObject):
             import traceback
             traceback.print_exc()
             
+    def _display_frame(self, username, frame_bytes, size, frame_format):
+        """
+        Show a received screen frame, creating the display widget on first use.
+        
+        Args:
+            username: Presenter username
+            frame_bytes: Image data (JPEG or RGB)
+            size: (width, height) in pixels
+            frame_format: 'jpeg' or 'rgb'
+        """
+        print(f"Received screen sharing frame from {username}")
+        
+        # Create display widget if first frame
+        if not self.display_widget:
+            # Create in main thread
+            QMetaObject.invokeMethod(
+                self,
+                "create_display_widget",
+                Qt.BlockingQueuedConnection
+            )
+        
+        if self.display_widget:
+            width, height = size
+            print(f"Screen frame size: {width}x{height}, {len(frame_bytes)} bytes, format: {frame_format}")
+            
+            # Update display in GUI thread
+            self.update_screen_signal.emit(frame_bytes, width, height)
+        else:
+            print("Display widget not created yet")
+    
     @pyqtSlot()
     def create_display_widget(self):
         """
@@ -552,7 +573,7 @@ class ScreenShareHandler(QObject):
         if self.client and self.client.gui:
             print("Screen sharing stopped - updating GUI")
             if hasattr(self.client.gui, 'share_screen_button'):
-                self.client.gui.share_screen_button.setIcon(QIcon(resource_path("icons/screen_share.png")))
+                self.client.gui.share_screen_button.setIcon(self.client.gui.icon("icons/screen_share.png"))
                 self.client.gui.share_screen_button.setEnabled(True)
                 
     @pyqtSlot()
@@ -561,7 +582,7 @@ class ScreenShareHandler(QObject):
         if self.client and self.client.gui:
             print("Screen sharing started - updating GUI")
             if hasattr(self.client.gui, 'share_screen_button'):
-                self.client.gui.share_screen_button.setIcon(QIcon(resource_path("icons/screen_share_off.png")))
+                self.client.gui.share_screen_button.setIcon(self.client.gui.icon("icons/screen_share_off.png"))
                 self.client.gui.share_screen_button.setEnabled(True)
                 
     @pyqtSlot(str)
@@ -13,9 +13,13 @@ import signal
 import sys
 import atexit
 
-from config import HOST, TCP_PORT, AUDIO_CHANNELS, AUDIO_RATE, AUDIO_CHUNK
+from config import HOST, TCP_PORT, UDP_SOCKET_BUFFER, TCP_SOCKET_BUFFER, AUDIO_CHANNELS, AUDIO_RATE, AUDIO_CHUNK, AUDIO_SILENCE_HANGOVER_MS
 
-from utils import send_with_size, receive_with_size
+from utils import (send_with_size, receive_with_size, unpack_media_packet, set_socket_buffers, safe_loads,
+                   decode_message, pack_json,
+                   unpack_heartbeat, unpack_video_status, unpack_file_chunk, set_tcp_cork,
+                   AUDIO_TYPE_ID, MIXED_AUDIO_TYPE_ID, CHAT_TYPE_ID, VIDEO_TYPE_ID, SCREEN_TYPE_ID,
+                   HEARTBEAT_TYPE_ID, VIDEO_STATUS_TYPE_ID, FILE_CHUNK_TYPE_ID)
 from audio_mixer import AudioMixer
 
 
@@ -40,8 +44,10 @@ class Server:
         
         # Client management
         self.clients = {}  # {addr: {'socket': socket, 'username': str, 'session': str}}
+        self.send_locks = {}  # {client socket: Lock}; one framed message at a time per socket
         self.sessions = {}  # {session_name: [client_addr1, client_addr2, ...]}
         self.udp_ports = {}  # {client_addr: udp_port}
+        self.udp_video_ports = {}  # {client_addr: udp_port} for relayed video, if registered
         self.udp_endpoints = {}  # {(ip, udp_port): client_addr} for reliable UDP routing
         
         self.is_running = False
@@ -53,9 +59,11 @@ class Server:
         # Audio mixing per session
         self.audio_mixers = {}  # {session_name: AudioMixer}
         
-        # Audio processing thread
+        # Audio processing thread (mixes) and fan-out thread (sends)
         self.audio_processing_thread = None
+        self.audio_sender_thread = None
         self._audio_mix_event = threading.Event()
+        self._audio_published = threading.Event()  # Set after each mixer tick
         
         # Screen sharing management (single presenter per session)
         self.current_presenter = {}  # {session_name: {'username': str, 'addr': tuple}}
@@ -109,9 +117,14 @@ class Server:
         self.tcp_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         self.udp_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         
+        # Accepted connections inherit the listener's buffers; set before
+        # listen so the window scale is negotiated for them
+        set_socket_buffers(self.tcp_socket, TCP_SOCKET_BUFFER)
+        
         self.tcp_socket.bind((self.host, self.port))
         self.tcp_socket.listen(5)
         self.udp_socket.bind((self.host, self.port + 1))
+        set_socket_buffers(self.udp_socket, UDP_SOCKET_BUFFER)
         self.is_running = True
         print(f"Server started on {self.host}:{self.port}")
 
@@ -131,6 +144,14 @@ class Server:
             )
             self.audio_processing_thread.start()
             
+            # Fan-out thread sends the published mixes (never blocks the mixer)
+            self.audio_sender_thread = threading.Thread(
+                target=self.send_mixed_audio,
+                name="audio-sender",
+                daemon=False
+            )
+            self.audio_sender_thread.start()
+            
             # Keep main thread alive
             while self.is_running:
                 time.sleep(1)
@@ -154,6 +175,9 @@ class Server:
         if self.audio_processing_thread and self.audio_processing_thread.is_alive():
             print("⏳ Waiting for audio mixer thread to finish...")
             self.audio_processing_thread.join(timeout=1.0)
+        self._audio_published.set()
+        if self.audio_sender_thread and self.audio_sender_thread.is_alive():
+            self.audio_sender_thread.join(timeout=1.0)
         
         self.audio_mixers.clear()
         
@@ -239,6 +263,7 @@ class Server:
                 udp_port = self.udp_ports[client_addr]
                 self.udp_endpoints.pop((client_addr[0], udp_port), None)
                 del self.udp_ports[client_addr]
+            self.udp_video_ports.pop(client_addr, None)
             
             # Cleanup shared files from this client
             files_to_remove = []
@@ -258,6 +283,7 @@ class Server:
                     self.clients[client_addr]['socket'].close()
                 except:
                     pass
+                self.send_locks.pop(self.clients[client_addr]['socket'], None)
                 del self.clients[client_addr]
 
     def accept_connections(self):
@@ -268,6 +294,8 @@ class Server:
         while self.is_running:
             try:
                 client_socket, addr = self.tcp_socket.accept()
+                # Chat and control messages are small; don't let Nagle hold them
+                client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
                 print(f"New connection from {addr}")
                 threading.Thread(target=self.handle_client, args=(client_socket, addr), daemon=True).start()
             except OSError as e:
@@ -298,18 +326,41 @@ class Server:
                 'username': None, 
                 'session': None
             }
+            self.send_locks[client_socket] = threading.Lock()
             
             while self.is_running:
                 data = receive_with_size(client_socket)
                 if not data:
                     break
+                
+                # Binary messages are routed by their tag byte without unpickling
+                tag = data[0]
+                if tag == CHAT_TYPE_ID:
+                    # Relay chat to the session as-is
+                    session = self.clients[addr].get('session')
+                    if session:
+                        self.broadcast_tcp(data, addr, session)
+                    continue
+                if tag == SCREEN_TYPE_ID:
+                    self.relay_screen_frame(addr, data)
+                    continue
+                if tag == HEARTBEAT_TYPE_ID:
+                    self.update_udp_port(addr, unpack_heartbeat(data))
+                    continue
+                if tag == VIDEO_STATUS_TYPE_ID:
+                    username, is_streaming = unpack_video_status(data)
+                    self.relay_video_status(addr, username, is_streaming, data)
+                    continue
+                if tag == FILE_CHUNK_TYPE_ID:
+                    self.relay_file_chunk(addr, data)
+                    continue
                     
-                # Deserialize message
+                # Deserialize message (JSON-tagged or pickled)
                 try:
-                    payload = pickle.loads(data)
+                    payload = decode_message(data)
                     msg_type = payload.get('type')
                     
-                except (pickle.UnpicklingError, AttributeError, EOFError, KeyError) as e:
+                except (pickle.UnpicklingError, AttributeError, EOFError, KeyError, ValueError) as e:
                     # Skip corrupted packets silently
                     continue
                 except Exception as e:
@@ -320,19 +371,8 @@ class Server:
                 try:
                     # Handle video streaming status updates
                     if msg_type == 'video_status':
-                        username = payload.get('username')
-                        is_streaming = payload.get('is_streaming')
-                        
-                        # Validate sender identity
-                        if addr in self.clients and self.clients[addr].get('username') == username:
-                            session = self.clients[addr]['session']
-                            print(f"Video status from {username}: {'streaming' if is_streaming else 'stopped'}")
-                            
-                            # Broadcast status to session
-                            self.broadcast_tcp(data, addr, session)
-                        else:
-                            print(f"Invalid video status update from {addr}")
-                        
+                        self.relay_video_status(addr, payload.get('username'),
+                                                payload.get('is_streaming'), data)
                         continue
                         
                     elif msg_type == 'screen_stop':
@@ -371,6 +411,13 @@ class Server:
                         self.udp_ports[addr] = udp_port
                         self.udp_endpoints[(addr[0], udp_port)] = addr
                         
+                        # Clients with a dedicated video socket get video relayed there
+                        video_port = payload.get('video_port')
+                        if video_port:
+                            self.udp_video_ports[addr] = video_port
+                        else:
+                            self.udp_video_ports.pop(addr, None)
+                        
                         # Add to session
                         if session not in self.sessions:
                             self.sessions[session] = []
@@ -379,21 +426,27 @@ class Server:
                         
                         print(f"Client {username} registered in session '{session}' from {addr} (UDP port: {udp_port})")
                         
-                        self.send_participants_list(addr, session)
-                        
-                        # Notify session about new user
-                        self.broadcast_system_message(
-                            f"{username} has joined the session", 
-                            session,
-                            exclude_addr=None
-                        )
-                        
-                        # Update participants list for all clients
-                        for client_addr in self.sessions[session]:
-                            if client_addr in self.clients:
-                                self.send_participants_list(client_addr, session)
-                        
-                        self.send_available_files(addr, session)
+                        # Coalesce the welcome burst (participants, join notice,
+                        # file list) into as few segments as possible
+                        set_tcp_cork(client_socket, True)
+                        try:
+                            self.send_participants_list(addr, session)
+                            
+                            # Notify session about new user
+                            self.broadcast_system_message(
+                                f"{username} has joined the session", 
+                                session,
+                                exclude_addr=None
+                            )
+                            
+                            # Update participants list for all clients
+                            for client_addr in self.sessions[session]:
+                                if client_addr in self.clients:
+                                    self.send_participants_list(client_addr, session)
+                            
+                            self.send_available_files(addr, session)
+                        finally:
+                            set_tcp_cork(client_socket, False)
                         
                         continue
                     
@@ -401,16 +454,7 @@ class Server:
                         # Client keepalive with optional UDP port update
 
                         if 'udp_port' in payload:
-                            new_udp_port = payload['udp_port']
-                            current_udp_port = self.udp_ports.get(addr)
-                            
-                            # Update if port changed
-                            if current_udp_port != new_udp_port:
-                                print(f"🔄 Client {self.clients[addr].get('username')} updated UDP port to {new_udp_port}")
-                                if current_udp_port:
-                                    self.udp_endpoints.pop((addr[0], current_udp_port), None)
-                                self.udp_ports[addr] = new_udp_port
-                                self.udp_endpoints[(addr[0], new_udp_port)] = addr
+                            self.update_udp_port(addr, payload['udp_port'])
                         
                         continue
                     
@@ -438,7 +482,7 @@ class Server:
                         # Include sender in broadcast
                         if 'sender' not in payload:
                             payload['sender'] = sender_username
-                            data = pickle.dumps(payload)
+                            data = pack_json(payload)
                         
                         print(f"Broadcasting file info to all clients in session {session}")
                         
@@ -455,7 +499,7 @@ class Server:
                                 'message': f"File {filename} is not available",
                                 'filename': filename
                             }
-                            send_with_size(client_socket, pickle.dumps(error_msg))
+                            self.send_to_client(client_socket, pack_json(error_msg))
                             continue
                             
                         # Verify file metadata exists
@@ -466,7 +510,7 @@ class Server:
                                 'message': f"File information is incomplete",
                                 'filename': filename
                             }
-                            send_with_size(client_socket, pickle.dumps(error_msg))
+                            self.send_to_client(client_socket, pack_json(error_msg))
                             continue
                             
                         file_info = self.files[filename]
@@ -476,8 +520,8 @@ class Server:
                         if owner in self.clients:
                             print(f"Forwarding file request from {addr} for {filename} to {owner}")
                             payload['requester'] = addr
-                            forward_data = pickle.dumps(payload)
-                            send_with_size(self.clients[owner]['socket'], forward_data)
+                            forward_data = pack_json(payload)
+                            self.send_to_client(self.clients[owner]['socket'], forward_data)
                         else:
                             # Owner disconnected
                             print(f"File owner for {filename} is no longer connected")
@@ -486,7 +530,7 @@ class Server:
                                 'message': f"File owner is no longer connected",
                                 'filename': filename
                             }
-                            send_with_size(client_socket, pickle.dumps(error_msg))
+                            self.send_to_client(client_socket, pack_json(error_msg))
                             
                             # Cleanup orphaned file
                             if session in self.available_files and filename in self.available_files[session]:
@@ -495,10 +539,12 @@ class Server:
                                     del self.files[filename]
                         continue
                         
-                    elif msg_type == 'file_chunk' or msg_type == 'file_end':
-                        # Route file data chunks to requester
+                    elif msg_type == 'file_end':
+                        # Route end-of-file marker to requester
                         filename = payload.get('filename')
                         requester = payload.get('requester')
+                        if requester is not None:
+                            requester = tuple(requester)  # JSON carries the address as a list
                         
                         print(f"Received {msg_type} for {filename} from {addr}" + 
                               (f" for requester {requester}" if requester else ""))
@@ -514,7 +560,7 @@ class Server:
                             # Forward chunk to downloader
                             forward_socket = self.clients[requester]['socket']
                             print(f"Forwarding {msg_type} for {filename} to requester {requester}")
-                            send_with_size(forward_socket, data)
+                            self.send_to_client(forward_socket, data)
                             
                             if msg_type == 'file_end':
                                 print(f"File {filename} download completed for {requester}")
@@ -529,15 +575,8 @@ class Server:
                         continue
                     
                     elif msg_type == 'screen':
-                        # Only broadcast screen frames from active presenter
-                        session = self.clients[addr]['session']
-                        with self.presenter_lock:
-                            presenter_info = self.current_presenter.get(session, {})
-                            if presenter_info.get('addr') == addr:
-                                self.broadcast_tcp(data, addr, session)
-                            else:
-                                username = self.clients[addr].get('username', 'Unknown')
-                                print(f"Ignoring screen frame from non-presenter {username}")
+                        # Legacy pickled screen frame
+                        self.relay_screen_frame(addr, data)
                         continue
                     
                     # Broadcast other messages to session
@@ -582,6 +621,97 @@ class Server:
             if addr in self.clients:
                 self.remove_client(addr)
             
+    def update_udp_port(self, addr, new_udp_port):
+        """
+        Apply the UDP port reported in a client heartbeat.
+        
+        Args:
+            addr: Client's TCP address
+            new_udp_port: Client's current UDP media port
+        """
+        current_udp_port = self.udp_ports.get(addr)
+        
+        # Update if port changed
+        if current_udp_port != new_udp_port:
+            print(f"🔄 Client {self.clients[addr].get('username')} updated UDP port to {new_udp_port}")
+            if current_udp_port:
+                self.udp_endpoints.pop((addr[0], current_udp_port), None)
+            self.udp_ports[addr] = new_udp_port
+            self.udp_endpoints[(addr[0], new_udp_port)] = addr
+    
+    def relay_video_status(self, addr, username, is_streaming, data):
+        """
+        Broadcast a camera on/off update to the session after checking the sender.
+        
+        Args:
+            addr: Sender's client address
+            username: Username claimed in the update
+            is_streaming: True if the camera was started
+            data: Serialized update, relayed unchanged
+        """
+        # Validate sender identity
+        if addr in self.clients and self.clients[addr].get('username') == username:
+            session = self.clients[addr]['session']
+            print(f"Video status from {username}: {'streaming' if is_streaming else 'stopped'}")
+            
+            # Broadcast status to session
+            self.broadcast_tcp(data, addr, session)
+        else:
+            print(f"Invalid video status update from {addr}")
+    
+    def send_to_client(self, sock, data):
+        """
+        Send one size-prefixed message to a client.
+        Several handler threads relay to the same client, so each message is
+        written under that socket's lock to keep frames from interleaving.
+        
+        Args:
+            sock: Client's TCP socket
+            data: Message to send
+        """
+        lock = self.send_locks.get(sock)
+        if lock is None:
+            send_with_size(sock, data)  # Client already removed; fails on the closed socket
+            return
+        with lock:
+            send_with_size(sock, data)
+    
+    def relay_file_chunk(self, addr, data):
+        """
+        Forward a binary file chunk to the client that requested the file.
+        Chunks without a requester belong to an initial upload and are dropped.
+        
+        Args:
+            addr: Sender's client address
+            data: Binary file chunk, relayed unchanged
+        """
+        filename, requester, _, _ = unpack_file_chunk(data)
+        if requester is None:
+            return
+        
+        client = self.clients.get(requester)
+        if client is None:
+            print(f"Cannot forward file chunk for {filename}: requester {requester} not found")
+            return
+        self.send_to_client(client['socket'], data)
+    
+    def relay_screen_frame(self, addr, data):
+        """
+        Broadcast a screen frame to the session, only if sent by the active presenter.
+        
+        Args:
+            addr: Sender's client address
+            data: Serialized screen frame
+        """
+        session = self.clients[addr]['session']
+        with self.presenter_lock:
+            presenter_info = self.current_presenter.get(session, {})
+            if presenter_info.get('addr') == addr:
+                self.broadcast_tcp(data, addr, session)
+            else:
+                username = self.clients[addr].get('username', 'Unknown')
+                print(f"Ignoring screen frame from non-presenter {username}")
+    
     def broadcast_system_message(self, message, session, exclude_addr=None):
         """
         Send system message to all clients in session.
@@ -603,7 +733,7 @@ class Server:
                 if addr != exclude_addr and addr in self.clients:
                     try:
                         client_data = self.clients[addr]
-                        send_with_size(client_data['socket'], system_msg)
+                        self.send_to_client(client_data['socket'], system_msg)
                     except OSError:
                         continue
 
@@ -613,26 +743,45 @@ class Server:
         Implements dynamic endpoint learning for NAT traversal.
         """
         print("📡 UDP receiver thread started")
+        
+        # Reused receive buffer: every packet is mixed or relayed before the next recv
+        recv_buf = bytearray(65536)
+        recv_view = memoryview(recv_buf)
     
         while self.is_running:
             try:
-                data, udp_addr = self.udp_socket.recvfrom(65536)
+                nbytes, udp_addr = self.udp_socket.recvfrom_into(recv_buf)
 
                 if not self.is_running:
                     break
+                
+                if not nbytes:
+                    continue
+                data = recv_view[:nbytes]
 
                 udp_key = (udp_addr[0], udp_addr[1])
                 sender_addr = self.udp_endpoints.get(udp_key)
 
+                # Decode packet: binary media header or legacy pickle
+                payload = None
+                frame = None
+                try:
+                    if data[0] == AUDIO_TYPE_ID:
+                        data_type = 'audio'
+                        _, username, frame = unpack_media_packet(data)
+                    elif data[0] == VIDEO_TYPE_ID:
+                        data_type = 'video'
+                        _, username, _ = unpack_media_packet(data)
+                    else:
+                        payload = safe_loads(data)
+                        data_type = payload.get('type')
+                        username = payload.get('username')
+                except Exception as exc:
+                    print(f"Failed to unpack UDP payload from {udp_addr}: {exc}")
+                    continue
+
                 # Dynamic endpoint learning (extract username from packet)
                 if sender_addr is None:
-                    username = None
-                    try:
-                        payload = pickle.loads(data)
-                        username = payload.get('username')
-                    except:
-                        pass
-                
                     if username:
                         # Find client by username
                         matching_clients = []
@@ -656,52 +805,47 @@ class Server:
                     print(f"UDP sender {sender_addr} not in client list")
                     continue
 
-                try:
-                    payload = pickle.loads(data)
-                except Exception as exc:
-                    print(f"Failed to unpack UDP payload from {sender_addr}: {exc}")
-                    continue
-
-                data_type = payload.get('type')
-
                 # Route audio to N-1 mixer
                 if data_type == 'audio':
                     session = self.clients[sender_addr].get('session')
-                    username = payload.get('username') or self.clients[sender_addr].get('username')
+                    username = username or self.clients[sender_addr].get('username')
                     
-                    # Extract audio frame (support both formats)
-                    frame = None
-                    if 'raw_data' in payload:
-                        # Legacy format with prefix
-                        raw_data = payload['raw_data']
-                        try:
-                            parts = raw_data.split(b'|', 1)
-                            if len(parts) >= 2 and parts[0] == b'a':
-                                frame = parts[1]
-                        except Exception as e:
-                            pass
-                    else:
-                        frame = payload.get('frame')
+                    # Legacy pickled packets carry the frame inside the dict
+                    # (binary packets already had it sliced off the header)
+                    if payload is not None:
+                        if 'raw_data' in payload:
+                            # Legacy format with prefix
+                            raw_data = payload['raw_data']
+                            try:
+                                parts = raw_data.split(b'|', 1)
+                                if len(parts) >= 2 and parts[0] == b'a':
+                                    frame = parts[1]
+                            except Exception as e:
+                                pass
+                        else:
+                            frame = payload.get('frame')
 
                     if not session or frame is None:
                         continue
 
-                    # Add to session's N-1 audio mixer
-                    mixer = self.audio_mixers.setdefault(
-                        session,
-                        AudioMixer(
+                    # Add to session's N-1 audio mixer (created on first frame only)
+                    mixer = self.audio_mixers.get(session)
+                    if mixer is None:
+                        mixer = AudioMixer(
                             channels=AUDIO_CHANNELS,
                             sample_rate=AUDIO_RATE,
                             chunk_size=AUDIO_CHUNK,
-                        ),
-                    )
+                            # Clients keep sending through their silence hangover, so a
+                            # gap shorter than that is jitter, not a speaker going quiet
+                            stale_timeout=AUDIO_SILENCE_HANGOVER_MS / 1000.0,
+                        )
+                        self.audio_mixers[session] = mixer
                     mixer.add_frame(username or 'Unknown', frame)
                     
                 elif data_type == 'video':
-                    # Relay video frames to session
-                    username = payload.get('username', 'Unknown')
-                    print(f"📹 Server received video from {username} ({len(data)} bytes)")
-                    self.broadcast_udp(data, sender_addr, payload)
+                    # Relay video frames to session (binary packets are forwarded untouched)
+                    print(f"📹 Server received video from {username or 'Unknown'} ({len(data)} bytes)")
+                    self.broadcast_udp(data, sender_addr, payload, packet_type='video')
                     
                 else:
                     self.broadcast_udp(data, sender_addr, payload)
@@ -738,7 +882,7 @@ class Server:
                 try:
                     client_data = self.clients.get(addr)
                     if client_data and 'socket' in client_data:
-                        send_with_size(client_data['socket'], data)
+                        self.send_to_client(client_data['socket'], data)
                 except (OSError, ConnectionResetError, BrokenPipeError) as e:
                     failed_clients.append(addr)
                     if self.is_running:
@@ -754,7 +898,7 @@ class Server:
                 print(f"🧹 Removing disconnected client {addr}")
                 threading.Thread(target=self.remove_client, args=(addr,), daemon=True).start()
 
-    def broadcast_udp(self, data, sender_addr, payload=None):
+    def broadcast_udp(self, data, sender_addr, payload=None, packet_type=None):
         """
         Broadcast UDP packet to session members.
         
@@ -762,6 +906,7 @@ class Server:
             data: Raw UDP packet data
             sender_addr: Sender's TCP address (excluded from broadcast)
             payload: Optional pre-parsed packet (avoids re-parsing)
+            packet_type: Optional packet type (skips parsing binary packets)
         """
         if sender_addr not in self.clients:
             print(f"Ignoring UDP data from unknown sender {sender_addr}")
@@ -776,14 +921,14 @@ class Server:
             return
     
         # Parse payload if needed
-        if payload is None:
-            try:
-                payload = pickle.loads(data)
-            except Exception as exc:
-                print(f"Error decoding UDP payload for broadcast: {exc}")
-                return
-
-        packet_type = payload.get('type', 'unknown')
+        if packet_type is None:
+            if payload is None:
+                try:
+                    payload = safe_loads(data)
+                except Exception as exc:
+                    print(f"Error decoding UDP payload for broadcast: {exc}")
+                    return
+            packet_type = payload.get('type', 'unknown')
     
         # Build target list (exclude sender and clients without UDP)
         targets = []
@@ -808,9 +953,12 @@ class Server:
         successful = 0
         failed_targets = []
         
+        # Video goes to a client's dedicated video port when it registered one
+        port_table = self.udp_video_ports if packet_type == 'video' else {}
+        
         for addr in targets:
             try:
-                udp_port = self.udp_ports[addr]
+                udp_port = port_table.get(addr) or self.udp_ports[addr]
             
                 self.udp_socket.sendto(data, (addr[0], udp_port))
                 successful += 1
@@ -828,7 +976,8 @@ class Server:
         """
         Process N-1 audio mixing for all sessions.
         Each client receives mixed audio excluding their own voice.
-        Runs at 50Hz (20ms intervals) for smooth audio delivery.
+        Runs at 50Hz (20ms intervals); mixes are published to each mixer's
+        front buffer and sent by send_mixed_audio.
         """
         print("🔊 Starting audio processing thread with N-1 mixing")
         
@@ -848,31 +997,17 @@ class Server:
                     
                     if not clients_in_session:
                         continue
-                        
-                    # N-1 mixing: personalized mix for each client
-                    for client_addr in clients_in_session:
-                        if client_addr not in self.clients or client_addr not in self.udp_ports:
-                            continue
-                            
-                        client_username = self.clients[client_addr].get('username', 'Unknown')
-                        
-                        # Mix all audio except this client's (prevents echo)
-                        mixed_frame = mixer.get_mixed_frame_n_minus_1(client_username)
-                        
-                        # Send only if non-silent
-                        if mixed_frame and mixed_frame.strip(b"\x00"):
-                            audio_packet = pickle.dumps({
-                                'type': 'audio',
-                                'username': 'SERVER_MIX',
-                                'raw_data': b'a|' + mixed_frame,
-                                'frame': mixed_frame
-                            })
-                            
-                            try:
-                                udp_port = self.udp_ports[client_addr]
-                                self.udp_socket.sendto(audio_packet, (client_addr[0], udp_port))
-                            except Exception as e:
-                                pass
+                    
+                    # N-1 mixing: personalized mix for each client (prevents echo)
+                    listeners = [
+                        self.clients[client_addr].get('username', 'Unknown')
+                        for client_addr in list(clients_in_session)
+                        if client_addr in self.clients and client_addr in self.udp_ports
+                    ]
+                    mixer.publish_mixes(listeners)
+                
+                # Wake the sender thread
+                self._audio_published.set()
                 
                 # Sleep with interrupt capability
                 elapsed = time.time() - loop_started
@@ -887,6 +1022,45 @@ class Server:
         
         print("🔊 Audio processing thread exiting")
     
+    def send_mixed_audio(self):
+        """
+        Send the latest published N-1 mixes to every client.
+        Runs on its own thread so slow socket writes never delay mixing.
+        """
+        mixed_header = bytes((MIXED_AUDIO_TYPE_ID,))
+        
+        while self.is_running and not self._audio_mix_event.is_set():
+            # Wait for the mixer to publish a new tick
+            if not self._audio_published.wait(0.1):
+                continue
+            self._audio_published.clear()
+            
+            try:
+                for session_name, mixer in list(self.audio_mixers.items()):
+                    clients_in_session = self.sessions.get(session_name)
+                    if not clients_in_session:
+                        continue
+                    
+                    for client_addr in list(clients_in_session):
+                        client = self.clients.get(client_addr)
+                        udp_port = self.udp_ports.get(client_addr)
+                        if client is None or udp_port is None:
+                            continue
+                        
+                        mixed_frame = mixer.get_published_frame(client.get('username', 'Unknown'))
+                        
+                        # Send only if non-silent
+                        if mixed_frame and mixed_frame.strip(b"\x00"):
+                            # Raw PCM behind a 1-byte tag (client plays it without unpickling)
+                            try:
+                                self.udp_socket.sendto(mixed_header + mixed_frame, (client_addr[0], udp_port))
+                            except Exception as e:
+                                pass
+            except Exception as e:
+                print(f"Error in audio sender thread: {e}")
+        
+        print("🔊 Audio sender thread exiting")
+    
     def send_available_files(self, client_addr, session_name):
         """
         Send list of available files to client.
@@ -908,7 +1082,7 @@ class Server:
             
             try:
                 print(f"Sending {len(self.available_files[session_name])} available files to new client {client_addr}")
-                send_with_size(client_socket, pickle.dumps(files_msg))
+                self.send_to_client(client_socket, pack_json(files_msg))
             except Exception as e:
                 print(f"Failed to send available files to client {client_addr}: {e}")
         else:
@@ -943,7 +1117,7 @@ class Server:
         
         try:
             print(f"📋 Sending participants list to {self.clients[client_addr].get('username')}: {participants}")
-            send_with_size(client_socket, pickle.dumps(participants_msg))
+            self.send_to_client(client_socket, pickle.dumps(participants_msg))
         except Exception as e:
             print(f"Failed to send participants list to client {client_addr}: {e}")
     
@@ -976,7 +1150,7 @@ class Server:
                             'reason': f'{current["username"]} is currently presenting',
                             'current_presenter': current['username']
                         }
-                        send_with_size(
+                        self.send_to_client(
                             self.clients[client_addr]['socket'],
                             pickle.dumps(response)
                         )
@@ -1007,7 +1181,7 @@ class Server:
                         'type': 'screen_share_approved',
                         'message': 'You are now presenting'
                     }
-                    send_with_size(
+                    self.send_to_client(
                         self.clients[client_addr]['socket'],
                         pickle.dumps(confirmation)
                     )
@@ -1045,7 +1219,7 @@ class Server:
         for addr in list(self.sessions[session]):
             if addr in self.clients:
                 try:
-                    send_with_size(self.clients[addr]['socket'], serialized)
+                    self.send_to_client(self.clients[addr]['socket'], serialized)
                 except Exception as e:
                     print(f"Error broadcasting to {addr}: {e}")
 
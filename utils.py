@@ -3,9 +3,54 @@ FusionMeet Utility Functions
 Helper functions for network communication and resource management.
 """
 
+import builtins
+import io
+import json
+import mmap
+import pickle
+import socket
 import struct
 import sys
 import os
+import threading
+
+
+# Binary media packet type tags (first byte of a UDP datagram).
+# Pickled packets always start with 0x80, so tags below that never collide.
+AUDIO_TYPE_ID = 0x01        # Microphone frame: [type][name len][name][PCM]
+MIXED_AUDIO_TYPE_ID = 0x02  # Server N-1 mix: [type][PCM]
+CHAT_TYPE_ID = 0x03         # Chat (TCP): [type][sender len][time len][sender][time][text]
+VIDEO_TYPE_ID = 0x04        # Webcam frame: [type][name len][name][JPEG]
+SCREEN_TYPE_ID = 0x05       # Screen frame (TCP): [type][format][width][height][name len][name][image]
+HEARTBEAT_TYPE_ID = 0x06    # Keepalive (TCP): [type][UDP port]
+VIDEO_STATUS_TYPE_ID = 0x07 # Camera on/off (TCP): [type][is streaming][name len][name]
+FILE_CHUNK_TYPE_ID = 0x08   # File data (TCP): [type][flags][name len][requester len][name][requester][data]
+JSON_TYPE_ID = 0x09         # Control message (TCP): [type][UTF-8 JSON object]
+
+# File chunk flags
+FILE_CHUNK_ZLIB = 0x01  # Chunk data is a zlib sync-flushed block
+
+# Screen frame image formats
+SCREEN_FORMATS = ('jpeg', 'rgb')
+
+# Fixed-layout control message headers, compiled once
+_HEARTBEAT_STRUCT = struct.Struct('!BH')
+_VIDEO_STATUS_STRUCT = struct.Struct('!B?B')
+_FILE_CHUNK_STRUCT = struct.Struct('!BBHB')
+_SIZE_STRUCT = struct.Struct('!I')  # Length prefix of every TCP message
+
+# Ask the kernel to fill a whole message per recv call where supported
+RECV_WAITALL = getattr(socket, 'MSG_WAITALL', 0)
+
+# Payloads at least this large are sent after their size header instead of
+# being concatenated with it
+SEND_CONCAT_LIMIT = 64 * 1024
+
+# Linux-only option for holding back partial TCP segments
+TCP_CORK = getattr(socket, 'TCP_CORK', None)
+
+# Without sendfile(2) (Windows) socket.sendfile falls back to read() + send()
+HAVE_SENDFILE = hasattr(os, 'sendfile')
 
 
 def resource_path(relative_path):
@@ -28,27 +73,62 @@ def resource_path(relative_path):
     return os.path.join(base_path, relative_path)
 
 
+# Whether the pyrcc5-generated resources_rc module is available (None until checked)
+_qrc_available = None
+
+
+def icon_source(relative_path):
+    """
+    Get the path a QIcon should load an icon from.
+    Prefers the Qt resources compiled into resources_rc.py (no filesystem
+    access), falling back to the file on disk when it hasn't been generated.
+    
+    Args:
+        relative_path: Relative path to icon file (e.g., 'icons/refresh.png')
+        
+    Returns:
+        str: ":/"-prefixed resource path or absolute file path
+    """
+    global _qrc_available
+    if _qrc_available is None:
+        # Imported lazily so the server never loads Qt
+        try:
+            import resources_rc  # noqa: F401  Registers the ":/icons/..." resources
+            _qrc_available = True
+        except ImportError:
+            _qrc_available = False
+    
+    if _qrc_available:
+        return ":/" + relative_path
+    return resource_path(relative_path)
+
+
 def receive_exact(sock, num_bytes):
     """
     Receive exact number of bytes from socket.
-    Handles partial receives until complete.
+    Fills one preallocated buffer in place (MSG_WAITALL usually completes it
+    in a single call) and handles partial receives until complete.
+    The buffer itself is returned, so a message is never copied after it
+    arrives (file chunks are written straight from views of it).
     
     Args:
         sock: Socket to receive from
         num_bytes: Exact number of bytes to receive
         
     Returns:
-        bytes: Received data, or None if connection closed
+        bytearray: Received data, or None if connection closed
     """
-    data = b''
-    while len(data) < num_bytes:
+    buf = bytearray(num_bytes)
+    view = memoryview(buf)
+    received = 0
+    while received < num_bytes:
         # Request remaining bytes
-        packet = sock.recv(num_bytes - len(data))
-        if not packet:
+        count = sock.recv_into(view[received:], num_bytes - received, RECV_WAITALL)
+        if not count:
             # Connection closed
             return None
-        data += packet
-    return data
+        received += count
+    return buf
 
 
 def send_with_size(sock, data):
@@ -62,7 +142,103 @@ def send_with_size(sock, data):
     """
     # Pack size as 4-byte unsigned int (network byte order)
     size = struct.pack('!I', len(data))
-    sock.sendall(size + data)
+    if len(data) < SEND_CONCAT_LIMIT:
+        sock.sendall(size + data)
+    else:
+        # Large payloads (file chunks): don't copy them just to prepend 4 bytes,
+        # but still hand prefix and payload to the kernel in one gather write
+        send_parts_with_size(sock, b'', data)
+
+
+def send_parts_with_size(sock, header, *bodies):
+    """
+    Send a header and body parts as one size-prefixed message without joining them.
+    Uses a single gather write (sendmsg) where available.
+    Format: [4-byte size][header][body parts...]
+    
+    Args:
+        sock: Socket to send to
+        header: Small message header (bytes)
+        *bodies: Message body parts (bytes-like, e.g. a memoryview over a read buffer)
+    """
+    parts = [_SIZE_STRUCT.pack(len(header) + sum(map(len, bodies))) + header]
+    parts.extend(bodies)
+    if not hasattr(sock, 'sendmsg'):
+        # Windows: one write per part, still no copy of the bodies
+        for part in parts:
+            sock.sendall(part)
+        return
+    
+    # Finish any parts the gather write didn't fully send
+    sent = sock.sendmsg(parts)
+    for part in parts:
+        if sent >= len(part):
+            sent -= len(part)
+            continue
+        sock.sendall(memoryview(part)[sent:])
+        sent = 0
+
+
+def send_file_range_with_size(sock, header, f, offset, count):
+    """
+    Send a header followed by a range of a file as one size-prefixed message.
+    The file data is sent with socket.sendfile (sendfile(2) where the OS
+    supports it, so it never enters userspace).
+    Format: [4-byte size][header][file bytes]
+    
+    Args:
+        sock: Blocking socket to send to
+        header: Small message header (bytes)
+        f: File opened in binary mode
+        offset: File position to start from
+        count: Number of file bytes to send
+        
+    Raises:
+        IOError: If the file ended before count bytes were sent (the
+            message framing on the socket is then broken)
+    """
+    sock.sendall(_SIZE_STRUCT.pack(len(header) + count) + header)
+    sent = sock.sendfile(f, offset, count)
+    if sent < count:
+        raise IOError(f"File shrank during transfer: sent {sent} of {count} bytes")
+
+
+def map_file(f):
+    """
+    Map a file read-only so ranges of it can be sent without reading them.
+    Used where sendfile(2) is missing; pages come straight from the page cache.
+    
+    Args:
+        f: Non-empty file opened in binary mode
+        
+    Returns:
+        mmap.mmap: Read-only mapping of the whole file (close it when done)
+    """
+    mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if hasattr(mmap, 'MADV_SEQUENTIAL'):
+        mapped.madvise(mmap.MADV_SEQUENTIAL)  # Aggressive readahead, pages dropped behind
+    return mapped
+
+
+def send_mapped_range_with_size(sock, header, mapped, offset, count):
+    """
+    Send a header followed by a range of a mapped file as one size-prefixed message.
+    Same framing as send_file_range_with_size, for files opened with map_file.
+    
+    Args:
+        sock: Blocking socket to send to
+        header: Small message header (bytes)
+        mapped: mmap from map_file
+        offset: File position to start from
+        count: Number of file bytes to send
+        
+    Raises:
+        IOError: If the mapping ends before offset + count
+    """
+    with memoryview(mapped)[offset:offset + count] as data:
+        if len(data) < count:
+            raise IOError(f"File shrank during transfer: {len(data)} of {count} bytes mapped")
+        send_parts_with_size(sock, header, data)
 
 
 def receive_with_size(sock):
@@ -74,7 +250,7 @@ def receive_with_size(sock):
         sock: Socket to receive from
         
     Returns:
-        bytes: Received data, or None if connection closed
+        bytearray: Received data, or None if connection closed
     """
     # Read 4-byte size header
     size_data = receive_exact(sock, 4)
@@ -84,3 +260,380 @@ def receive_with_size(sock):
     # Unpack size and read exact payload
     size = struct.unpack('!I', size_data)[0]
     return receive_exact(sock, size)
+
+
+def set_socket_buffers(sock, size):
+    """
+    Enlarge a socket's kernel receive and send buffers.
+    Warns when the OS caps the effective size below the request
+    (Linux limits it to net.core.rmem_max / wmem_max).
+    
+    Args:
+        sock: Socket to configure
+        size: Requested buffer size in bytes
+    """
+    for option, name, sysctl in ((socket.SO_RCVBUF, 'SO_RCVBUF', 'net.core.rmem_max'),
+                                 (socket.SO_SNDBUF, 'SO_SNDBUF', 'net.core.wmem_max')):
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, option, size)
+            effective = sock.getsockopt(socket.SOL_SOCKET, option)
+        except OSError as e:
+            print(f"⚠️ Could not set {name}: {e}")
+            continue
+        
+        # Linux reports double the requested size when it is granted in full
+        if effective < size:
+            print(f"⚠️ {name} is {effective} bytes (requested {size}); "
+                  f"raise {sysctl} with sysctl for larger buffers")
+
+
+# Cork depth per socket: transfers sharing a connection each take a cork,
+# and only the last one to finish releases it
+_cork_depth = {}
+_cork_lock = threading.Lock()
+
+
+def set_tcp_cork(sock, enabled):
+    """
+    Cork or uncork a TCP socket so a burst of small messages leaves as
+    full segments. Corks nest per socket: the option is set by the first
+    cork and cleared, flushing whatever is queued, by the matching last
+    uncork. Every cork must be paired with exactly one uncork.
+    No-op where TCP_CORK is unavailable (Windows, macOS).
+    
+    Args:
+        sock: Connected TCP socket
+        enabled: True to take a cork, False to release one
+    """
+    if TCP_CORK is None:
+        return
+    with _cork_lock:
+        depth = _cork_depth.get(sock, 0)
+        if enabled:
+            _cork_depth[sock] = depth + 1
+            if depth:
+                return
+        else:
+            if depth > 1:
+                _cork_depth[sock] = depth - 1
+                return
+            _cork_depth.pop(sock, None)
+            if not depth:
+                return
+        try:
+            sock.setsockopt(socket.IPPROTO_TCP, TCP_CORK, 1 if enabled else 0)
+        except OSError:
+            pass  # Socket closed; the send path reports it
+
+
+class SafeUnpickler(pickle.Unpickler):
+    """
+    Unpickler that only resolves plain builtin container and scalar types.
+    Control messages are dicts of str/bytes/numbers/lists, so anything
+    else arriving on the wire is rejected instead of being imported.
+    """
+    
+    ALLOWED_BUILTINS = frozenset({
+        'dict', 'list', 'tuple', 'set', 'frozenset',
+        'bytes', 'bytearray', 'str', 'int', 'float', 'complex', 'bool',
+    })
+    
+    def find_class(self, module, name):
+        if module == 'builtins' and name in self.ALLOWED_BUILTINS:
+            return getattr(builtins, name)
+        raise pickle.UnpicklingError(f"Blocked global {module}.{name}")
+
+
+def safe_loads(data):
+    """
+    Deserialize a pickled message with SafeUnpickler.
+    Drop-in replacement for pickle.loads on untrusted network data.
+    
+    Args:
+        data: Pickled message (bytes or memoryview)
+        
+    Returns:
+        Deserialized object
+        
+    Raises:
+        pickle.UnpicklingError: On corrupt data or a disallowed global
+    """
+    return SafeUnpickler(io.BytesIO(data)).load()
+
+
+def pack_json(message):
+    """
+    Encode a control message dict as a tagged JSON message.
+    Used for file sharing control messages instead of pickle.
+    Format: [1-byte type][UTF-8 JSON]
+    
+    Args:
+        message: Dict of JSON-serializable values (tuples become lists)
+        
+    Returns:
+        bytes: Encoded message
+    """
+    return bytes((JSON_TYPE_ID,)) + json.dumps(message, separators=(',', ':')).encode('utf-8')
+
+
+def decode_message(data):
+    """
+    Decode a dict control message, JSON-tagged or pickled.
+    Complements pack_json; messages still sent with pickle go through safe_loads.
+    
+    Args:
+        data: Received message bytes
+        
+    Returns:
+        Deserialized message
+        
+    Raises:
+        ValueError: On malformed JSON
+        pickle.UnpicklingError: On corrupt pickle data or a disallowed global
+    """
+    if data[0] == JSON_TYPE_ID:
+        return json.loads(data[1:])
+    return safe_loads(data)
+
+
+def pack_media_header(type_id, username):
+    """
+    Build the fixed header for a binary media packet.
+    Format: [1-byte type][1-byte username length][username bytes]
+    
+    Args:
+        type_id: Packet type tag (e.g., AUDIO_TYPE_ID)
+        username: Sender username (truncated to 255 UTF-8 bytes)
+        
+    Returns:
+        bytes: Header to prepend to the raw media payload
+    """
+    username_bytes = username.encode('utf-8')[:255]
+    return struct.pack(f'!BB{len(username_bytes)}s', type_id, len(username_bytes), username_bytes)
+
+
+def unpack_media_packet(data):
+    """
+    Split a binary media packet into its header fields and payload.
+    Complements pack_media_header.
+    
+    Args:
+        data: Received packet (bytes or memoryview)
+        
+    Returns:
+        tuple: (type_id, username, payload) where payload is a zero-copy memoryview
+    """
+    type_id, name_len = struct.unpack_from('!BB', data)
+    username = str(data[2:2 + name_len], 'utf-8', 'replace')
+    return type_id, username, memoryview(data)[2 + name_len:]
+
+
+def pack_screen_frame(frame_format, size, username, frame):
+    """
+    Build a binary screen share frame (replaces the pickled frame dict).
+    Format: [1-byte type][1-byte format][2-byte width][2-byte height]
+            [1-byte username length][username][image bytes]
+    
+    Args:
+        frame_format: Image format, one of SCREEN_FORMATS
+        size: (width, height) in pixels
+        username: Presenter username (truncated to 255 UTF-8 bytes)
+        frame: Encoded image bytes
+        
+    Returns:
+        bytes: Encoded screen frame
+    """
+    username_bytes = username.encode('utf-8')[:255]
+    header = struct.pack(f'!BBHHB{len(username_bytes)}s', SCREEN_TYPE_ID,
+                         SCREEN_FORMATS.index(frame_format), size[0], size[1],
+                         len(username_bytes), username_bytes)
+    return header + frame
+
+
+def unpack_screen_frame(data):
+    """
+    Decode a binary screen share frame.
+    Complements pack_screen_frame.
+    
+    Args:
+        data: Received frame bytes
+        
+    Returns:
+        tuple: (frame_format, (width, height), username, frame bytes)
+    """
+    _, format_id, width, height, name_len = struct.unpack_from('!BBHHB', data)
+    username = str(data[7:7 + name_len], 'utf-8', 'replace')
+    # bytes for the Qt signal, whatever buffer type data is
+    return SCREEN_FORMATS[format_id], (width, height), username, bytes(memoryview(data)[7 + name_len:])
+
+
+def pack_chat_message(sender, timestamp, text):
+    """
+    Build a binary chat message (replaces the pickled chat dict).
+    Format: [1-byte type][1-byte sender length][1-byte timestamp length]
+            [sender][timestamp][text]
+    
+    Args:
+        sender: Sender username (truncated to 255 UTF-8 bytes)
+        timestamp: Display timestamp, e.g. 'HH:MM:SS'
+        text: Message content (rest of the packet)
+        
+    Returns:
+        bytes: Encoded chat message
+    """
+    sender_bytes = sender.encode('utf-8')[:255]
+    timestamp_bytes = timestamp.encode('utf-8')[:255]
+    header = struct.pack(f'!BBB{len(sender_bytes)}s{len(timestamp_bytes)}s', CHAT_TYPE_ID,
+                         len(sender_bytes), len(timestamp_bytes), sender_bytes, timestamp_bytes)
+    return header + text.encode('utf-8')
+
+
+def unpack_chat_message(data):
+    """
+    Decode a binary chat message.
+    Complements pack_chat_message.
+    
+    Args:
+        data: Received message bytes
+        
+    Returns:
+        tuple: (sender, timestamp, text)
+    """
+    _, sender_len, timestamp_len = struct.unpack_from('!BBB', data)
+    text_start = 3 + sender_len + timestamp_len
+    sender = data[3:3 + sender_len].decode('utf-8', errors='replace')
+    timestamp = data[3 + sender_len:text_start].decode('utf-8', errors='replace')
+    text = data[text_start:].decode('utf-8', errors='replace')
+    return sender, timestamp, text
+
+
+def pack_heartbeat(udp_port):
+    """
+    Build a binary TCP heartbeat (replaces the pickled heartbeat dict).
+    Format: [1-byte type][2-byte UDP port]
+    
+    Args:
+        udp_port: Client's current UDP media port
+        
+    Returns:
+        bytes: Encoded heartbeat
+    """
+    return _HEARTBEAT_STRUCT.pack(HEARTBEAT_TYPE_ID, udp_port)
+
+
+def unpack_heartbeat(data):
+    """
+    Decode a binary TCP heartbeat.
+    Complements pack_heartbeat.
+    
+    Args:
+        data: Received message bytes
+        
+    Returns:
+        int: Client's UDP media port
+    """
+    return _HEARTBEAT_STRUCT.unpack_from(data)[1]
+
+
+def pack_video_status(username, is_streaming):
+    """
+    Build a binary camera status update (replaces the pickled video_status dict).
+    Format: [1-byte type][1-byte is_streaming][1-byte username length][username]
+    
+    Args:
+        username: Sender username (truncated to 255 UTF-8 bytes)
+        is_streaming: True if the camera was started, False if stopped
+        
+    Returns:
+        bytes: Encoded status update
+    """
+    username_bytes = username.encode('utf-8')[:255]
+    return _VIDEO_STATUS_STRUCT.pack(VIDEO_STATUS_TYPE_ID, bool(is_streaming),
+                                     len(username_bytes)) + username_bytes
+
+
+def unpack_video_status(data):
+    """
+    Decode a binary camera status update.
+    Complements pack_video_status.
+    
+    Args:
+        data: Received message bytes
+        
+    Returns:
+        tuple: (username, is_streaming)
+    """
+    _, is_streaming, name_len = _VIDEO_STATUS_STRUCT.unpack_from(data)
+    username = str(data[3:3 + name_len], 'utf-8', 'replace')
+    return username, is_streaming
+
+
+def format_addr(addr):
+    """
+    Encode a client address tuple as "host:port" text.
+    
+    Args:
+        addr: (host, port) tuple
+        
+    Returns:
+        str: Address text
+    """
+    return f"{addr[0]}:{addr[1]}"
+
+
+def parse_addr(text):
+    """
+    Decode "host:port" text back into an address tuple.
+    Complements format_addr.
+    
+    Args:
+        text: Address text
+        
+    Returns:
+        tuple: (host, port), or None for empty text
+    """
+    if not text:
+        return None
+    host, _, port = text.rpartition(':')
+    return host, int(port)
+
+
+def pack_file_chunk_header(filename, requester=None, compressed=False):
+    """
+    Build the header for a binary file chunk (replaces the pickled file_chunk dict).
+    The chunk data is sent after it without being copied.
+    Format: [1-byte type][1-byte flags][2-byte name length][1-byte requester length][name][requester]
+    
+    Args:
+        filename: Name of the file being transferred
+        requester: Address tuple of the downloading client, or None for an upload
+        compressed: True if the chunk data is zlib-compressed
+        
+    Returns:
+        bytes: Header to send before the chunk data
+    """
+    name_bytes = filename.encode('utf-8')
+    requester_bytes = format_addr(requester).encode('ascii') if requester else b''
+    flags = FILE_CHUNK_ZLIB if compressed else 0
+    return _FILE_CHUNK_STRUCT.pack(FILE_CHUNK_TYPE_ID, flags, len(name_bytes),
+                                   len(requester_bytes)) + name_bytes + requester_bytes
+
+
+def unpack_file_chunk(data):
+    """
+    Decode a binary file chunk.
+    Complements pack_file_chunk_header.
+    
+    Args:
+        data: Received message bytes
+        
+    Returns:
+        tuple: (filename, requester address or None, compressed, chunk memoryview)
+    """
+    _, flags, name_len, requester_len = _FILE_CHUNK_STRUCT.unpack_from(data)
+    name_start = _FILE_CHUNK_STRUCT.size
+    requester_start = name_start + name_len
+    data_start = requester_start + requester_len
+    filename = str(data[name_start:requester_start], 'utf-8', 'replace')
+    requester = parse_addr(str(data[requester_start:data_start], 'ascii'))
+    return filename, requester, bool(flags & FILE_CHUNK_ZLIB), memoryview(data)[data_start:]
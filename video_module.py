@@ -21,6 +21,7 @@ from PyQt5.QtCore import Qt, QTimer, pyqtSignal, QObject, QMetaObject, Q_ARG, Qt
 from PyQt5.QtCore import QCoreApplication, pyqtSlot
 
 from config import *
+from utils import VIDEO_TYPE_ID, pack_media_header, pack_video_status, safe_loads
 
 
 class VideoWidget(QWidget):
@@ -106,11 +107,12 @@ class VideoWidget(QWidget):
         Display video frame in widget.
         
         Args:
-            frame: OpenCV BGR numpy array or None (thread-safe)
+            frame: OpenCV BGR numpy array or None (thread-safe). Ownership
+                passes to the widget; callers hand over freshly decoded or
+                flipped frames, so no defensive copy is made.
         """
         if frame is not None:
-            frame_copy = frame.copy()  # Avoid threading issues
-            self.set_frame_signal.emit(frame_copy)
+            self.set_frame_signal.emit(frame)
         else:
             self.clear_frame_signal.emit()
             
@@ -129,8 +131,11 @@ class VideoWidget(QWidget):
                 self._clear_frame_slot()
                 return
                 
-            # Resize to 320x240
-            resized_frame = cv2.resize(frame, (320, 240))
+            # Senders already scale to 320x240 off the GUI thread; only resize strays
+            if frame.shape[0] != 240 or frame.shape[1] != 320:
+                resized_frame = cv2.resize(frame, (320, 240))
+            else:
+                resized_frame = frame
             
             # Validate dimensions
             if resized_frame.shape[0] <= 0 or resized_frame.shape[1] <= 0 or resized_frame.shape[2] != 3:
@@ -183,6 +188,7 @@ class VideoHandler(QObject):
         self.client = client
         self.is_streaming = False
         self.video_capture = None
+        self._video_header = b''  # Binary packet header, built once per stream
         
         # Video widgets management
         self.local_video_widget = None
@@ -285,6 +291,9 @@ class VideoHandler(QObject):
             self.add_video_widget_signal.emit(self.local_video_widget, 0, 0)
             print(f"Local video added at position 0,0")
             
+            # Fixed binary header, built once per stream (username doesn't change)
+            self._video_header = pack_media_header(VIDEO_TYPE_ID, self.client.username)
+            
             # Start capture timer (must be in GUI thread)
             self.stream_timer = QTimer()
             self.stream_timer.timeout.connect(self.capture_and_send)
@@ -359,11 +368,6 @@ class VideoHandler(QObject):
             if frame is None or frame.size == 0:
                 return
             
-            # Display local preview with mirror effect
-            if self.local_video_widget:
-                preview_frame = cv2.flip(frame, 1)
-                self.local_video_widget.set_frame(preview_frame)
-            
             # Compression settings
             JPEG_QUALITY = 50
             FRAME_WIDTH = 320
@@ -373,6 +377,12 @@ class VideoHandler(QObject):
             # Resize for transmission
             frame_resized = cv2.resize(frame, (FRAME_WIDTH, FRAME_HEIGHT))
             
+            # Display local preview with mirror effect (flip the 320x240 frame,
+            # not the full capture, so the widget doesn't resize it again)
+            if self.local_video_widget:
+                preview_frame = cv2.flip(frame_resized, 1)
+                self.local_video_widget.set_frame(preview_frame)
+            
             # JPEG compression
             encode_param = [int(cv2.IMWRITE_JPEG_QUALITY), JPEG_QUALITY]
             ret, compressed_frame = cv2.imencode('.jpg', frame_resized, encode_param)
@@ -381,28 +391,16 @@ class VideoHandler(QObject):
                 return
             
             # Check packet size limit
-            if len(compressed_frame.tobytes()) > MAX_VIDEO_PACKET:
+            frame_bytes = compressed_frame.tobytes()
+            if len(frame_bytes) > MAX_VIDEO_PACKET:
                 return
-                
-            # Create packet
-            data = pickle.dumps({
-                'type': 'video',
-                'username': self.client.username,
-                'frame': compressed_frame.tobytes(),
-                'q': JPEG_QUALITY,
-                'r': (FRAME_WIDTH, FRAME_HEIGHT),
-                'timestamp': time.time()
-            })
-            
-            # Send via UDP
-            self.client.send_udp(data)
+            
+            # Send [type][name len][name][JPEG] via UDP (no pickling)
+            self.client.send_udp(self._video_header + frame_bytes, msg_type='video')
                 
         except Exception as e:
             if self.is_streaming:
                 pass  # Silent - errors common during camera ops
-                    
-        except Exception as e:
-            print(f"Error sending video frame: {str(e)}")
     
     def send_status_update(self, is_streaming):
         """
@@ -412,11 +410,7 @@ class VideoHandler(QObject):
             is_streaming: True if started, False if stopped
         """
         try:
-            data = pickle.dumps({
-                'type': 'video_status',
-                'username': self.client.username,
-                'is_streaming': is_streaming
-            })
+            data = pack_video_status(self.client.username, is_streaming)
             
             # Send via TCP (reliable)
             self.client.send_tcp(data)
@@ -550,8 +544,8 @@ class VideoHandler(QObject):
 
     def handle_frame(self, data, addr):
         """
-        Process incoming video frame from remote client.
-        Decodes JPEG, creates widget if needed, displays frame.
+        Process incoming pickled video packet (legacy packet format).
+        Binary video packets go through handle_frame_raw instead.
         
         Args:
             data: Pickled video packet
@@ -559,12 +553,28 @@ class VideoHandler(QObject):
         """
         try:
             # Deserialize packet
-            payload = pickle.loads(data)
+            payload = safe_loads(data)
             if payload['type'] != 'video':
                 return
-                
-            username = payload.get('username', 'Unknown')
             
+            self.handle_frame_raw(payload.get('username', 'Unknown'), payload.get('frame'), addr)
+            
+        except pickle.UnpicklingError:
+            pass  # Ignore corrupted packets
+        except Exception:
+            pass  # Silent fail - expected with UDP
+    
+    def handle_frame_raw(self, username, frame_data, addr):
+        """
+        Process incoming video frame from remote client.
+        Decodes JPEG, creates widget if needed, displays frame.
+        
+        Args:
+            username: Sender's username
+            frame_data: JPEG-compressed frame (bytes or memoryview)
+            addr: Sender's network address
+        """
+        try:
             # Ignore our own frames (server echo)
             if username == self.client.username:
                 return
@@ -575,7 +585,6 @@ class VideoHandler(QObject):
             self.participants_changed_signal.emit()
             
             # Decode compressed frame
-            frame_data = payload.get('frame')
             if not frame_data:
                 return
             
@@ -607,8 +616,6 @@ class VideoHandler(QObject):
                 widget = self.remote_video_widgets[username]
                 self.update_frame_signal.emit(widget, frame)
             
-        except pickle.UnpicklingError:
-            pass  # Ignore corrupted packets
         except Exception:
             pass  # Silent fail - expected with UDP
             